@@ -0,0 +1,71 @@
+"""
+Cold-start latency of a short-lived process.
+
+A CLI or Lambda invocation pays for ``import celpy`` and for creating the parser.
+This runs ``import celpy; celpy.Environment().compile("1")`` in a fresh
+interpreter, with and without saved LALR parser tables.
+
+The "without" case sets ``CEL_PARSER_CACHE`` to an empty string,
+which is the previous behavior of building the tables from ``cel.lark`` in every process.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from textwrap import dedent
+
+COLD_START = dedent("""
+    import time
+    start = time.perf_counter()
+    import celpy
+    imported = time.perf_counter()
+    celpy.Environment().compile("1")
+    compiled = time.perf_counter()
+    print(imported - start, compiled - imported)
+""")
+
+
+def cold_start(cache: str, repeat: int) -> tuple[list[float], list[float]]:
+    """Run a fresh interpreter ``repeat`` times, returning import and compile times."""
+    env = dict(os.environ, CEL_PARSER_CACHE=cache)
+    imports, compiles = [], []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_START],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        import_time, compile_time = map(float, result.stdout.split())
+        imports.append(import_time)
+        compiles.append(compile_time)
+    return imports, compiles
+
+
+def report(label: str, imports: list[float], compiles: list[float]) -> None:
+    print(
+        f"{label:24s} "
+        f"import {statistics.median(imports) * 1000:8.1f} ms  "
+        f"compile {statistics.median(compiles) * 1000:8.1f} ms  "
+        f"total {statistics.median(i + c for i, c in zip(imports, compiles)) * 1000:8.1f} ms"
+    )
+
+
+def main(repeat: int = 10) -> None:
+    print(f"Median of {repeat} runs of a fresh interpreter")
+    report("No saved tables", *cold_start("", repeat))
+    with tempfile.TemporaryDirectory() as cache:
+        # The first run saves the tables.
+        cold_start(cache, 1)
+        report("Saved tables", *cold_start(cache, repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    options = parser.parse_args()
+    main(options.repeat)
@@ -351,8 +351,10 @@ functions = {
     "none": lambda optional, : None
 }
 
-def simple_performance(runner_class: type[celpy.Runner] | None = None) -> None:
-    env = celpy.Environment(runner_class=runner_class)
+def simple_performance(runner_class: type[celpy.Runner] | None = None, shaped: bool = False, optimize: bool = False) -> None:
+    # The parser is shared; each runner class may need a different tree class.
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class, shaped=shaped)
 
     number = 100
     compile = timeit.timeit(
@@ -372,18 +374,19 @@ def simple_performance(runner_class: type[celpy.Runner] | None = None) -> None:
     number = 1_000
     prepare = timeit.timeit(
         stmt=dedent("""\
-            env.program(ast,functions=functions)
+            env.program(ast,functions=functions,optimize=optimize)
         """),
         globals={
             'env': env,
             'ast': ast,
-            'functions': functions
+            'functions': functions,
+            'optimize': optimize
         },
         number=number
     )
     print(f"Prepare:  {1_000 * prepare / number:9.4f} ms")
 
-    program = env.program(ast, functions=functions)
+    program = env.program(ast, functions=functions, optimize=optimize)
 
     number = 1_000
     convert = timeit.timeit(
@@ -425,6 +428,32 @@ def simple_performance(runner_class: type[celpy.Runner] | None = None) -> None:
     print()
 
 
+def evaluation_performance(number: int = 1_000) -> None:
+    """The time for one evaluation, for each runner, of a trivial and of a complex expression."""
+    cel_context = {
+        "class_a": celpy.json_to_cel({"property_a": "something"}),
+        "class_b": celpy.json_to_cel(
+            {"title": "something else", "property_b": "some var",
+             "integration_info": {"type": "GitHub"}}),
+        "optional": celpy.json_to_cel({})
+    }
+    print(f"| {'Runner':<18} | {'Short':>10} | {'Complex':>10} |")
+    print(f"|{'-' * 20}|{'-' * 12}|{'-' * 12}|")
+    for runner_class in (celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner):
+        celpy.CELParser.CEL_PARSER = None
+        env = celpy.Environment(runner_class=runner_class)
+        times = []
+        for text in (CEL_EXPRESSION_SHORT, CEL_EXPRESSION_ORIGINAL_NO_OPTIONAL):
+            program = env.program(env.compile(text))
+            evaluation = timeit.timeit(
+                stmt="program.evaluate(cel_context)",
+                globals={'program': program, 'cel_context': cel_context},
+                number=number
+            )
+            times.append(1_000_000 * evaluation / number)
+        print(f"| {runner_class.__name__:<18} | {times[0]:7.1f} µs | {times[1]:7.1f} µs |")
+
+
 def process(program: celpy.CompiledRunner, number: int = 100):
     """A processing loop that prepares data and evaluates the CEL program."""
     for i in range(number):
@@ -456,10 +485,30 @@ def main():
     print()
     simple_performance(celpy.InterpretedRunner)
     print()
+    print("## Interpreter, shaped AST")
+    print()
+    simple_performance(celpy.InterpretedRunner, shaped=True)
+    print()
+    print("## Interpreter, shaped AST, optimized program")
+    print()
+    simple_performance(celpy.InterpretedRunner, shaped=True, optimize=True)
+    print()
     print("## Transpiler")
     print()
     simple_performance(celpy.CompiledRunner)
     print()
+    print("## Closures")
+    print()
+    simple_performance(celpy.ClosureRunner)
+    print()
+    print("## Closures, shaped AST, optimized program")
+    print()
+    simple_performance(celpy.ClosureRunner, shaped=True, optimize=True)
+    print()
+    print("# Per-evaluation")
+    print()
+    evaluation_performance()
+    print()
     print("# Profile")
     print()
     detailed_profile()
@@ -0,0 +1,68 @@
+"""
+Import-time profile of ``celpy``, driven by ``python -X importtime``.
+
+Shelling out to ``python -m celpy`` for each batch of documents
+means the import time is paid over and over.
+This reports the cumulative import time for the modules that matter,
+and confirms the heavy dependencies (``pendulum``, ``re2``, ``jmespath``) are not
+imported until an expression needs them.
+
+Use ``--module celpy.__main__`` to profile the CLI instead of the package.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LAZY_DEPENDENCIES = ["pendulum", "re2", "jmespath"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """
+    Import the module in a fresh interpreter.
+    Returns the cumulative time, in microseconds, for each module imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(module: str = "celpy", repeat: int = 10, top: int = 12) -> None:
+    samples: defaultdict[str, list[int]] = defaultdict(list)
+    for _ in range(repeat):
+        for name, cumulative in import_times(module).items():
+            samples[name].append(cumulative)
+    medians = {name: statistics.median(times) for name, times in samples.items()}
+
+    print(f"Median cumulative import time of {repeat} runs: {module}")
+    print(f"{'total':40s} {medians[module] / 1000:8.1f} ms")
+    roots = [name for name in medians if "." not in name and name != module]
+    for name in sorted(roots, key=lambda n: medians[n], reverse=True)[:top]:
+        print(f"  {name:38s} {medians[name] / 1000:8.1f} ms")
+
+    eager = [name for name in LAZY_DEPENDENCIES if name in medians]
+    if eager:
+        print(f"Imported too early: {', '.join(eager)}")
+    else:
+        print(f"Not imported: {', '.join(LAZY_DEPENDENCIES)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--module", default="celpy")
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    parser.add_argument("-t", "--top", type=int, default=12)
+    options = parser.parse_args()
+    main(options.module, options.repeat, options.top)
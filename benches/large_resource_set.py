@@ -48,6 +48,10 @@ This can be used for a variety of things.
 3.  Collect performance profile information for the CEL evaluator.
     Use the ``--profile`` option to see where in :py:mod:`celpy` time is being spent.
 
+4.  Compare the runners. Use the ``--runner`` option to pick one.
+    The "Overhead" line is the time to evaluate ``true`` with each resource:
+    the cost of an evaluation that doesn't depend on the filter.
+
 ..  todo:: Cleanup profile output.
 
     Remove all functions called once, they tend to be uninfornative.
@@ -68,7 +72,7 @@ import sys
 import textwrap
 import time
 from typing import (Any, Callable, Counter, Dict, Iterable, List, Optional,
-                    Union)
+                    Type, Union)
 
 import yaml
 
@@ -155,6 +159,19 @@ class TagAssetPolicy(PolicyCase):
     """)
 
 
+class TagAssetFilter(FilterCase):
+    """
+    The tag checks of the :py:class:`TagAssetPolicy`, written in CEL.
+    """
+    filter_expr = textwrap.dedent("""
+        resource.IamInstanceProfile.Arn.contains("Enterprise-Reserved-CloudCustodian")
+        && resource.Tags.exists(t, t.Key == "ASSET")
+        && !resource.Tags.exists(
+            t, t.Key == "ASSET" && t.Value in ["CLOUDCUSTODIAN", "CLOUDCORESERVICES"]
+        )
+    """)
+
+
 class Mock_EC2:
     """Generator for synthetic EC2 resources."""
     def generate(self, n: Optional[int] = 1000) -> Iterable[JSON]:
@@ -300,18 +317,21 @@ class Benchmark:
     example: FilterCase
     resources: Iterable[JSON]
     text_from: Optional[Callable[..., celpy.celtypes.Value]] = None
+    runner_class: Optional[Type[celpy.Runner]] = None
 
     def run(self, error_limit: Optional[int] = None) -> None:
         self.run_times: List[float] = []
         self.exception_times: List[float] = []
         self.errors: Counter[Exception] = collections.Counter()
         self.results: Counter[celpy.celtypes.Value] = collections.Counter()
+        self.overhead_times: List[float] = []
 
         decls = {"resource": celpy.celtypes.MapType}
         decls.update(celpy.c7nlib.DECLARATIONS)
-        cel_env = celpy.Environment(annotations=decls)
+        cel_env = celpy.Environment(annotations=decls, runner_class=self.runner_class)
         ast = cel_env.compile(self.example.filter_expr)
         program = cel_env.program(ast, functions=celpy.c7nlib.FUNCTIONS)
+        trivial = cel_env.program(cel_env.compile("true"), functions=celpy.c7nlib.FUNCTIONS)
 
         if self.text_from:
             celpy.c7nlib.__dict__['text_from'] = self.text_from
@@ -337,6 +357,10 @@ class Benchmark:
                     error_limit -= 1
                     if error_limit == 0:
                         raise
+            start = time.perf_counter()
+            trivial.evaluate(activation)
+            end = time.perf_counter()
+            self.overhead_times.append((end-start)*1000)
         overall_end = time.perf_counter()
         self.overall_run = (overall_end-overall_start)*1000
         self.volume = len(self.run_times) + len(self.exception_times)
@@ -348,6 +372,7 @@ class Benchmark:
         print(f"Range : {min(self.run_times):.1f} ms - {max(self.run_times):.1f} ms")
         print(f"Mean  : {statistics.mean(self.run_times):.2f} ms")
         print(f"Median: {statistics.median(self.run_times):.2f} ms")
+        print(f"Overhead: {statistics.mean(self.overhead_times)*1000:.1f} µs")
         print()
         print("Results")
         for result, freq in self.results.most_common():
@@ -374,6 +399,10 @@ def get_options(benchmarks: List[str], argv: List[str] = sys.argv[1:]) -> argpar
         "--profile", "-p", action="store_true", default=False,
         help="Collect profiling for all benchmarks"
     )
+    parser.add_argument(
+        "--runner", "-r", action="store", choices=sorted(RUNNERS), default="interpreted",
+        help="The runner class to use"
+    )
     parser.add_argument("benchmarks", nargs="*", choices=benchmarks)
     return parser.parse_args(argv)
 
@@ -387,17 +416,34 @@ class TagAssetBenchmark(Benchmark):
     resources = Mock_EC2().generate(n=1000)
 
 
+class TagAssetFilterBenchmark(Benchmark):
+    """
+    The tag checks of the enterprise-ec2-cloud-custodian-reserved-role-compliance policy, written in CEL.
+    It supplies a pool of 10,000 synthetic EC2 instances.
+    """
+    example = TagAssetFilter()
+    resources = Mock_EC2().generate(n=10_000)
+
+
+RUNNERS = {
+    "interpreted": celpy.InterpretedRunner,
+    "compiled": celpy.CompiledRunner,
+    "closure": celpy.ClosureRunner,
+}
+
+
 if __name__ == "__main__":
     logging.basicConfig()
-    defined_benchmarks = [c.__name__ for c in Benchmark.__subclasses__()]
-    options = get_options(defined_benchmarks)
+    defined_benchmarks = {c.__name__: c for c in Benchmark.__subclasses__()}
+    options = get_options(list(defined_benchmarks))
     if options.debug:
         logger.setLevel(logging.DEBUG)
     if options.profile:
         pr = cProfile.Profile()
         pr.enable()
     for benchmark in options.benchmarks:
-        b = TagAssetBenchmark()
+        b = defined_benchmarks[benchmark]()
+        b.runner_class = RUNNERS[options.runner]
         if options.cel:
             print(f"Policy {b.example.policy['name']}")
             multiline = '\n&& '.join(b.example.filter_expr.split('&&'))
@@ -26,8 +26,8 @@ def before_scenario(context, scenario):
 
     Check for command-line or environment option to pick the Runner to be used.
 
-    Use ``-D runner=interpreted`` or ``compiled``
-    Or set environment variable ``CEL_RUNNER=interpreted`` or ``compiled``
+    Use ``-D runner=interpreted``, ``compiled``, or ``closure``
+    Or set environment variable ``CEL_RUNNER=interpreted``, ``compiled``, or ``closure``
     """
     # context.data used by the CEL conformance test suite converted from textproto.
     context.data = {}
@@ -37,7 +37,7 @@ def before_scenario(context, scenario):
     context.data['container'] = ""  # If set, can associate a type binding from local proto files.
     context.data['json'] = []
 
-    RUNNERS = {"interpreted": celpy.InterpretedRunner, "compiled": celpy.CompiledRunner}
+    RUNNERS = {"interpreted": celpy.InterpretedRunner, "compiled": celpy.CompiledRunner, "closure": celpy.ClosureRunner}
     try:
         context.data['runner'] = RUNNERS[os.environ.get("CEL_RUNNER", "interpreted")]
     except KeyError:
@@ -44,11 +44,28 @@ two extensions:
 """
 
 import abc
+import collections
 import json  # noqa: F401
 import logging
+import marshal
 import sys
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
 from textwrap import indent
-from typing import Any, Dict, Optional, Type, cast
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
 
 import lark
 
@@ -58,18 +75,45 @@ from celpy.adapter import (  # noqa: F401
     CELJSONEncoder,
     json_to_cel,
 )
-from celpy.celparser import CELParseError, CELParser  # noqa: F401
+from celpy.celparser import (  # noqa: F401
+    ASTCache,
+    CacheInfo,
+    CELParseError,
+    CELParser,
+    CompactTree,
+    SharingReport,
+    compact,
+    share,
+)
+from celpy.checker import CELTypeError, check_types  # noqa: F401
+from celpy.cost import CostEstimate, estimate_cost  # noqa: F401
 from celpy.evaluation import (  # noqa: F401
     Activation,
     Annotation,
     CELEvalError,
     CELFunction,
+    ClosureCompiler,
+    CodeCache,
+    CompactTranspilerTree,
     Context,
+    CostBudget,
     Evaluator,
     Result,
     Transpiler,
     TranspilerTree,
     base_functions,
+    enforce_budget,
+    evaluation_activation,
+)
+from celpy.optimizer import (  # noqa: F401
+    OperandProfile,
+    OperandProfiler,
+    compile_patterns,
+    eliminate_common_subexpressions,
+    fold_constants,
+    fold_known,
+    index_membership,
+    reorder_operands,
 )
 
 # A parsed AST.
@@ -93,6 +137,8 @@ class Runner(abc.ABC):
     This class information provided to the :py:class:`Environment` to tailor the :py:mod:`lark` parser.
     The class named often includes specialized AST features
     needed by the :py:class:`Runner` subclss.
+    The ``compact_tree_class`` attribute is the equivalent :py:class:`celpy.celparser.CompactTree` class,
+    used when the :py:class:`Environment` compacts the AST.
 
     ..  todo:: For a better fit with Go language expectations
 
@@ -101,22 +147,35 @@ class Runner(abc.ABC):
     """
 
     tree_node_class: type = lark.Tree
+    compact_tree_class: type = CompactTree
 
     def __init__(
         self,
         environment: "Environment",
         ast: lark.Tree,
         functions: Optional[Dict[str, CELFunction]] = None,
+        cost_limit: Optional[int] = None,
+        known: Optional[Context] = None,
     ) -> None:
         """
         Initialize this ``Runner`` with a given AST.
         Get annotations from the :py:class:`Environment`,
         plus any unique functions defined here.
+
+        The ``cost_limit`` is the largest cost of one evaluation;
+        see :py:class:`celpy.evaluation.CostBudget`.
+
+        The ``known`` values are the variables of a residual program, see :py:meth:`partial_evaluate`.
+        These are in the base activation of each evaluation.
         """
         self.logger = logging.getLogger(f"celpy.{self.__class__.__name__}")
         self.environment = environment
         self.ast = ast
         self.functions = functions
+        self.cost_limit = cost_limit
+        self.known = known
+        # The size hints used to estimate the cost, set by :py:meth:`Environment.program`.
+        self.sizes: Optional[Mapping[str, int]] = None
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.environment}, {self.ast}, {self.functions})"
@@ -132,9 +191,53 @@ class Runner(abc.ABC):
             package=self.environment.package,
             annotations=self.environment.annotations,
             functions=self.functions,
+            vars=self.known,
         )
+        if self.cost_limit is not None:
+            base_activation.budget = CostBudget(self.cost_limit)
         return base_activation
 
+    @property
+    def cost(self) -> CostEstimate:
+        """
+        The estimated cost of an evaluation, using the size hints provided to :py:meth:`Environment.program`.
+        See :py:func:`celpy.cost.estimate_cost`.
+        """
+        return estimate_cost(self.ast, self.sizes)
+
+    def partial_evaluate(self, context: Context) -> "Runner":
+        """
+        Given the values of some of the variables, evaluate the parts of the AST that depend only on them.
+        The result is a residual program, which needs values for the remaining variables.
+
+        A ``&&``, ``||``, or ``?:`` operator with a known operand is simplified;
+        ``false && resource.x``, for example, becomes ``false``.
+        See :py:func:`celpy.optimizer.fold_known`.
+
+        A known name that isn't folded -- because a macro or ``cel.bind()`` uses the same name
+        for a local variable -- is resolved from the known values during evaluation.
+
+        :param context: a :py:class:`celpy.evaluation.Context` object with the known variable values.
+        :returns: A :py:class:`Runner` of the same class, for the residual AST.
+        """
+        activation = self.new_activation()
+        residual = fold_known(self.ast, context, activation)
+        residual = index_membership(residual, activation)
+        residual = compile_patterns(residual, activation)
+        runner = self.residual(residual, {**(self.known or {}), **context})
+        runner.sizes = self.sizes
+        return runner
+
+    def residual(self, ast: lark.Tree, known: Optional[Context] = None) -> "Runner":
+        """A :py:class:`Runner` like this one, for a different AST, with the known values."""
+        return self.__class__(
+            self.environment,
+            ast,
+            self.functions,
+            cost_limit=self.cost_limit,
+            known=known,
+        )
+
     @abc.abstractmethod
     def evaluate(self, activation: Context) -> celpy.celtypes.Value:  # pragma: no cover
         """
@@ -150,18 +253,63 @@ class Runner(abc.ABC):
         """
         ...
 
+    def evaluate_many(
+        self, contexts: Iterable[Context], executor: Optional[Executor] = None
+    ) -> List[celpy.celtypes.Value]:
+        """
+        Evaluate the AST for each of the contexts, using the threads of an executor.
+        This helps when functions wait for I/O, like the C7N functions that read cloud resources.
+
+        :param contexts: :py:class:`celpy.evaluation.Context` objects with variable values.
+        :param executor: An :py:class:`concurrent.futures.Executor` to evaluate with.
+            By default, a :py:class:`concurrent.futures.ThreadPoolExecutor` is created for these evaluations.
+        :returns: the computed values, in the order of the contexts.
+        :raises: the first :exc:`celpy.evaluation.CELEvalError`, in the order of the contexts.
+        """
+        if executor is None:
+            with ThreadPoolExecutor() as pool:
+                return list(pool.map(self.evaluate, contexts))
+        return list(executor.map(self.evaluate, contexts))
+
 
 class InterpretedRunner(Runner):
     """
     An **Adapter** for the :py:class:`celpy.evaluation.Evaluator` class.
+
+    The base activation is built once, when the program is created,
+    as is the :py:class:`celpy.evaluation.Evaluator` for each thread.
+    Each evaluation layers the context's variables onto the base activation.
     """
 
+    def __init__(
+        self,
+        environment: "Environment",
+        ast: lark.Tree,
+        functions: Optional[Dict[str, CELFunction]] = None,
+        cost_limit: Optional[int] = None,
+        known: Optional[Context] = None,
+    ) -> None:
+        super().__init__(environment, ast, functions, cost_limit, known)
+        self.base_activation = self.new_activation()
+        self.thread = threading.local()
+
+    @property
+    def evaluator(self) -> Evaluator:
+        """The :py:class:`celpy.evaluation.Evaluator` for the current thread."""
+        try:
+            return cast(Evaluator, self.thread.evaluator)
+        except AttributeError:
+            self.thread.evaluator = Evaluator(
+                ast=self.ast, activation=self.base_activation
+            )
+            return cast(Evaluator, self.thread.evaluator)
+
     def evaluate(self, context: Context) -> celpy.celtypes.Value:
-        e = Evaluator(
-            ast=self.ast,
-            activation=self.new_activation(),
-        )
-        value = e.evaluate(context)
+        activation = evaluation_activation(self.base_activation, context)
+        evaluator = self.evaluator
+        evaluator.activation = activation
+        with enforce_budget(activation):
+            value = evaluator.evaluate()
         return value
 
 
@@ -170,40 +318,259 @@ class CompiledRunner(Runner):
     An **Adapter** for the :py:class:`celpy.evaluation.Transpiler` class.
 
     A :py:class:`celpy.evaluation.Transpiler` instance transforms the AST into Python.
-    It uses :py:func:`compile` to create a code object.
-    The final :py:meth:`evaluate` method uses  :py:func:`exec` to evaluate the code object.
+    It uses :py:func:`compile` and :py:func:`exec` to create a ``cel_program()`` function, once.
+    The final :py:meth:`evaluate` method calls the function.
 
     Note, this requires the ``celpy.evaluation.TranspilerTree`` classes
     instead of the default ``lark.Tree`` class.
     """
 
     tree_node_class: type = TranspilerTree
+    compact_tree_class: type = CompactTranspilerTree
 
     def __init__(
         self,
         environment: "Environment",
         ast: TranspilerTree,
         functions: Optional[Dict[str, CELFunction]] = None,
+        cost_limit: Optional[int] = None,
+        known: Optional[Context] = None,
     ) -> None:
         """
-        Transpile to Python, and use :py:func:`compile` to create a code object.
+        Transpile to Python, and create the ``cel_program()`` function.
+        With the :py:class:`Environment`'s :py:class:`celpy.evaluation.CodeCache`,
+        the code of a previous process is used, if possible, instead of transpiling.
         """
-        super().__init__(environment, ast, functions)
+        super().__init__(environment, ast, functions, cost_limit, known)
         self.tp = Transpiler(
             ast=cast(TranspilerTree, self.ast),
             activation=self.new_activation(),
         )
-        self.tp.transpile()
-        self.logger.info("Transpiled:\n%s", indent(self.tp.source_text, "  "))
+        code_cache = environment.code_cache
+        if code_cache is None:
+            self.tp.transpile()
+        else:
+            key = code_cache.key(self.ast, self.functions)
+            saved = code_cache.get(key)
+            if saved is None:
+                self.tp.transpile()
+                code_cache.put(key, self.tp.executable_code, self.tp.constants)
+            else:
+                self.tp.load(*saved)
+                self.logger.debug("Loaded code %s", key)
+        if self.tp.module is not None and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Transpiled:\n%s", indent(self.tp.source_text, "  "))
 
     def evaluate(self, context: Context) -> celpy.celtypes.Value:
         """
-        Use :py:func:`exec` to execute the code object.
+        Call the transpiled ``cel_program()`` function.
         """
         value = self.tp.evaluate(context)
         return value
 
 
+class ClosureRunner(Runner):
+    """
+    An **Adapter** for the :py:class:`celpy.evaluation.ClosureCompiler` class.
+
+    A :py:class:`celpy.evaluation.ClosureCompiler` instance compiles the AST into a tree of Python closures,
+    once, when the runner is created.
+    The functions, literals, and local names are resolved then.
+    The :py:meth:`evaluate` method calls the closures;
+    it doesn't visit the AST, and doesn't execute any code objects.
+    """
+
+    def __init__(
+        self,
+        environment: "Environment",
+        ast: lark.Tree,
+        functions: Optional[Dict[str, CELFunction]] = None,
+        cost_limit: Optional[int] = None,
+        known: Optional[Context] = None,
+    ) -> None:
+        """
+        Compile the AST to closures.
+        """
+        super().__init__(environment, ast, functions, cost_limit, known)
+        self.cc = ClosureCompiler(ast=self.ast, activation=self.new_activation())
+
+    def evaluate(self, context: Context) -> celpy.celtypes.Value:
+        """
+        Call the closures.
+        """
+        value = self.cc.evaluate(context)
+        return value
+
+
+class AdaptiveRunner(Runner):
+    """
+    Measures the operands of the ``&&`` and ``||`` operators for a number of evaluations,
+    then evaluates the cheap, decisive operands first.
+
+    The first evaluations use a :py:class:`celpy.optimizer.OperandProfiler`,
+    which evaluates every operand, measuring the time, and noting when an operand decided the result.
+    After ``profile_evaluations`` evaluations, :py:func:`celpy.optimizer.reorder_operands` rebuilds the AST,
+    and a runner of the :py:class:`Environment` runner class evaluates it.
+
+    The :py:attr:`order` shows the operands of each chain, in the order they're evaluated.
+
+    With :py:meth:`Runner.evaluate_many`, several threads may be profiling at once.
+    A lock guards the count of evaluations and the switch to the new runner,
+    so exactly ``profile_evaluations`` evaluations are counted, and the new runner is built once.
+    """
+
+    def __init__(
+        self,
+        environment: "Environment",
+        ast: lark.Tree,
+        functions: Optional[Dict[str, CELFunction]] = None,
+        profile_evaluations: int = 100,
+        cost_limit: Optional[int] = None,
+        known: Optional[Context] = None,
+    ) -> None:
+        super().__init__(environment, ast, functions, cost_limit, known)
+        self.profile_evaluations = profile_evaluations
+        self.profile = OperandProfile(self.ast, self.new_activation())
+        self.runner: Optional[Runner] = None
+        self.lock = threading.Lock()
+        if not self.profile.roots:
+            # Nothing to reorder.
+            self.runner = environment.runner_class(
+                environment, ast, functions, cost_limit=cost_limit, known=known
+            )
+
+    def residual(self, ast: lark.Tree, known: Optional[Context] = None) -> Runner:
+        return self.__class__(
+            self.environment,
+            ast,
+            self.functions,
+            self.profile_evaluations,
+            cost_limit=self.cost_limit,
+            known=known,
+        )
+
+    @property
+    def order(self) -> List[List[str]]:
+        """
+        The source text of the operands of each ``&&`` and ``||`` chain, in evaluation order.
+        Until the profiling is finished, this is the order in which the operands are ranked so far.
+        """
+        return self.profile.plan()
+
+    def evaluate(self, context: Context) -> celpy.celtypes.Value:
+        if self.runner is not None:
+            return self.runner.evaluate(context)
+        activation = self.new_activation()
+        e = OperandProfiler(
+            ast=self.ast,
+            activation=activation,
+            profile=self.profile,
+        )
+        try:
+            with enforce_budget(activation):
+                return e.evaluate(context)
+        finally:
+            with self.lock:
+                # Another thread may have finished the profiling.
+                if self.runner is None:
+                    self.profile.evaluations += 1
+                    if self.profile.evaluations >= self.profile_evaluations:
+                        self.runner = self.environment.runner_class(
+                            self.environment,
+                            reorder_operands(self.ast, self.profile),
+                            self.functions,
+                            cost_limit=self.cost_limit,
+                            known=self.known,
+                        )
+
+
+class ProgramCache:
+    """
+    A bounded, least-recently used cache of :py:class:`Runner` objects.
+
+    A service that evaluates user-supplied expressions will often see the same text many times.
+    The :py:meth:`Environment.cached_program` method uses this to avoid parsing and transpiling
+    the text again.
+
+    The key is the expression text, the identity of the bound functions, the runner class,
+    and the identity of the :py:class:`Environment`, so environments with different
+    packages, annotations, or parser options can share one cache.
+
+    Entries are evicted when there are more than ``maxsize`` runners,
+    or when the estimated size of all runners exceeds ``max_bytes``.
+    Either limit can be ``None``.
+
+    The ``hits``, ``misses``, and ``evictions`` counters are available via :py:meth:`cache_info`.
+    The ``maxsize`` and ``currsize`` values are counts of :py:class:`Runner` objects.
+    """
+
+    def __init__(
+        self, maxsize: Optional[int] = 128, max_bytes: Optional[int] = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.runners: collections.OrderedDict[Hashable, Tuple[Runner, int]] = (
+            collections.OrderedDict()
+        )
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def sizeof(runner: Runner) -> int:
+        """
+        Estimate the memory used by a :py:class:`Runner`.
+        This is the size of the AST nodes and tokens, plus any transpiled code.
+        """
+        size = sys.getsizeof(runner)
+        for tree in runner.ast.iter_subtrees():
+            size += sys.getsizeof(tree) + sys.getsizeof(tree.children)
+            size += sum(
+                sys.getsizeof(c) for c in tree.children if isinstance(c, lark.Token)
+            )
+        if isinstance(runner, CompiledRunner):
+            size += len(marshal.dumps(runner.tp.executable_code))
+        return size
+
+    def get(self, key: Hashable) -> Optional[Runner]:
+        try:
+            runner, _ = self.runners[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.runners.move_to_end(key)
+        self.hits += 1
+        return runner
+
+    def put(self, key: Hashable, runner: Runner) -> None:
+        if key in self.runners:
+            self.nbytes -= self.runners.pop(key)[1]
+        size = self.sizeof(runner) if self.max_bytes is not None else 0
+        self.runners[key] = (runner, size)
+        self.nbytes += size
+        while self.runners and (
+            (self.maxsize is not None and len(self.runners) > self.maxsize)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, (_, size) = self.runners.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.runners.clear()
+        self.nbytes = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            self.maxsize or 0,
+            len(self.runners),
+        )
+
+
 # TODO: Refactor this class into a separate "cel_protobuf" module.
 # TODO: Rename this type to ``cel_protobuf.Int32Value``
 class Int32Value(celpy.celtypes.IntType):
@@ -269,9 +636,11 @@ class Environment:
     At this time, external functions are bound to the CEL expression.
     The  :py:class:`celpy.Runnable` can be evaluated repeatedly with multiple inputs, avoiding the overheads of compiling for each input value.
 
-    ..  note:: This cannot be shared by multiple threads.
+    ..  note:: An ``Environment`` cannot be shared by multiple threads.
 
-        Each thread must have an ``Environment`` instance.
+        Each thread that compiles expressions, or creates programs, must have an ``Environment`` instance.
+        A program can be evaluated by several threads at the same time;
+        see :py:meth:`Runner.evaluate_many`.
 
     ..  todo:: For a better fit with Go language expectations
 
@@ -285,6 +654,11 @@ class Environment:
         package: Optional[str] = None,
         annotations: Optional[Dict[str, Annotation]] = None,
         runner_class: Optional[Type[Runner]] = None,
+        ast_cache: Optional[ASTCache] = None,
+        program_cache: Optional[ProgramCache] = None,
+        compact: bool = False,
+        shaped: bool = False,
+        code_cache: Optional[CodeCache] = None,
     ) -> None:
         """
         Create a new environment.
@@ -299,8 +673,19 @@ class Environment:
 
             - Function names, using :py:class:`typing.Callable`.
         :param runner_class: the class of :py:class:`Runner` to use,
-            either :py:class:`InterpretedRunner` or :py:class:`CompiledRunner`.
+            :py:class:`InterpretedRunner`, :py:class:`CompiledRunner`, or :py:class:`ClosureRunner`.
             The default is :py:class:`InterpretedRunner`.
+        :param ast_cache: An optional :py:class:`celpy.celparser.ASTCache` used by :py:meth:`compile`
+            to save parsed ASTs and reload them in a later process.
+        :param program_cache: An optional :py:class:`ProgramCache` used by :py:meth:`cached_program`
+            to reuse :py:class:`Runner` objects.
+        :param compact: If true, :py:meth:`compile` rebuilds each AST with
+            :py:class:`celpy.celparser.CompactTree` nodes to reduce the memory used by saved programs.
+        :param shaped: If true, the parser inlines the single-child pass-through rules,
+            so a literal or identifier is a single node.
+            This reduces the number of nodes visited during evaluation.
+        :param code_cache: An optional :py:class:`celpy.evaluation.CodeCache` used by the :py:class:`CompiledRunner`
+            to save transpiled code and reload it in a later process.
         """
         sys.setrecursionlimit(2500)
         self.logger = logging.getLogger(f"celpy.{self.__class__.__name__}")
@@ -308,8 +693,15 @@ class Environment:
         self.annotations: Dict[str, Annotation] = annotations or {}
         self.logger.debug("Type Annotations %r", self.annotations)
         self.runner_class: Type[Runner] = runner_class or InterpretedRunner
-        self.cel_parser = CELParser(tree_class=self.runner_class.tree_node_class)
+        self.cel_parser = CELParser(
+            tree_class=self.runner_class.tree_node_class,
+            ast_cache=ast_cache,
+            shaped=shaped,
+        )
         self.runnable: Runner
+        self.program_cache = program_cache
+        self.code_cache = code_cache
+        self.compact = compact
 
         # Fold in standard annotations. These (generally) define well-known protobuf types.
         self.annotations.update(googleapis)
@@ -335,10 +727,43 @@ class Environment:
         :raises: :py:class:`celpy.celparser.CELParseError` exceptions for syntax errors.
         """
         ast = self.cel_parser.parse(text)
+        if self.compact:
+            ast = compact(ast, self.runner_class.compact_tree_class)
         return ast
 
+    def compile_many(
+        self, texts: Iterable[str]
+    ) -> Tuple[List[Expression], SharingReport]:
+        """
+        Compiles a batch of CEL sources, sharing the identical subtrees of the ASTs.
+
+        A policy pack has many expressions with common sub-expressions.
+        See :py:func:`celpy.celparser.share` for details of the structural sharing.
+        Both runners can use the resulting ASTs.
+
+        :param texts: The CEL texts to compile.
+        :returns: A list of ASTs, in the same order as the texts,
+            and a :py:class:`celpy.celparser.SharingReport`.
+        :raises: :py:class:`celpy.celparser.CELParseError` exceptions for syntax errors.
+        """
+        asts, report = share(self.compile(text) for text in texts)
+        self.logger.info(
+            "Compiled %d expressions: %d of %d nodes shared",
+            report.expressions,
+            report.shared_nodes,
+            report.nodes,
+        )
+        return asts, report
+
     def program(
-        self, expr: lark.Tree, functions: Optional[Dict[str, CELFunction]] = None
+        self,
+        expr: lark.Tree,
+        functions: Optional[Dict[str, CELFunction]] = None,
+        optimize: bool = False,
+        adaptive: int = 0,
+        check: bool = False,
+        cost_limit: Optional[int] = None,
+        sizes: Optional[Mapping[str, int]] = None,
     ) -> Runner:
         """
         Transforms the AST into an executable :py:class:`Runner` object.
@@ -346,12 +771,95 @@ class Environment:
 
         The resulting object has a :py:meth:`Runner.evaluate` method that applies the CEL structure to input data to compute the final result.
 
+        An ``in`` operator with a constant list, like ``x in ["a", "b"]``, uses a hash index
+        built here; see :py:func:`celpy.optimizer.index_membership`.
+        A ``matches()`` function with a string literal pattern uses a pattern compiled here;
+        see :py:func:`celpy.optimizer.compile_patterns`.
+
         :param expr: The parse tree from :py:meth:`compile`.
         :param functions: Any additional functions to be used by this CEL expression.
+        :param optimize: If true, the constant subtrees are evaluated once, here,
+            instead of during each evaluation,
+            and repeated subtrees are evaluated only once during each evaluation.
+            See :py:mod:`celpy.optimizer`. The ``expr`` is not changed.
+        :param adaptive: If positive, the number of evaluations used to measure
+            the operands of the ``&&`` and ``||`` operators.
+            After these, the operands are reordered so the cheap operands that usually decide the result are evaluated first.
+            See :py:class:`AdaptiveRunner`.
+        :param check: If true, the types of the operands are checked, using the annotations,
+            and operators applied to operands of known types use specialized functions.
+            See :py:mod:`celpy.checker`.
+        :param cost_limit: The largest cost of one evaluation.
+            An evaluation that exceeds this raises a :py:class:`celpy.evaluation.CELEvalError`.
+            See :py:class:`celpy.evaluation.CostBudget`.
+        :param sizes: The largest size of lists and maps named by variables, like ``{"resource.Tags": 50}``.
+            These are used to estimate the cost of the expression; see :py:mod:`celpy.cost`.
         :returns: A :py:class:`Runner` instance that can be evaluated with a ``Context`` that provides values.
+            The :py:attr:`Runner.cost` property is the estimated :py:class:`celpy.cost.CostEstimate`.
+        :raises: :py:class:`celpy.checker.CELTypeError` if the types are checked, and there's a type error.
+        :raises: :py:class:`celpy.evaluation.CELEvalError` if a literal ``matches()`` pattern is invalid.
         """
         self.logger.debug("Package %r", self.package)
-        runner_class = self.runner_class
-        self.runnable = runner_class(self, expr, functions)
+        activation = Activation(
+            package=self.package,
+            annotations=self.annotations,
+            functions=functions,
+        )
+        if check:
+            expr = check_types(expr, self.annotations, activation)
+        if optimize:
+            expr = fold_constants(expr, activation)
+            expr = eliminate_common_subexpressions(expr, activation)
+        expr = index_membership(expr, activation)
+        expr = compile_patterns(expr, activation)
+        if adaptive > 0:
+            self.runnable = AdaptiveRunner(
+                self, expr, functions, adaptive, cost_limit=cost_limit
+            )
+        else:
+            runner_class = self.runner_class
+            self.runnable = runner_class(self, expr, functions, cost_limit=cost_limit)
+        self.runnable.sizes = sizes
         self.logger.debug("Runnable %r", self.runnable)
         return self.runnable
+
+    def cached_program(
+        self,
+        text: str,
+        functions: Optional[
+            Union[Dict[str, CELFunction], Sequence[CELFunction]]
+        ] = None,
+    ) -> Runner:
+        """
+        Compiles the CEL source and creates a :py:class:`Runner`,
+        reusing a previous :py:class:`Runner` from the :py:class:`ProgramCache` if possible.
+
+        Without a :py:class:`ProgramCache`, this is ``program(compile(text), functions)``.
+
+        The functions are part of the key by identity: the same function objects bound to the same names.
+        This environment is also part of the key by identity;
+        each cached :py:class:`Runner` refers to its environment, so the identity isn't reused.
+
+        :param text: The CEL text to evaluate.
+        :param functions: Any additional functions to be used by this CEL expression.
+        :returns: A :py:class:`Runner` instance, possibly shared with previous callers.
+        :raises: :py:class:`celpy.celparser.CELParseError` exceptions for syntax errors.
+        """
+        if self.program_cache is None:
+            return self.program(
+                self.compile(text), cast(Dict[str, CELFunction], functions)
+            )
+        if functions is None:
+            bindings: Tuple[Any, ...] = ()
+        elif isinstance(functions, dict):
+            bindings = tuple(sorted((name, id(f)) for name, f in functions.items()))
+        else:
+            bindings = tuple((f.__name__, id(f)) for f in functions)
+        key = (text, bindings, self.runner_class, id(self))
+        runner = self.program_cache.get(key)
+        if runner is None:
+            runner = self.program(
+                self.compile(text), cast(Dict[str, CELFunction], functions)
+            )
+            self.program_cache.put(key, runner)
+        return runner
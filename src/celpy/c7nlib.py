@@ -252,6 +252,7 @@ of the resource being filtered. There are two alternative ways to handle this de
 
 To keep the library functions looking simple, the module global ``C7N`` is used.
 This avoids introducing a non-CEL parameter to the :py:mod:`celpy.c7nlib` functions.
+Each thread has its own ``C7N`` context, so several threads can evaluate with different filters.
 
 The ``C7N`` context object contains the following attributes:
 
@@ -284,19 +285,37 @@ import json
 import logging
 import os.path
 import sys
+import threading
 import urllib.request
 import zlib
+from concurrent.futures import Executor, ThreadPoolExecutor
 from contextlib import closing
+from functools import partial
 from packaging.version import Version
 from types import TracebackType
-from typing import Any, Callable, Dict, Iterator, List, Optional, Type, Union, cast
-
-from pendulum import parse as parse_date
-import jmespath  # type: ignore [import-untyped]
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+    cast,
+)
+
+# ``jmespath`` and ``pendulum`` are imported by the functions that need them.
 
 from celpy import InterpretedRunner, celtypes
 from celpy.adapter import json_to_cel
-from celpy.evaluation import Annotation, Context, Evaluator
+from celpy.evaluation import (
+    Annotation,
+    Context,
+    enforce_budget,
+    evaluation_activation,
+)
 
 logger = logging.getLogger(f"celpy.{__name__}")
 
@@ -320,8 +339,7 @@ class C7NContext:
         return f"{self.__class__.__name__}(filter={self.filter!r})"
 
     def __enter__(self) -> None:
-        global C7N
-        C7N = self
+        C7N.context = self
 
     def __exit__(
         self,
@@ -329,15 +347,26 @@ class C7NContext:
         exc_value: Optional[BaseException],
         traceback: Optional[TracebackType],
     ) -> None:
-        global C7N
-        C7N = cast("C7NContext", None)
+        C7N.context = None
         return
 
 
+class C7NThreadContext(threading.local):
+    """
+    The current :py:class:`C7NContext` of each thread.
+    The attributes of the current context, like ``filter``, are attributes of this object.
+    """
+
+    context: Optional[C7NContext] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.context, name)
+
+
 # An object used for access to the C7N filter.
 # A module global makes the interface functions much simpler.
 # They can rely on `C7N.filter` providing the current `CELFilter` instance.
-C7N = cast("C7NContext", None)
+C7N = C7NThreadContext()
 
 
 def key(source: celtypes.ListType, target: celtypes.StringType) -> celtypes.Value:
@@ -608,6 +637,8 @@ def jmes_path(
     """
     Apply JMESPath to an object read from from a URL.
     """
+    import jmespath  # type: ignore [import-untyped]
+
     expression = jmespath.compile(path_source)
     return json_to_cel(expression.search(source_data))
 
@@ -619,6 +650,8 @@ def jmes_path_map(
     Apply JMESPath to a each object read from from a URL.
     This is for ndjson, nljson and jsonl files.
     """
+    import jmespath
+
     expression = jmespath.compile(path_source)
     return celtypes.ListType(
         [json_to_cel(expression.search(row)) for row in source_data]
@@ -688,6 +721,8 @@ def image(resource: celtypes.MapType) -> celtypes.Value:
         creation_date = "2000-01-01T01:01:01.000Z"
         image_name = ""
 
+    from pendulum import parse as parse_date
+
     return json_to_cel({"CreationDate": parse_date(creation_date), "Name": image_name})
 
 
@@ -1654,10 +1689,25 @@ class C7N_Interpreted_Runner(InterpretedRunner):
     def evaluate(
         self, context: Context, filter: Optional[Any] = None
     ) -> celtypes.Value:
-        e = Evaluator(
-            ast=self.ast,
-            activation=self.new_activation(),
-        )
-        with C7NContext(filter=filter):
-            value = e.evaluate(context)
+        activation = evaluation_activation(self.base_activation, context)
+        evaluator = self.evaluator
+        evaluator.activation = activation
+        with C7NContext(filter=filter), enforce_budget(activation):
+            value = evaluator.evaluate()
         return value
+
+    def evaluate_many(
+        self,
+        contexts: Iterable[Context],
+        executor: Optional[Executor] = None,
+        filter: Optional[Any] = None,
+    ) -> List[celtypes.Value]:
+        """
+        Evaluate the AST for each of the contexts, with the C7N filter, using the threads of an executor.
+        See :py:meth:`celpy.Runner.evaluate_many`.
+        """
+        evaluate = partial(self.evaluate, filter=filter)
+        if executor is None:
+            with ThreadPoolExecutor() as pool:
+                return list(pool.map(evaluate, contexts))
+        return list(executor.map(evaluate, contexts))
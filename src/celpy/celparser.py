@@ -61,13 +61,30 @@ Example::
 
 """
 
+import hashlib
+import logging
+import marshal
+import os
 import re
+import tempfile
 from pathlib import Path
-from typing import Any, List, Optional, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 import lark.visitors
 from lark import Lark, Token, Tree  # noqa: F401
 from lark.exceptions import LexError, ParseError, UnexpectedCharacters, UnexpectedToken
+from lark.tree import Meta
 
 
 class CELParseError(Exception):
@@ -81,6 +98,595 @@ class CELParseError(Exception):
         self.column = column
 
 
+logger = logging.getLogger("celpy.celparser")
+
+
+class CompactTree(lark.Tree):
+    """
+    A smaller AST node, with only the rule name, the children, and a line and column.
+
+    A :py:class:`lark.Tree` has an instance ``__dict__`` and a :py:class:`lark.tree.Meta` object
+    with eight more attributes.
+    An application with many cached programs can use :py:func:`compact` after parsing
+    to replace the nodes with these ``__slots__``-based nodes.
+
+    The ``meta`` property is the node itself, so ``tree.meta.line`` and ``tree.meta.column``
+    work as they do for a :py:class:`lark.Tree`.
+    The :py:class:`celpy.evaluation.Evaluator` and :py:class:`celpy.evaluation.Transpiler`
+    visit these nodes like any other :py:class:`lark.Tree`.
+    """
+
+    __slots__ = ("data", "children", "line", "column")
+
+    def __init__(
+        self, data: str, children: List[Any], meta: Optional[Any] = None
+    ) -> None:
+        self.data = data
+        self.children = children
+        if meta is None or meta.empty:
+            self.line: Optional[int] = None
+            self.column: Optional[int] = None
+        else:
+            self.line = meta.line
+            self.column = meta.column
+
+    @property
+    def meta(self) -> "CompactTree":  # type: ignore[override]
+        return self
+
+    @property
+    def _meta(self) -> "CompactTree":  # type: ignore[override]
+        return self
+
+    @property
+    def empty(self) -> bool:
+        return self.line is None
+
+
+def compact(tree: Tree, tree_class: type = CompactTree) -> Tree:
+    """
+    Rebuild an AST with :py:class:`CompactTree` nodes.
+    The tokens are unchanged.
+
+    :param tree: The AST from :py:meth:`CELParser.parse`.
+    :param tree_class: A :py:class:`CompactTree` subclass, if the runner needs one.
+    :returns: An equivalent AST.
+    """
+    return cast(
+        Tree,
+        tree_class(
+            tree.data,
+            [
+                compact(c, tree_class) if isinstance(c, Tree) else c
+                for c in tree.children
+            ],
+            tree.meta,
+        ),
+    )
+
+
+class SharingReport(NamedTuple):
+    """The structural sharing achieved by :py:func:`share`."""
+
+    expressions: int
+    nodes: int
+    unique_nodes: int
+    tokens: int
+    unique_tokens: int
+
+    @property
+    def shared_nodes(self) -> int:
+        """The number of nodes replaced by a reference to an identical node."""
+        return self.nodes - self.unique_nodes
+
+
+def share(trees: Iterable[Tree]) -> Tuple[List[Tree], SharingReport]:
+    """
+    Hash-cons a batch of ASTs, so identical subtrees are stored once.
+
+    A policy pack will have many expressions with common sub-expressions,
+    like ``resource.Tags``, or the ``has(x.y) ? ... : false`` guard.
+    Two subtrees are identical when they have the same rule names and the same tokens.
+    Each node's children are replaced, in place, by the first identical node seen,
+    which makes the ASTs into a DAG.
+
+    The line and column of a shared node are those of its first occurrence.
+    An error in a shared subtree will report that position.
+
+    :param trees: ASTs from :py:meth:`CELParser.parse`. These are modified.
+    :returns: The ASTs, and a :py:class:`SharingReport`.
+    """
+    table: Dict[Tuple[Any, ...], Union[Tree, Token]] = {}
+    counts = {"nodes": 0, "tokens": 0, "unique_nodes": 0, "unique_tokens": 0}
+
+    def intern(node: Union[Tree, Token]) -> Union[Tree, Token]:
+        key: Tuple[Any, ...]
+        if isinstance(node, Token):
+            counts["tokens"] += 1
+            key = ("token", node.type, str(node))
+        else:
+            counts["nodes"] += 1
+            node.children = [intern(c) for c in node.children]
+            # Children are already unique, so their identity is a complete key.
+            key = (str(node.data), *(id(c) for c in node.children))
+        if key not in table:
+            table[key] = node
+            counts["unique_tokens" if isinstance(node, Token) else "unique_nodes"] += 1
+        return table[key]
+
+    asts = [cast(Tree, intern(tree)) for tree in trees]
+    return asts, SharingReport(
+        len(asts),
+        counts["nodes"],
+        counts["unique_nodes"],
+        counts["tokens"],
+        counts["unique_tokens"],
+    )
+
+
+class CacheInfo(NamedTuple):
+    """Statistics for a cache, modeled on :py:func:`functools.lru_cache` ``cache_info()``."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class DirectoryCache:
+    """
+    The files of a persistent cache in a directory, which several processes may share.
+
+    Each entry is a file named with a key and the ``SUFFIX`` of the subclass.
+    When the total size of the entries exceeds ``max_bytes``, the least-recently used
+    entries are removed.
+    Each hit touches the entry's modification time.
+
+    Files are written to a temporary name and then renamed,
+    so processes sharing a directory never see a partial entry.
+
+    The ``hits``, ``misses``, and ``evictions`` counters are available via :py:meth:`cache_info`.
+    """
+
+    SUFFIX = ".cache"
+
+    def __init__(
+        self, directory: Union[str, Path], max_bytes: int = 64 * 1024 * 1024
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.currsize = sum(size for _, size, _ in self.entries())
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        """The (mtime, size, path) of each entry. Other processes may remove entries at any time."""
+        entries = []
+        for path in self.directory.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # pragma: no cover
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def hit(self, path: Path) -> None:
+        """Counts a hit, and touches the entry, so it's recently used."""
+        try:
+            os.utime(path)
+        except OSError:  # pragma: no cover
+            pass
+        self.hits += 1
+
+    def discard(self, path: Path, ex: Exception) -> None:
+        """Removes an entry that can't be read, and counts a miss."""
+        logger.warning("Discarding unreadable cache entry %s: %s", path, ex)
+        path.unlink(missing_ok=True)
+        self.misses += 1
+
+    def write(self, path: Path, data: bytes) -> None:
+        """Saves an entry. Problems writing to the cache are logged, not raised."""
+        try:
+            fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp, path)
+        except OSError as ex:  # pragma: no cover
+            logger.warning("Cannot write cache entry %s: %s", path, ex)
+            return
+        self.currsize += len(data)
+        if self.currsize > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Removes least-recently used entries until the cache fits in ``max_bytes``."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self.currsize = total
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self.hits, self.misses, self.evictions, self.max_bytes, self.currsize
+        )
+
+
+class ASTCache(DirectoryCache):
+    """
+    An optional, persistent cache of parsed ASTs.
+
+    Applications like C7N compile the same CEL expressions each time a process starts.
+    This saves each AST in a directory, so a later process can reload it instead of parsing the text.
+
+    The key is a hash of the expression text, the grammar version, the tree class,
+    and whether or not the tree is shaped.
+    A change to any of these creates a new key; the stale entry will eventually be evicted.
+
+    The AST is saved with :py:mod:`marshal` as nested tuples.
+    A ``Tree`` is ``(data, meta, children)``, where ``meta`` is ``None`` or a tuple of positions.
+    A ``Token`` is an 8-tuple of ``(type, value, start_pos, line, column, end_line, end_column, end_pos)``.
+
+    See :py:class:`DirectoryCache` for the eviction of entries, and the sharing of the directory.
+
+    ::
+
+        cache = ASTCache(Path.home() / ".cache" / "celpy")
+        env = Environment(ast_cache=cache)
+    """
+
+    SUFFIX = ".ast"
+    FORMAT = 1
+    GRAMMAR_VERSION: Optional[str] = None
+
+    @classmethod
+    def grammar_version(cls) -> str:
+        """A digest of the grammar, the Lark version, and the serialization format."""
+        if cls.GRAMMAR_VERSION is None:
+            grammar = (Path(__file__).parent / "cel.lark").read_bytes()
+            digest = hashlib.sha256(grammar)
+            digest.update(f"{lark.__version__}:{cls.FORMAT}".encode("utf-8"))
+            cls.GRAMMAR_VERSION = digest.hexdigest()
+        return cls.GRAMMAR_VERSION
+
+    def key(self, text: str, tree_class: type, shaped: bool = False) -> str:
+        digest = hashlib.sha256(self.grammar_version().encode("utf-8"))
+        digest.update(f"{tree_class.__module__}.{tree_class.__qualname__}".encode())
+        if shaped:
+            digest.update(b"\x00shaped")
+        digest.update(b"\x00")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, text: str, tree_class: type, shaped: bool = False) -> Path:
+        return self.directory / f"{self.key(text, tree_class, shaped)}{self.SUFFIX}"
+
+    @staticmethod
+    def encode(node: Union[Tree, Token]) -> Tuple[Any, ...]:
+        if isinstance(node, Token):
+            return (
+                node.type,
+                str(node),
+                node.start_pos,
+                node.line,
+                node.column,
+                node.end_line,
+                node.end_column,
+                node.end_pos,
+            )
+        meta = None
+        if not node.meta.empty:
+            m = node.meta
+            meta = (m.line, m.column) + tuple(
+                getattr(m, name, None)
+                for name in ("end_line", "end_column", "start_pos", "end_pos")
+            )
+        return (
+            str(node.data),
+            meta,
+            tuple(ASTCache.encode(c) for c in node.children),
+        )
+
+    @staticmethod
+    def decode(item: Tuple[Any, ...], tree_class: type) -> Union[Tree, Token]:
+        if len(item) == 8:
+            return Token(*item)
+        data, positions, children = item
+        meta = Meta()  # type: ignore[no-untyped-call]
+        if positions is not None:
+            (
+                meta.line,
+                meta.column,
+                meta.end_line,
+                meta.end_column,
+                meta.start_pos,
+                meta.end_pos,
+            ) = positions
+            meta.empty = False
+        return cast(
+            Tree,
+            tree_class(data, [ASTCache.decode(c, tree_class) for c in children], meta),
+        )
+
+    def get(self, text: str, tree_class: type, shaped: bool = False) -> Optional[Tree]:
+        """Returns the cached AST, or ``None``."""
+        path = self.path(text, tree_class, shaped)
+        try:
+            tree = self.decode(marshal.loads(path.read_bytes()), tree_class)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (EOFError, ValueError, TypeError) as ex:
+            self.discard(path, ex)
+            return None
+        self.hit(path)
+        return cast(Tree, tree)
+
+    def put(
+        self, text: str, tree_class: type, tree: Tree, shaped: bool = False
+    ) -> None:
+        """Saves an AST. Problems writing to the cache are logged, not raised."""
+        path = self.path(text, tree_class, shaped)
+        try:
+            data = marshal.dumps(self.encode(tree))
+        except ValueError as ex:  # pragma: no cover
+            # Too deeply nested for marshal. Parse it again next time.
+            logger.debug("Not caching %r: %s", text, ex)
+            return
+        self.write(path, data)
+
+
+class FastPathParser:
+    """
+    A hand-written recognizer for the simplest CEL expressions.
+
+    Many expressions are tiny: ``resource.State.Name == "running"``, a single identifier, or a literal.
+    The full LALR parse is most of the cost of compiling these.
+
+    This recognizes dotted identifiers, literals, a single comparison or ``in``,
+    and ``&&`` and ``||`` chains of those.
+    It builds the same tree -- including the positions -- as the Lark parser.
+    For anything else, :py:meth:`parse` returns ``None``, and :py:class:`CELParser` uses Lark.
+
+    To stay simple, some literals are left to Lark:
+    strings with escapes or prefixes, multi-line strings, hexadecimal and negative numbers,
+    and floats with exponents.
+    Comments and reserved words are also left to Lark.
+
+    >>> FastPathParser(shaped=True).parse('x.y == "z"')
+    Tree(Token('RULE', 'relation'), [Tree(Token('RULE', 'relation_eq'), [Tree(Token('RULE', 'member_dot'), [Tree(Token('RULE', 'ident'), [Token('IDENT', 'x')]), Token('IDENT', 'y')])]), Tree(Token('RULE', 'literal'), [Token('STRING_LIT', '"z"')])])
+    >>> FastPathParser().parse('x + 1') is None
+    True
+    """
+
+    TOKENS = re.compile(
+        r"""
+        (?P<WHITESPACE>[\t\n\f\r ]+)
+        | (?P<FLOAT_LIT>[0-9]+\.[0-9]+(?![\w.]))
+        | (?P<UINT_LIT>[0-9]+[uU](?![\w.]))
+        | (?P<INT_LIT>[0-9]+(?![\w.]))
+        | (?P<STRING_LIT>"[^"\\\n\r]*"(?!")|'[^'\\\n\r]*'(?!'))
+        | (?P<IDENT>[_a-zA-Z][_a-zA-Z0-9]*(?![\w"']))
+        | (?P<OP>==|!=|<=|>=|&&|\|\||[<>.])
+        """,
+        re.X,
+    )
+
+    RELATIONS = {
+        "<": "relation_lt",
+        "<=": "relation_le",
+        ">": "relation_gt",
+        ">=": "relation_ge",
+        "==": "relation_eq",
+        "!=": "relation_ne",
+        "in": "relation_in",
+    }
+
+    RESERVED = frozenset(
+        {
+            "as",
+            "break",
+            "const",
+            "continue",
+            "else",
+            "for",
+            "function",
+            "if",
+            "import",
+            "let",
+            "loop",
+            "package",
+            "namespace",
+            "return",
+            "var",
+            "void",
+            "while",
+        }
+    )
+
+    #: Rule names are tokens in a Lark tree.
+    RULES = {
+        name: Token("RULE", name)
+        for name in (
+            "expr",
+            "conditionalor",
+            "conditionaland",
+            "relation",
+            *RELATIONS.values(),
+            "addition",
+            "multiplication",
+            "unary",
+            "member",
+            "member_dot",
+            "primary",
+            "ident",
+            "literal",
+        )
+    }
+
+    def __init__(self, tree_class: type = lark.Tree, shaped: bool = False) -> None:
+        self.tree_class = tree_class
+        self.shaped = shaped
+
+    def tokenize(self, text: str) -> Optional[List[Token]]:
+        """The tokens, with their positions, or ``None`` if there's anything unexpected."""
+        tokens: List[Token] = []
+        line, line_start, pos = 1, 0, 0
+        while pos < len(text):
+            match = self.TOKENS.match(text, pos)
+            if match is None:
+                return None
+            kind, value = cast(str, match.lastgroup), match.group()
+            if kind == "WHITESPACE":
+                if "\n" in value:
+                    line += value.count("\n")
+                    line_start = pos + value.rindex("\n") + 1
+            elif kind == "IDENT" and value in ("true", "false"):
+                # Created by CELParser.ambiguous_literals, without a position.
+                tokens.append(Token("BOOL_LIT", value))
+            elif kind == "IDENT" and value in self.RESERVED:
+                return None
+            else:
+                if kind == "IDENT" and value in ("null", "in"):
+                    kind = "NULL_LIT" if value == "null" else "OP"
+                column = pos - line_start + 1
+                tokens.append(
+                    Token(
+                        kind,
+                        value,
+                        pos,
+                        line,
+                        column,
+                        line,
+                        column + len(value),
+                        match.end(),
+                    )
+                )
+            pos = match.end()
+        return tokens
+
+    def node(
+        self,
+        data: str,
+        children: List[Union[Tree, Token]],
+        first: Union[Tree, Token],
+        last: Union[Tree, Token],
+    ) -> Tree:
+        """
+        Build a tree with the positions Lark's ``propagate_positions`` option would provide:
+        from the start of the first child to the end of the last child, including anonymous tokens.
+        """
+        # Tokens and Meta objects have the same position attributes.
+        start: Any = first if isinstance(first, Token) else first.meta
+        end: Any = last if isinstance(last, Token) else last.meta
+        meta = Meta()  # type: ignore[no-untyped-call]
+        meta.empty = False
+        meta.line, meta.column, meta.start_pos = (
+            start.line,
+            start.column,
+            start.start_pos,
+        )
+        meta.end_line, meta.end_column, meta.end_pos = (
+            end.end_line,
+            end.end_column,
+            end.end_pos,
+        )
+        return cast(Tree, self.tree_class(self.RULES[data], children, meta))
+
+    def wrap(self, tree: Tree, *rules: str) -> Tree:
+        """Wrap a tree in single-child rules; a shaped tree inlines them."""
+        if not self.shaped:
+            for rule in rules:
+                tree = self.node(rule, [tree], tree, tree)
+        return tree
+
+    def parse(self, text: str) -> Optional[Tree]:
+        """
+        Parse a trivial expression.
+
+        :param text: CEL source.
+        :returns: The AST, or ``None`` if the Lark parser is required.
+        """
+        tokens = self.tokenize(text)
+        if not tokens:
+            return None
+        position = 0
+
+        def operand() -> Optional[Tree]:
+            nonlocal position
+            if position >= len(tokens):
+                return None
+            token = tokens[position]
+            position += 1
+            if token.type == "IDENT":
+                tree = self.wrap(self.node("ident", [token], token, token), "primary")
+                while (
+                    position + 1 < len(tokens)
+                    and tokens[position] == "."
+                    and tokens[position].type == "OP"
+                ):
+                    name = tokens[position + 1]
+                    if name.type != "IDENT":
+                        return None
+                    tree = self.wrap(tree, "member")
+                    tree = self.node("member_dot", [tree, name], tree, name)
+                    position += 2
+                return self.wrap(tree, "member")
+            elif token.type != "OP":
+                tree = self.node("literal", [token], token, token)
+                return self.wrap(tree, "primary", "member")
+            return None
+
+        def relation() -> Optional[Tree]:
+            nonlocal position
+            left = operand()
+            if left is None:
+                return None
+            left = self.wrap(left, "unary", "multiplication", "addition", "relation")
+            if position < len(tokens) and tokens[position] in self.RELATIONS:
+                op = tokens[position]
+                position += 1
+                right = operand()
+                if right is None:
+                    return None
+                right = self.wrap(right, "unary", "multiplication", "addition")
+                left = self.node(self.RELATIONS[op], [left], left, op)
+                return self.node("relation", [left, right], left, right)
+            return left
+
+        def chain(
+            rule: str, operator: str, item: Callable[[], Optional[Tree]]
+        ) -> Optional[Tree]:
+            nonlocal position
+            left = item()
+            if left is None:
+                return None
+            left = self.wrap(left, rule)
+            while position < len(tokens) and tokens[position] == operator:
+                position += 1
+                right = item()
+                if right is None:
+                    return None
+                left = self.node(rule, [left, right], left, right)
+            return left
+
+        tree = chain(
+            "conditionalor",
+            "||",
+            lambda: chain("conditionaland", "&&", relation),
+        )
+        if tree is None or position != len(tokens):
+            return None
+        return self.wrap(tree, "expr")
+
+
 class CELParser:
     """
     Creates a Lark parser with the required options.
@@ -100,25 +706,137 @@ class CELParser:
 
     This is also an **Adapter** for the CEL parser to provide pleasant
     syntax error messages.
+
+    An optional :py:class:`ASTCache` can be provided to save and reload parsed ASTs.
+
+    ..  rubric:: Shaped Trees
+
+    The grammar has a deep chain of pass-through rules.
+    Every literal or identifier is wrapped in
+    ``expr``, ``conditionalor``, ``conditionaland``, ``relation``, ``addition``,
+    ``multiplication``, ``unary``, ``member``, and ``primary`` nodes.
+
+    With ``shaped=True``, these rules are inlined when they have a single child.
+    This uses the Lark ``?rule`` construct, so the parser builds the smaller tree directly.
+    A literal or identifier is a single node; operator nodes are unchanged.
+
+    >>> p = CELParser(shaped=True)
+    >>> print(p.parse('type(null)').pretty().replace("\t","   "))  # doctest: +NORMALIZE_WHITESPACE
+    ident_arg
+      type
+      exprlist
+        literal    null
+
+    There's a distinct singleton, ``CEL_SHAPED_PARSER``, for this variant of the grammar.
+
+    ..  rubric:: Fast Path
+
+    Trivial expressions are parsed by a :py:class:`FastPathParser` instead of Lark.
+    The resulting tree is the same.
+    Use ``fast_path=False`` to always use the Lark parser.
     """
 
     CEL_PARSER: Optional[Lark] = None
+    CEL_SHAPED_PARSER: Optional[Lark] = None
+
+    #: The pass-through rules inlined in a shaped tree.
+    SHAPED_RULES = (
+        "expr",
+        "conditionalor",
+        "conditionaland",
+        "relation",
+        "addition",
+        "multiplication",
+        "unary",
+        "member",
+        "primary",
+    )
+
+    def __init__(
+        self,
+        tree_class: type = lark.Tree,
+        ast_cache: Optional[ASTCache] = None,
+        debug: bool = False,
+        shaped: bool = False,
+        fast_path: bool = True,
+    ) -> None:
+        self.tree_class = tree_class
+        self.ast_cache = ast_cache
+        self.shaped = shaped
+        self.fast_path = FastPathParser(tree_class, shaped) if fast_path else None
+        if shaped:
+            if CELParser.CEL_SHAPED_PARSER is None:
+                CELParser.CEL_SHAPED_PARSER = self.build(tree_class, debug, shaped)
+        elif CELParser.CEL_PARSER is None:
+            CELParser.CEL_PARSER = self.build(tree_class, debug, shaped)
 
-    def __init__(self, tree_class: type = lark.Tree) -> None:
-        if CELParser.CEL_PARSER is None:
-            CEL_grammar = (Path(__file__).parent / "cel.lark").read_text()
-            CELParser.CEL_PARSER = Lark(
+    @classmethod
+    def grammar(cls, shaped: bool = False) -> str:
+        """
+        The text of ``cel.lark``.
+        For a shaped tree, the pass-through rules are marked with ``?`` to inline them.
+        """
+        CEL_grammar = (Path(__file__).parent / "cel.lark").read_text()
+        if shaped:
+            CEL_grammar = re.sub(
+                rf"^({'|'.join(cls.SHAPED_RULES)})(\s*:)",
+                r"?\1\2",
                 CEL_grammar,
-                parser="lalr",
-                start="expr",
-                debug=True,
-                g_regex_flags=re.M,
-                lexer_callbacks={"IDENT": self.ambiguous_literals},
-                propagate_positions=True,
-                maybe_placeholders=False,
-                priority="invert",
-                tree_class=tree_class,
+                flags=re.M,
+            )
+        return CEL_grammar
+
+    def build(self, tree_class: type, debug: bool, shaped: bool) -> Lark:
+        return Lark(
+            self.grammar(shaped),
+            parser="lalr",
+            start="expr",
+            debug=debug,
+            g_regex_flags=re.M,
+            lexer_callbacks={"IDENT": self.ambiguous_literals},
+            propagate_positions=True,
+            maybe_placeholders=False,
+            priority="invert",
+            tree_class=tree_class,
+            cache=self.tables_path(tree_class, shaped) or False,
+        )
+
+    @staticmethod
+    def tables_path(tree_class: type, shaped: bool = False) -> Optional[str]:
+        """
+        The file with the LALR parser tables.
+
+        Building the parser tables from ``cel.lark`` is most of the cost of creating a parser.
+        The first process saves the tables, and later processes reload them without grammar analysis.
+        Lark checks a hash of the grammar, the options, and the versions of Lark and Python
+        before it uses the saved tables.
+
+        The ``CEL_PARSER_CACHE`` environment variable names a directory for the tables.
+        An empty value disables saving the tables.
+        The default is ``$XDG_CACHE_HOME/celpy``, or ``~/.cache/celpy``.
+        If this directory can't be created, the tables are not saved.
+
+        :param tree_class: The tree class; each class has a distinct file.
+        :param shaped: The shaped grammar has a distinct file.
+        :returns: A file name, or ``None``.
+        """
+        try:
+            directory = Path(
+                os.environ.get(
+                    "CEL_PARSER_CACHE",
+                    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+                    / "celpy",
+                )
             )
+            if directory == Path(""):
+                return None
+            directory.mkdir(parents=True, exist_ok=True)
+        except (OSError, RuntimeError) as ex:
+            logger.debug("Not saving parser tables: %s", ex)
+            return None
+        variant = ".shaped" if shaped else ""
+        name = f"{tree_class.__module__}.{tree_class.__qualname__}{variant}.tables"
+        return str(directory / name)
 
     @staticmethod
     def ambiguous_literals(t: Token) -> Token:
@@ -130,17 +848,27 @@ class CELParser:
         return t
 
     def parse(self, text: str) -> Tree:
-        if CELParser.CEL_PARSER is None:
+        parser = CELParser.CEL_SHAPED_PARSER if self.shaped else CELParser.CEL_PARSER
+        if parser is None:
             raise TypeError("No grammar loaded")  # pragma: no cover
         self.text = text
-        try:
-            return CELParser.CEL_PARSER.parse(self.text)
-        except (UnexpectedToken, UnexpectedCharacters) as ex:
-            message = ex.get_context(text)
-            raise CELParseError(message, *ex.args, line=ex.line, column=ex.column)
-        except (LexError, ParseError) as ex:  # pragma: no cover
-            message = ex.args[0].splitlines()[0]
-            raise CELParseError(message, *ex.args)
+        if self.ast_cache is not None:
+            cached = self.ast_cache.get(text, self.tree_class, self.shaped)
+            if cached is not None:
+                return cached
+        tree = self.fast_path.parse(text) if self.fast_path else None
+        if tree is None:
+            try:
+                tree = parser.parse(self.text)
+            except (UnexpectedToken, UnexpectedCharacters) as ex:
+                message = ex.get_context(text)
+                raise CELParseError(message, *ex.args, line=ex.line, column=ex.column)
+            except (LexError, ParseError) as ex:  # pragma: no cover
+                message = ex.args[0].splitlines()[0]
+                raise CELParseError(message, *ex.args)
+        if self.ast_cache is not None:
+            self.ast_cache.put(text, self.tree_class, tree, self.shaped)
+        return tree
 
     def error_text(
         self, message: str, line: Optional[int] = None, column: Optional[int] = None
@@ -335,14 +1063,14 @@ class DumpAST(lark.visitors.Visitor_Recursive):
             self.stack.append(f"({left})")
 
     def list_lit(self, tree: lark.Tree) -> None:
-        if self.stack:
+        if tree.children:
             left = self.stack.pop()
             self.stack.append(f"[{left}]")
         else:
             self.stack.append("")
 
     def map_lit(self, tree: lark.Tree) -> None:
-        if self.stack:
+        if tree.children:
             left = self.stack.pop()
             self.stack.append(f"{{{left}}}")
         else:
@@ -380,6 +1108,10 @@ class DumpAST(lark.visitors.Visitor_Recursive):
         if tree.children:
             self.stack.append(cast(lark.Token, tree.children[0]).value)
 
+    def folded(self, tree: lark.Tree) -> None:
+        """The source text of a subtree replaced by :py:mod:`celpy.optimizer`."""
+        self.stack.append(cast(lark.Token, tree.children[1]).value)
+
 
 def tree_dump(ast: Tree) -> str:
     """Dumps the AST to approximate the original source"""
@@ -392,7 +1124,7 @@ if __name__ == "__main__":  # pragma: no cover
     # A minimal sanity check.
     # This is a smoke test for the grammar to expose shift/reduce or reduce/reduce conflicts.
     # It will produce a RuntimeWarning because it's not the proper main program.
-    p = CELParser()
+    p = CELParser(debug=True)
 
     text = """
     account.balance >= transaction.withdrawal
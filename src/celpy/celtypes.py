@@ -209,9 +209,8 @@ from typing import (
     overload,
 )
 
-import pendulum
-from pendulum import timezone
-import pendulum.tz.exceptions
+# ``pendulum`` is imported when a timestamp or timezone is first parsed.
+# It's a large package, and many expressions don't use timestamps.
 
 
 logger = logging.getLogger(f"celpy.{__name__}")
@@ -1142,6 +1141,8 @@ class TimestampType(datetime.datetime):
 
         elif isinstance(source, str):
             # Use ``pendulum`` to try a variety of text formats.
+            import pendulum
+
             parsed_datetime = cast(datetime.datetime, pendulum.parse(source))
             return super().__new__(
                 cls,
@@ -1208,13 +1209,16 @@ class TimestampType(datetime.datetime):
         ..  TODO: Permit an extension into the timezone lookup.
             Tweak ``celpy.celtypes.TimestampType.TZ_ALIASES``.
         """
+        import pendulum
+        import pendulum.tz.exceptions
+
         tz_lookup = str(tz_name)
         tz: Optional[datetime.tzinfo]
         if tz_lookup in cls.TZ_ALIASES:
-            tz = timezone(cls.TZ_ALIASES[tz_lookup])
+            tz = pendulum.timezone(cls.TZ_ALIASES[tz_lookup])
         else:
             try:
-                tz = cast(datetime.tzinfo, timezone(tz_lookup))
+                tz = cast(datetime.tzinfo, pendulum.timezone(tz_lookup))
             except pendulum.tz.exceptions.InvalidTimezone:
                 # ±hh:mm format...
                 tz = cls.tz_offset_parse(tz_name)
@@ -1238,7 +1242,7 @@ class TimestampType(datetime.datetime):
             tz = TimestampType.tz_name_lookup(tz_name)
             return tz
         else:
-            return timezone("UTC")
+            return datetime.timezone.utc
 
     def getDate(self, tz_name: Optional[StringType] = None) -> IntType:
         new_tz = self.tz_parse(tz_name)
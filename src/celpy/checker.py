@@ -0,0 +1,493 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Static type checking of a CEL AST, applied by :py:meth:`celpy.Environment.program`.
+
+The :py:class:`celpy.Environment` annotations provide the types of variables,
+for example ``{"x": celpy.celtypes.IntType}``.
+The :py:class:`TypeChecker` uses these, and the types of literals,
+to find the type of each sub-expression.
+An operator applied to operands of types it can't handle, like ``x + "s"``,
+is a :py:exc:`CELTypeError`, reported before any evaluation.
+
+The type of an operator's result is found by applying the built-in operator function
+to a sample value of each operand type.
+The checker's rules are the rules used during evaluation.
+Where a type can't be known -- a map value, a function result, a macro variable -- the type is dynamic,
+and nothing is checked.
+
+..  rubric:: Specialized Operators
+
+A comparison, or integer arithmetic, with two operands of the same known type
+uses a specialized function, like :py:func:`int_lt`, instead of the generic operator function.
+The checker adds the function to the operator node of the AST,
+where both runners find it; see :py:func:`celpy.evaluation.specialized`.
+
+A specialized function checks the types of the actual values, since a variable can have a value
+that doesn't match its annotation.
+If the types don't match, it uses the generic operator function.
+
+>>> import celpy
+>>> env = celpy.Environment(annotations={"x": celpy.celtypes.IntType})
+>>> checked = check_types(env.compile("x < 42"), env.annotations)
+>>> [node.children[1].__name__ for node in checked.find_data("relation_lt")]
+['int_lt']
+>>> check_types(env.compile('x + "s"'), env.annotations)
+Traceback (most recent call last):
+...
+celpy.checker.CELTypeError: found no matching overload for '_+_' applied to '(int, string)'
+
+The AST provided is not changed.
+"""
+
+import logging
+import operator
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Type, cast
+
+import lark
+
+import celpy.celtypes
+from celpy.evaluation import (
+    MACRO_NAMES,
+    Activation,
+    Annotation,
+    CELEvalError,
+    CELFunction,
+    Evaluator,
+    base_functions,
+    local_arguments,
+    local_binding,
+    local_name,
+)
+from celpy.optimizer import OPERATORS, PASS_THROUGH, Optimizer
+
+logger = logging.getLogger("celpy.checker")
+
+# The CEL name of each type the checker tracks.
+TYPE_NAMES: Dict[type, str] = {
+    celpy.celtypes.BoolType: "bool",
+    celpy.celtypes.BytesType: "bytes",
+    celpy.celtypes.DoubleType: "double",
+    celpy.celtypes.DurationType: "google.protobuf.Duration",
+    celpy.celtypes.IntType: "int",
+    celpy.celtypes.ListType: "list",
+    celpy.celtypes.MapType: "map",
+    celpy.celtypes.StringType: "string",
+    celpy.celtypes.TimestampType: "google.protobuf.Timestamp",
+    celpy.celtypes.UintType: "uint",
+    type(None): "null_type",
+}
+
+# A function to create a value of each type, used to find the result type of an operator.
+# The values are created as needed, to avoid importing the date-time packages.
+SAMPLES: Dict[type, Callable[[], Any]] = {
+    celpy.celtypes.BoolType: lambda: celpy.celtypes.BoolType(True),
+    celpy.celtypes.BytesType: lambda: celpy.celtypes.BytesType(b"b"),
+    celpy.celtypes.DoubleType: lambda: celpy.celtypes.DoubleType(1.0),
+    celpy.celtypes.DurationType: lambda: celpy.celtypes.DurationType("1s"),
+    celpy.celtypes.IntType: lambda: celpy.celtypes.IntType(1),
+    celpy.celtypes.ListType: lambda: celpy.celtypes.ListType([]),
+    celpy.celtypes.MapType: lambda: celpy.celtypes.MapType({}),
+    celpy.celtypes.StringType: lambda: celpy.celtypes.StringType("s"),
+    celpy.celtypes.TimestampType: lambda: celpy.celtypes.TimestampType(
+        "2000-01-01T00:00:00Z"
+    ),
+    celpy.celtypes.UintType: lambda: celpy.celtypes.UintType(1),
+    type(None): lambda: None,
+}
+
+# The result types of functions and methods, independent of their arguments.
+FUNCTION_TYPES: Dict[str, type] = {
+    "bool": celpy.celtypes.BoolType,
+    "bytes": celpy.celtypes.BytesType,
+    "double": celpy.celtypes.DoubleType,
+    "duration": celpy.celtypes.DurationType,
+    "int": celpy.celtypes.IntType,
+    "string": celpy.celtypes.StringType,
+    "timestamp": celpy.celtypes.TimestampType,
+    "uint": celpy.celtypes.UintType,
+    "size": celpy.celtypes.IntType,
+    "contains": celpy.celtypes.BoolType,
+    "startsWith": celpy.celtypes.BoolType,
+    "endsWith": celpy.celtypes.BoolType,
+    "matches": celpy.celtypes.BoolType,
+}
+
+# The result types of the macros.
+MACRO_TYPES: Dict[str, type] = {
+    "all": celpy.celtypes.BoolType,
+    "exists": celpy.celtypes.BoolType,
+    "exists_one": celpy.celtypes.BoolType,
+    "map": celpy.celtypes.ListType,
+    "filter": celpy.celtypes.ListType,
+}
+
+
+class CELTypeError(Exception):
+    """
+    A type error in the CEL expression, found before evaluation.
+
+    The ``issues`` are the messages for all of the type errors found,
+    the line and column are the position of the first.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        line: Optional[int] = None,
+        column: Optional[int] = None,
+        issues: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(*args)
+        self.line = line
+        self.column = column
+        self.issues = issues or list(args)
+
+
+def specialize(
+    name: str,
+    cel_type: Type[Any],
+    function: Callable[[Any, Any], Any],
+    result: Callable[[Any], Any],
+    generic: CELFunction,
+) -> CELFunction:
+    """
+    Creates a specialized operator function for two operands of the given type.
+
+    The ``function`` is the operation of the Python base class, like :py:meth:`int.__lt__`,
+    which bypasses the type-matching and range-checking wrappers of the CEL type.
+    The ``result`` converts the Python value to the CEL result.
+    The ``generic`` operator function is used for any other operand types.
+    """
+
+    def specialized_function(a: Any, b: Any) -> Any:
+        if type(a) is cel_type and type(b) is cel_type:
+            return result(function(a, b))
+        return generic(a, b)
+
+    specialized_function.__name__ = specialized_function.__qualname__ = name
+    specialized_function.__module__ = __name__
+    specialized_function.__doc__ = (
+        f"{generic.__name__} for two {TYPE_NAMES[cel_type]} values."
+    )
+    return specialized_function
+
+
+def int64_result(value: int) -> celpy.celtypes.IntType:
+    if -(2**63) <= value < 2**63:
+        return int.__new__(celpy.celtypes.IntType, value)
+    raise ValueError("overflow")
+
+
+def uint64_result(value: int) -> celpy.celtypes.UintType:
+    if 0 <= value < 2**64:
+        return int.__new__(celpy.celtypes.UintType, value)
+    raise ValueError("overflow")
+
+
+#: The specialized functions, by operator and operand type.
+#: Each is also a global of this module, so transpiled code can refer to it.
+SPECIALIZED: Dict[Tuple[str, type], CELFunction] = {}
+
+for _prefix, _cel_type, _base in [
+    ("bool", celpy.celtypes.BoolType, int),
+    ("double", celpy.celtypes.DoubleType, float),
+    ("int", celpy.celtypes.IntType, int),
+    ("string", celpy.celtypes.StringType, str),
+    ("uint", celpy.celtypes.UintType, int),
+]:
+    for _operator, _method in [
+        ("_<_", "lt"),
+        ("_<=_", "le"),
+        ("_>_", "gt"),
+        ("_>=_", "ge"),
+        ("_==_", "eq"),
+        ("_!=_", "ne"),
+    ]:
+        SPECIALIZED[_operator, _cel_type] = specialize(
+            f"{_prefix}_{_method}",
+            _cel_type,
+            getattr(_base, f"__{_method}__"),
+            celpy.celtypes.BoolType,
+            base_functions[_operator],
+        )
+for _operator, _function in [
+    ("_+_", operator.add),
+    ("_-_", operator.sub),
+    ("_*_", operator.mul),
+]:
+    _method = _function.__name__
+    SPECIALIZED[_operator, celpy.celtypes.IntType] = specialize(
+        f"int_{_method}",
+        celpy.celtypes.IntType,
+        getattr(int, f"__{_method}__"),
+        int64_result,
+        base_functions[_operator],
+    )
+    SPECIALIZED[_operator, celpy.celtypes.UintType] = specialize(
+        f"uint_{_method}",
+        celpy.celtypes.UintType,
+        getattr(int, f"__{_method}__"),
+        uint64_result,
+        base_functions[_operator],
+    )
+globals().update({function.__name__: function for function in SPECIALIZED.values()})
+
+
+class TypeChecker(Optimizer):
+    """
+    Finds the type of each sub-expression of an AST, and the type errors.
+
+    The :py:meth:`check` method returns an AST where the operators with known operand types
+    have specialized functions. The type errors are collected in ``issues``.
+
+    A type is a class from :py:data:`TYPE_NAMES`, or ``None`` for a dynamic type.
+
+    :param annotations: The types of variables.
+    :param activation: The :py:class:`celpy.evaluation.Activation` the runner will use.
+        This provides the functions. An operator replaced by a function isn't checked or specialized.
+    """
+
+    def __init__(
+        self,
+        annotations: Optional[Dict[str, Annotation]] = None,
+        activation: Optional[Activation] = None,
+    ) -> None:
+        super().__init__(activation or Activation())
+        self.annotations = annotations or {}
+        self.checked: Dict[
+            Tuple[int, FrozenSet[str]], Tuple[lark.Tree, Optional[type]]
+        ] = {}
+        self.issues: List[Tuple[str, lark.Tree]] = []
+        self.specialized = 0
+
+    def variable(self, name: str, hidden: FrozenSet[str]) -> Optional[type]:
+        """The annotated type of a variable, if it's not hidden by a local name."""
+        if name.split(".")[0] in hidden:
+            return None
+        annotation = self.annotations.get(name)
+        return annotation if annotation in TYPE_NAMES else None
+
+    @staticmethod
+    def dotted_name(tree: lark.Tree) -> Optional[str]:
+        """The name for ``a.b.c`` built from identifiers, otherwise None."""
+        while tree.data in PASS_THROUGH | {"primary"} and len(tree.children) == 1:
+            tree = cast(lark.Tree, tree.children[0])
+        if tree.data == "ident":
+            return str(tree.children[0])
+        elif tree.data == "member_dot":
+            prefix = TypeChecker.dotted_name(cast(lark.Tree, tree.children[0]))
+            return f"{prefix}.{tree.children[1]}" if prefix else None
+        return None
+
+    def operator_type(
+        self, name: str, tree: lark.Tree, *types: Optional[type]
+    ) -> Optional[type]:
+        """
+        The result type of a built-in operator, found by applying the operator to sample values.
+        A :py:exc:`TypeError` is a type error.
+        """
+        if any(t is None for t in types) or not self.builtin(name):
+            return None
+        try:
+            value = base_functions[name](*(SAMPLES[cast(type, t)]() for t in types))
+        except TypeError:
+            operands = ", ".join(TYPE_NAMES[cast(type, t)] for t in types)
+            self.issues.append(
+                (
+                    f"found no matching overload for {name!r} applied to '({operands})'",
+                    tree,
+                )
+            )
+            return None
+        except Exception as ex:
+            logger.debug("No type for %s%r: %r", name, types, ex)
+            return None
+        if isinstance(value, CELEvalError):
+            return None
+        return type(value) if type(value) in TYPE_NAMES else None
+
+    def binary(
+        self, tree: lark.Tree, hidden: FrozenSet[str]
+    ) -> Tuple[lark.Tree, Optional[type]]:
+        """
+        A ``relation``, ``addition``, or ``multiplication`` with two operands.
+        The operator node, like ``relation_lt``, has the left operand as a child.
+        """
+        op_tree, right_tree = cast(Tuple[lark.Tree, lark.Tree], tree.children)
+        left, left_type = self.check(cast(lark.Tree, op_tree.children[0]), hidden)
+        right, right_type = self.check(right_tree, hidden)
+        name = OPERATORS[op_tree.data]
+        result_type = self.operator_type(name, tree, left_type, right_type)
+        op_children: List[Any] = [left]
+        if (
+            left_type is right_type
+            and (name, left_type) in SPECIALIZED
+            and self.builtin(name)
+        ):
+            op_children.append(SPECIALIZED[name, cast(type, left_type)])
+            self.specialized += 1
+        new_op = self.rebuild(op_tree, op_children)
+        if len(op_children) != len(op_tree.children):
+            new_op = type(op_tree)(op_tree.data, op_children, op_tree.meta)
+        return self.rebuild(tree, [new_op, right]), result_type
+
+    def children(
+        self, tree: lark.Tree, hidden: FrozenSet[str]
+    ) -> Tuple[lark.Tree, List[Optional[type]]]:
+        """Check all the child subtrees, returning the rebuilt node and the child types."""
+        children: List[Any] = []
+        types: List[Optional[type]] = []
+        for child in tree.children:
+            if isinstance(child, lark.Tree):
+                child, child_type = self.check(child, hidden)
+                types.append(child_type)
+            children.append(child)
+        return self.rebuild(tree, children), types
+
+    def member_dot_arg(
+        self, tree: lark.Tree, hidden: FrozenSet[str]
+    ) -> Tuple[lark.Tree, Optional[type]]:
+        """A method, a macro, or a ``cel.bind()`` or ``cel.block()``."""
+        method = str(tree.children[1])
+        binding = local_binding(tree)
+        if binding == "bind":
+            var_tree, init_tree, expr_tree = local_arguments(tree, 3)
+            self.check(init_tree, hidden)
+            _, expr_type = self.check(expr_tree, hidden | {local_name(var_tree)})
+            return tree, expr_type
+        elif binding:
+            # The cel.block() entries and the cel.index() names have no known types.
+            return tree, None
+        elif method in MACRO_NAMES and len(tree.children) == 3:
+            member, _ = self.check(cast(lark.Tree, tree.children[0]), hidden)
+            arguments = cast(lark.Tree, tree.children[2]).children
+            count = 2 if method == "reduce" else 1
+            inner = hidden | {
+                local_name(cast(lark.Tree, variable)) for variable in arguments[:count]
+            }
+            if method == "reduce":
+                # The initial value is outside the scope of the variables.
+                self.check(cast(lark.Tree, arguments[2]), hidden)
+                count = 3
+            for argument in arguments[count:]:
+                self.check(cast(lark.Tree, argument), inner)
+            return self.rebuild(tree, [member] + tree.children[1:]), MACRO_TYPES.get(
+                method
+            )
+        new_tree, _ = self.children(tree, hidden)
+        return new_tree, FUNCTION_TYPES.get(method) if self.builtin(method) else None
+
+    def check(
+        self, tree: lark.Tree, hidden: FrozenSet[str] = frozenset()
+    ) -> Tuple[lark.Tree, Optional[type]]:
+        """
+        Check a subtree, returning the subtree with specialized operators, and its type.
+
+        :param tree: The subtree.
+        :param hidden: Names bound by macros and ``cel.bind()``, which hide the annotated variables.
+        """
+        key = (id(tree), hidden)
+        if key in self.checked:
+            return self.checked[key]
+        result: Tuple[lark.Tree, Optional[type]]
+        if (
+            tree.data in {"relation", "addition", "multiplication"}
+            and len(tree.children) == 2
+        ):
+            result = self.binary(tree, hidden)
+        elif tree.data == "member_dot_arg":
+            result = self.member_dot_arg(tree, hidden)
+        elif tree.data == "ident_arg":
+            name = str(tree.children[0])
+            if name == "has":
+                # The argument is a field selection, not evaluated.
+                result = (tree, celpy.celtypes.BoolType)
+            else:
+                new_tree, _ = self.children(tree, hidden)
+                function_type = (
+                    FUNCTION_TYPES.get(name)
+                    if name != "dyn" and self.builtin(name)
+                    else None
+                )
+                result = (new_tree, function_type)
+        elif tree.data == "ident":
+            result = (tree, self.variable(str(tree.children[0]), hidden))
+        elif (
+            tree.data == "member_dot"
+            and (dotted := self.dotted_name(tree))
+            and (self.variable(dotted, hidden) is not None)
+        ):
+            result = (tree, self.variable(dotted, hidden))
+        elif tree.data in {"literal", "folded"}:
+            value = (
+                Evaluator(tree, self.activation).visit(tree)
+                if tree.data == "literal"
+                else tree.children[0]
+            )
+            result = (tree, type(value) if type(value) in TYPE_NAMES else None)
+        else:
+            new_tree, types = self.children(tree, hidden)
+            result_type: Optional[type] = None
+            if tree.data in PASS_THROUGH | {"primary", "memo"} and len(types) == 1:
+                result_type = types[-1]
+            elif tree.data in {"conditionalor", "conditionaland"}:
+                # A non-Boolean operand may be an error, which is absorbed.
+                if all(t is celpy.celtypes.BoolType for t in types):
+                    result_type = celpy.celtypes.BoolType
+            elif tree.data == "expr" and len(types) == 3 and types[1] is types[2]:
+                result_type = types[1]
+            elif tree.data == "unary" and len(tree.children) == 2:
+                op_tree = cast(lark.Tree, tree.children[0])
+                result_type = self.operator_type(
+                    OPERATORS[op_tree.data], tree, types[-1]
+                )
+            elif tree.data == "list_lit":
+                result_type = celpy.celtypes.ListType
+            elif tree.data == "map_lit":
+                result_type = celpy.celtypes.MapType
+            result = (new_tree, result_type)
+        self.checked[key] = result
+        return result
+
+
+def check_types(
+    tree: lark.Tree,
+    annotations: Optional[Dict[str, Annotation]] = None,
+    activation: Optional[Activation] = None,
+) -> lark.Tree:
+    """
+    Checks the types of an AST, and creates a new AST with specialized operators.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param annotations: The types of variables, usually the :py:class:`celpy.Environment` annotations.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with specialized operators. If nothing is specialized, this is the original AST.
+    :raises: :py:exc:`CELTypeError` if there are type errors.
+    """
+    checker = TypeChecker(annotations, activation)
+    checked, _ = checker.check(tree)
+    if checker.issues:
+        message, node = checker.issues[0]
+        raise CELTypeError(
+            message,
+            line=getattr(node.meta, "line", None),
+            column=getattr(node.meta, "column", None),
+            issues=[message for message, _ in checker.issues],
+        )
+    logger.debug("Specialized %d operators", checker.specialized)
+    return checked
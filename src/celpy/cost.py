@@ -0,0 +1,164 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Static estimates of the cost of evaluating a CEL AST, applied by :py:meth:`celpy.Environment.program`.
+
+Most of an expression is evaluated once.
+The time to evaluate an expression grows with the macros: ``map()``, ``filter()``, ``all()``,
+``exists()``, ``exists_one()``, and ``reduce()`` evaluate an expression for each item of a list or map.
+A macro nested inside another evaluates its expression for each item of both.
+
+The cost is the number of items the macros evaluate their expressions for.
+This is the cost charged to a :py:class:`celpy.evaluation.CostBudget` during evaluation.
+
+The :py:class:`CostEstimator` finds the smallest and largest cost of an expression.
+The size of a list literal is known.
+The sizes of variables come from size hints, like ``{"resource.Tags": 50}``.
+Without a size hint, a list can be any size, and the largest cost is infinite.
+The ``&&``, ``||``, and ``?:`` operators may skip an operand;
+the smallest cost assumes the cheapest choice.
+The ``all()`` and ``exists()`` macros evaluate their expression for every item, like the others.
+
+>>> import celpy
+>>> env = celpy.Environment()
+>>> ast = env.compile("x.exists(a, y.exists(b, a == b))")
+>>> estimate_cost(ast, {"x": 10, "y": 100})
+CostEstimate(min=0, max=1010)
+>>> estimate_cost(ast)
+CostEstimate(min=0, max=inf)
+"""
+
+import logging
+import math
+from typing import FrozenSet, Mapping, NamedTuple, Optional, Tuple, cast
+
+import lark
+
+import celpy.celtypes
+from celpy.checker import TypeChecker
+from celpy.evaluation import MACRO_NAMES, local_name, passed_through
+
+logger = logging.getLogger("celpy.cost")
+
+
+class CostEstimate(NamedTuple):
+    """The smallest and largest cost of an expression. The largest may be infinite."""
+
+    min: float
+    max: float
+
+    def __add__(self, other: "CostEstimate") -> "CostEstimate":  # type: ignore[override]
+        return CostEstimate(self.min + other.min, self.max + other.max)
+
+
+NO_COST = CostEstimate(0, 0)
+
+
+class CostEstimator:
+    """
+    Estimates the cost of each node of an AST.
+
+    :param sizes: The largest size of lists and maps named by variables, like ``{"resource.Tags": 50}``.
+    """
+
+    def __init__(self, sizes: Optional[Mapping[str, int]] = None) -> None:
+        self.sizes = sizes or {}
+
+    def size(self, tree: lark.Tree, hidden: FrozenSet[str]) -> Tuple[float, float]:
+        """The smallest and largest number of items in the list or map computed by a subtree."""
+        node = passed_through(tree)
+        if node.data in {"list_lit", "map_lit"}:
+            items = (
+                len(cast(lark.Tree, node.children[0]).children) if node.children else 0
+            )
+            # The ``mapinits`` children are keys and values.
+            items //= 2 if node.data == "map_lit" else 1
+            return items, items
+        elif node.data == "folded" and isinstance(
+            node.children[0], (celpy.celtypes.ListType, celpy.celtypes.MapType)
+        ):
+            return len(node.children[0]), len(node.children[0])
+        elif node.data == "member_dot_arg" and node.children[1] in {"map", "filter"}:
+            smallest, largest = self.size(cast(lark.Tree, node.children[0]), hidden)
+            return (smallest if node.children[1] == "map" else 0), largest
+        name = TypeChecker.dotted_name(node)
+        if name and name.split(".")[0] not in hidden and name in self.sizes:
+            return 0, self.sizes[name]
+        return 0, math.inf
+
+    def macro(self, tree: lark.Tree, hidden: FrozenSet[str]) -> CostEstimate:
+        """The cost of a macro: the items, and the cost of the expression for each item."""
+        method = str(tree.children[1])
+        member = cast(lark.Tree, tree.children[0])
+        arguments = cast(lark.Tree, tree.children[2]).children
+        count = 2 if method == "reduce" else 1
+        inner = hidden | {local_name(cast(lark.Tree, a)) for a in arguments[:count]}
+        cost = self.estimate(member, hidden)
+        if method == "reduce":
+            # The initial value is outside the scope of the variables.
+            cost += self.estimate(cast(lark.Tree, arguments[2]), hidden)
+        body = self.estimate(cast(lark.Tree, arguments[-1]), inner)
+        smallest, largest = self.size(member, hidden)
+        # An empty list costs nothing, even if the expression for each item has an infinite cost.
+        return cost + CostEstimate(
+            smallest * (1 + body.min),
+            largest * (1 + body.max) if largest else 0,
+        )
+
+    def estimate(
+        self, tree: lark.Tree, hidden: FrozenSet[str] = frozenset()
+    ) -> CostEstimate:
+        """
+        The cost of a subtree.
+
+        :param tree: The AST.
+        :param hidden: Names bound by macros, which hide the variables with size hints.
+        """
+        if (
+            tree.data == "member_dot_arg"
+            and tree.children[1] in MACRO_NAMES
+            and len(tree.children) == 3
+        ):
+            return self.macro(tree, hidden)
+        children = [
+            self.estimate(child, hidden)
+            for child in tree.children
+            if isinstance(child, lark.Tree)
+        ]
+        if tree.data in {"conditionalor", "conditionaland"} and len(children) == 2:
+            left, right = children
+            return CostEstimate(left.min, left.max + right.max)
+        elif tree.data == "expr" and len(children) == 3:
+            cond, left, right = children
+            return cond + CostEstimate(
+                min(left.min, right.min), max(left.max, right.max)
+            )
+        return sum(children, NO_COST)
+
+
+def estimate_cost(
+    tree: lark.Tree, sizes: Optional[Mapping[str, int]] = None
+) -> CostEstimate:
+    """
+    Estimates the smallest and largest cost of evaluating an AST.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param sizes: The largest size of lists and maps named by variables, like ``{"resource.Tags": 50}``.
+    :returns: A :py:class:`CostEstimate`.
+    """
+    estimate = CostEstimator(sizes).estimate(tree)
+    logger.debug("Estimated cost %r", estimate)
+    return estimate
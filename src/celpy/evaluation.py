@@ -16,12 +16,14 @@
 """
 Evaluates CEL expressions given an AST.
 
-There are two implementations:
+There are three implementations:
 
 -   Evaluator -- interprets the AST directly.
 
 -   Transpiler -- transpiles the AST to Python, compiles the Python to create a code object, and then uses :py:func:`exec` to evaluate the code object.
 
+-   ClosureCompiler -- compiles the AST to a tree of Python closures, once, and then calls the closures to evaluate them.
+
 The general idea is to map CEL operators to Python operators and push the
 real work off to Python objects defined by the :py:mod:`celpy.celtypes` module.
 
@@ -50,26 +52,37 @@ during evaluation. It's a union of the :py:class:`celpy.celtypes.CELTypes` type
 
 """
 
+import ast
 import collections
+import hashlib
+import importlib
+import importlib.util
 import logging
+import marshal
 import operator
 import os
+import pickle
 import re
 import sys
-from functools import reduce, wraps
-from string import Template
-from textwrap import dedent
+import threading
+import types
+from contextlib import contextmanager
+from functools import lru_cache, reduce, wraps
+from pathlib import Path
 from typing import (
     Any,
     Callable,
     Dict,
+    FrozenSet,
     Iterable,
     Iterator,
     List,
     Mapping,
     Match,
+    NoReturn,
     Optional,
     Sequence,
+    Set,
     Sized,
     Tuple,
     Type,
@@ -80,10 +93,9 @@ from typing import (
 
 import lark
 import lark.visitors
-import re2
 
 import celpy.celtypes
-from celpy.celparser import tree_dump
+from celpy.celparser import CELParser, CompactTree, DirectoryCache, tree_dump
 
 # An Annotation describes a union of types, functions, and function types.
 Annotation = Union[
@@ -357,6 +369,75 @@ def operator_in(item: Result, container: Result) -> Result:
     return result_value
 
 
+#: The types of the items a :py:class:`MembershipIndex` puts in its hash sets.
+#: Equality between two values of one of these types never raises an exception,
+#: and matches the hash.
+INDEXED_TYPES = frozenset(
+    {
+        celpy.celtypes.BoolType,
+        celpy.celtypes.BytesType,
+        celpy.celtypes.DoubleType,
+        celpy.celtypes.IntType,
+        celpy.celtypes.StringType,
+        celpy.celtypes.UintType,
+    }
+)
+
+
+class MembershipIndex:
+    """
+    The ``_in_`` operator for a constant list, like ``x in ["a", "b", "c"]``,
+    using hash sets built once, instead of a scan of the list.
+
+    The items are grouped by type. An item of the same type as the value sought is
+    found with a hash lookup. The items of other types -- which may match, like ``true == 1``,
+    or may raise an exception, like ``1 == "a"`` -- are scanned by :py:func:`operator_in`,
+    so the result is the same as :py:func:`operator_in` applied to the whole list.
+
+    >>> index = MembershipIndex(celpy.celtypes.ListType(
+    ...     [celpy.celtypes.StringType("a"), celpy.celtypes.StringType("b")]))
+    >>> index(celpy.celtypes.StringType("b"), None)
+    BoolType(True)
+    >>> index(celpy.celtypes.StringType("z"), None)
+    BoolType(False)
+
+    An instance is used in place of :py:func:`operator_in`, and the container provided is ignored.
+
+    :param container: The constant list.
+    """
+
+    def __init__(self, container: celpy.celtypes.ListType) -> None:
+        self.container = container
+        self.index: Dict[type, FrozenSet[Result]] = {
+            cel_type: frozenset(
+                item for item in container if self.indexed(item, cel_type)
+            )
+            for cel_type in {type(item) for item in container} & INDEXED_TYPES
+        }
+        self.others: Dict[type, celpy.celtypes.ListType] = {}
+
+    @staticmethod
+    def indexed(item: Result, cel_type: type) -> bool:
+        """True if the item is in the hash set for the type. A NaN isn't equal to itself."""
+        return type(item) is cel_type and cel_type in INDEXED_TYPES and item == item
+
+    def __call__(self, item: Result, container: Result) -> Result:
+        if isinstance(item, CELEvalError):
+            return item
+        item_type = type(item)
+        values = self.index.get(item_type)
+        if values is not None and item in values:
+            return celpy.celtypes.BoolType(True)
+        if item_type not in self.others:
+            self.others[item_type] = celpy.celtypes.ListType(
+                c for c in self.container if not self.indexed(c, item_type)
+            )
+        return operator_in(item, self.others[item_type])
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.container)} items)"
+
+
 def function_size(container: Result) -> Result:
     """
     The size() function applied to a Value.
@@ -406,13 +487,55 @@ def function_endsWith(
     return celpy.celtypes.BoolType(string.endswith(fragment))
 
 
-def function_matches(text: str, pattern: str) -> Result:
-    """Implementation of the ``match()`` function using ``re2``"""
-    try:
-        m = re2.search(pattern, text)
-    except re2.error as ex:
-        return CELEvalError("match error", ex.__class__, ex.args)
+# The ``re2`` module is imported by :py:func:`import_re2` when it's first needed.
+re2: Any = None
+
+
+def import_re2() -> Any:
+    """
+    The ``re2`` module, imported the first time it's needed.
+
+    :raises ImportError: if ``re2`` isn't installed.
+    """
+    global re2
+    if re2 is None:
+        re2 = importlib.import_module("re2")
+    return re2
+
+
+# The number of compiled patterns kept by :py:func:`compile_pattern`.
+PATTERN_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern: str) -> Any:
+    """
+    Compile a ``matches()`` pattern using ``re2``.
 
+    The most recently used patterns are kept;
+    ``compile_pattern.cache_info()`` reports the hits and misses.
+    A pattern that's a literal in the expression is compiled once, when the program is created,
+    see :py:func:`celpy.optimizer.compile_patterns`.
+
+    :raises re2.error: for an invalid pattern.
+    """
+    return import_re2().compile(pattern)
+
+
+def function_matches(text: str, pattern: Any) -> Result:
+    """
+    Implementation of the ``match()`` function using ``re2``.
+
+    The ``pattern`` is a string, or a pattern already compiled by :py:func:`compile_pattern`.
+    """
+    if isinstance(pattern, str):
+        # Import first, so a missing module raises ImportError, not an error for the pattern.
+        error = import_re2().error
+        try:
+            pattern = compile_pattern(pattern)
+        except error as ex:
+            return CELEvalError("match error", ex.__class__, ex.args)
+    m = pattern.search(text)
     return celpy.celtypes.BoolType(m is not None)
 
 
@@ -569,6 +692,48 @@ base_functions: dict[str, CELFunction] = {
     "uint": celpy.celtypes.UintType,
 }
 
+#: The value of the left operand that decides the result of the built-in ``&&`` and ``||``.
+#: When the left operand has this value, the right operand isn't evaluated.
+#: A function provided to replace ``_&&_`` or ``_||_`` always gets both values.
+SHORT_CIRCUIT: Dict[CELFunction, celpy.celtypes.BoolType] = {
+    celpy.celtypes.logical_and: celpy.celtypes.BoolType(False),
+    celpy.celtypes.logical_or: celpy.celtypes.BoolType(True),
+}
+
+
+def is_decisive(function: CELFunction, left: Result) -> bool:
+    """
+    True if the left operand of ``&&`` or ``||`` decides the result.
+
+    >>> is_decisive(celpy.celtypes.logical_and, celpy.celtypes.BoolType(False))
+    True
+    >>> is_decisive(celpy.celtypes.logical_or, CELEvalError("no such member"))
+    False
+    """
+    decisive = SHORT_CIRCUIT.get(function)
+    return (
+        decisive is not None
+        and isinstance(left, celpy.celtypes.BoolType)
+        and left == decisive
+    )
+
+
+def specialized(op_tree: lark.Tree) -> Optional[CELFunction]:
+    """
+    The specialized function for a binary operator, added by :py:mod:`celpy.checker`.
+    The operator node, like ``relation_lt``, has the left operand as its first child;
+    a specialized function is a second child.
+    Any other child, like the operator's token, is ignored.
+    None if the operator isn't specialized, and the activation's function is used.
+
+    >>> specialized(lark.Tree("relation_lt", [lark.Tree("ident", ["x"])]))
+    >>> specialized(lark.Tree("relation_lt", [lark.Tree("ident", ["x"]), bool_lt])).__name__
+    'bool_lt'
+    """
+    if len(op_tree.children) == 2 and callable(op_tree.children[1]):
+        return cast(CELFunction, op_tree.children[1])
+    return None
+
 
 class Referent:
     """
@@ -1116,6 +1281,56 @@ class NameContainer(Dict[str, Referent]):
         return f"{self.__class__.__name__}({dict(self)}, parent={self.parent})"
 
 
+class CostBudget:
+    """
+    The cost limit for one evaluation, and the cost so far.
+
+    The cost is the number of items a macro -- ``map()``, ``filter()``, ``all()``, ``exists()``,
+    ``exists_one()``, or ``reduce()`` -- evaluates its expression for.
+    A nested macro's items are counted for each item of the outer macro.
+    The :py:func:`celpy.cost.estimate_cost` function estimates the cost before evaluation.
+
+    An :py:class:`Activation` with a budget charges each item of a macro to the budget; see :py:func:`macro_items`.
+    When the cost exceeds the limit, each further item raises a :py:exc:`CELEvalError`,
+    and the evaluation raises the error, even if a logic operator would have ignored it.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.cost = 0
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(limit={self.limit}, cost={self.cost})"
+
+    @property
+    def exceeded(self) -> bool:
+        return self.cost > self.limit
+
+    def error(self) -> CELEvalError:
+        return CELEvalError("cost limit exceeded", ValueError, (self.limit,))
+
+    def items(self, values: Iterable[Any]) -> Iterator[Any]:
+        """Charge one for each item of a macro's list or map."""
+        for value in values:
+            self.cost += 1
+            if self.cost > self.limit:
+                raise self.error()
+            yield value
+
+
+@contextmanager
+def enforce_budget(activation: "Activation") -> Iterator[None]:
+    """
+    Raises the :py:class:`CostBudget` error if an evaluation exceeded the activation's cost limit.
+    This replaces the evaluation's result, or any other exception.
+    """
+    try:
+        yield
+    finally:
+        if activation.budget is not None and activation.budget.exceeded:
+            raise activation.budget.error()
+
+
 class Activation:
     """
     Namespace with variable bindings and type name ("annotation") bindings.
@@ -1220,6 +1435,13 @@ class Activation:
         self.identifiers: NameContainer = NameContainer(
             parent=based_on.identifiers if based_on else None
         )
+        # The cost limit is shared by the nested activations of an evaluation.
+        self.budget: Optional[CostBudget] = based_on.budget if based_on else None
+        # The transpiled ``memo`` and ``cel.bind()`` slots, also shared; see :py:func:`slot_activation`.
+        self.memo_slots: Dict[int, Result] = based_on.memo_slots if based_on else {}
+        self.local_slots: Dict[int, "LocalSlot"] = (
+            based_on.local_slots if based_on else {}
+        )
         if annotations is not None:
             self.identifiers.load_annotations(annotations)
         if vars is not None:
@@ -1255,6 +1477,9 @@ class Activation:
         clone.identifiers = self.identifiers.clone()
         clone.functions = self.functions.copy()
         clone.package = self.package
+        clone.budget = self.budget
+        clone.memo_slots = self.memo_slots
+        clone.local_slots = self.local_slots
         logger.debug("clone: %r", self)
         return clone
 
@@ -1354,6 +1579,44 @@ class Activation:
         )
 
 
+def evaluation_activation(
+    base_activation: Activation, context: Optional[Context]
+) -> Activation:
+    """
+    The activation for one evaluation of a compiled expression:
+    the base activation with the context's values, and the whole :py:class:`CostBudget`, if there is one.
+
+    The context's values are a nested activation, chained to the base activation, which isn't changed.
+    The cost depends on the number of values in the context, not on the size of the base activation.
+    """
+    if not context and base_activation.budget is None:
+        return base_activation
+    activation = base_activation.nested_activation(vars=context)
+    if base_activation.budget is not None:
+        # Each evaluation starts with the whole budget.
+        activation.budget = CostBudget(base_activation.budget.limit)
+    return activation
+
+
+def slot_activation(activation: Activation) -> Activation:
+    """
+    The activation for one evaluation of transpiled code with ``memo`` or ``cel.bind()`` slots.
+    The slots start empty, and are shared by the nested activations of the evaluation.
+
+    >>> base = Activation()
+    >>> activation = slot_activation(base)
+    >>> activation.memo_slots[0] = 42
+    >>> base.memo_slots
+    {}
+    >>> activation.nested_activation().memo_slots
+    {0: 42}
+    """
+    activation = activation.nested_activation()
+    activation.memo_slots = {}
+    activation.local_slots = {}
+    return activation
+
+
 def trace(
     method: Callable[["Evaluator", lark.Tree], Any],
 ) -> Callable[["Evaluator", lark.Tree], Any]:
@@ -1465,17 +1728,29 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         self.activation = self.base_activation
 
         self.level = 0
+        # Values of ``memo`` nodes, for one evaluation.
+        self.slots: Dict[int, Result] = {}
+        # Names bound by ``cel.bind()`` and ``cel.block()`` in the current scope.
+        self.locals: Dict[str, LocalSlot] = {}
         self.logger.debug("Evaluator activation: %r", self.activation)
         # self.logger.debug("functions: %r", self.functions)  # Refactor ``self.functions`` into an Activation
 
-    def sub_evaluator(self, ast: lark.Tree) -> "Evaluator":
+    def sub_evaluator(self, ast: lark.Tree, *variables: str) -> "Evaluator":
         """
         Build an evaluator for a sub-expression in a macro.
 
         :param ast: The AST for the expression in the macro.
+        :param variables: The macro's variables, which hide any locals with the same names.
         :return: A new `Evaluator` instance.
         """
-        return Evaluator(ast, activation=self.activation)
+        nested_eval = Evaluator(ast, activation=self.activation)
+        if self.locals:
+            nested_eval.locals = {
+                name: slot
+                for name, slot in self.locals.items()
+                if name not in variables
+            }
+        return nested_eval
 
     def set_activation(self, values: Context) -> "Evaluator":
         """
@@ -1485,9 +1760,10 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         1. Bind external variables. Examples are command-line arguments and environment variables.
 
         2. Build local variable(s) for macro evaluation.
+
+        The values are a nested activation, chained to the base activation, which isn't changed.
         """
-        self.activation = self.base_activation.clone()
-        self.activation.identifiers.load_values(values)
+        self.activation = self.base_activation.nested_activation(vars=values)
         self.logger.debug("Activation: %r", self.activation)
         return self
 
@@ -1518,6 +1794,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         """
         if context:
             self.set_activation(context)
+        self.slots = {}
         value = self.visit(self.ast)
         if isinstance(value, CELEvalError):
             raise value
@@ -1670,6 +1947,54 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         has_values = self.visit_children(exprlist)
         return celpy.celtypes.BoolType(not isinstance(has_values[0], CELEvalError))
 
+    def scoped(
+        self, tree: lark.Tree, scope: Dict[str, "LocalSlot"]
+    ) -> Callable[[Activation], Result]:
+        """
+        A function to evaluate a subtree with the given locals.
+        A :py:class:`LocalSlot` uses this to evaluate its expression in the scope where it was bound.
+        """
+
+        def cel_expr(activation: Activation) -> Result:
+            outer_scope, self.locals = self.locals, scope
+            try:
+                return cast(Result, self.visit(tree))
+            finally:
+                self.locals = outer_scope
+
+        return cel_expr
+
+    def local_eval(self, tree: lark.Tree, binding: str) -> Result:
+        """
+        Evaluates the local binding extensions.
+
+        - ``cel.bind(name, init, expr)`` binds ``name`` to the value of ``init`` while evaluating ``expr``.
+
+        - ``cel.block([e0, e1, ...], expr)`` binds ``cel.index(0)`` to ``e0``, ``cel.index(1)`` to ``e1``, etc.,
+          while evaluating ``expr``. Each entry can use the entries before it.
+
+        - ``cel.index(n)`` and ``cel.iterVar(i, j)`` are names.
+          The ``cel.iterVar(i, j)`` names are macro variables, used in ASTs rewritten with ``cel.block()``.
+
+        Each binding is a :py:class:`LocalSlot`, evaluated when it's first used.
+        The names are kept by this Evaluator, not in a nested :py:class:`Activation`.
+        """
+        scope = dict(self.locals)
+        if binding == "bind":
+            var_tree, init_tree, expr_tree = local_arguments(tree, 3)
+            scope[local_name(var_tree)] = LocalSlot(
+                self.scoped(init_tree, self.locals), self.activation
+            )
+        elif binding == "block":
+            for n, entry in enumerate(block_entries(tree)):
+                scope[f"__index_{n}__"] = LocalSlot(
+                    self.scoped(entry, dict(scope)), self.activation
+                )
+            expr_tree = local_arguments(tree, 2)[1]
+        else:
+            return self.variable(local_name(tree), tree)
+        return self.scoped(expr_tree, scope)(self.activation)
+
     @trace
     def expr(self, tree: lark.Tree) -> Result:
         """
@@ -1725,6 +2050,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
 
         The default implementation short-circuits
         and can ignore an CELEvalError in a sub-expression.
+        When the left value is ``true``, the right sub-expression is not evaluated.
         """
         if len(tree.children) == 1:
             # conditionaland with no preceding conditionalor.
@@ -1733,7 +2059,10 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         elif len(tree.children) == 2:
             # func = self.functions["_||_"]   # Refactor ``self.functions`` into an Activation
             func = self.activation.resolve_function("_||_")
-            left, right = cast(Tuple[Result, Result], self.visit_children(tree))
+            left = cast(Result, self.visit(cast(lark.Tree, tree.children[0])))
+            if is_decisive(func, left):
+                return left
+            right = self.visit(cast(lark.Tree, tree.children[1]))
             try:
                 return func(left, right)
             except TypeError as ex:
@@ -1759,6 +2088,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
 
         The default implementation short-circuits
         and can ignore an CELEvalError in a sub-expression.
+        When the left value is ``false``, the right sub-expression is not evaluated.
         """
         if len(tree.children) == 1:
             # relation with no preceding conditionaland.
@@ -1767,7 +2097,10 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         elif len(tree.children) == 2:
             # func = self.functions["_&&_"]    # Refactor ``self.functions`` into an Activation
             func = self.activation.resolve_function("_&&_")
-            left, right = cast(Tuple[Result, Result], self.visit_children(tree))
+            left = cast(Result, self.visit(cast(lark.Tree, tree.children[0])))
+            if is_decisive(func, left):
+                return left
+            right = self.visit(cast(lark.Tree, tree.children[1]))
             try:
                 return func(left, right)
             except TypeError as ex:
@@ -1828,7 +2161,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                 "relation_in": "_in_",
             }[left_op.data]
             # func = self.functions[op_name]    # Refactor ``self.functions`` into an Activation
-            func = self.activation.resolve_function(op_name)
+            func = specialized(left_op) or self.activation.resolve_function(op_name)
             # NOTE: values have the structure [[left], right]
             (left, *_), right = cast(
                 Tuple[List[Result], Result], self.visit_children(tree)
@@ -1884,7 +2217,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                 "addition_sub": "_-_",
             }[left_op.data]
             # func = self.functions[op_name]    # Refactor ``self.functions`` into an Activation
-            func = self.activation.resolve_function(op_name)
+            func = specialized(left_op) or self.activation.resolve_function(op_name)
             # NOTE: values have the structure [[left], right]
             (left, *_), right = cast(
                 Tuple[List[Result], Result], self.visit_children(tree)
@@ -1949,7 +2282,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                 "multiplication_mod": "_%_",
             }[left_op.data]
             # func = self.functions[op_name]   # Refactor ``self.functions`` into an Activation
-            func = self.activation.resolve_function(op_name)
+            func = specialized(left_op) or self.activation.resolve_function(op_name)
             # NOTE: values have the structure [[left], right]
             (left, *_), right = cast(
                 Tuple[List[Result], Result], self.visit_children(tree)
@@ -2075,16 +2408,8 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         """
         args = cast(lark.Tree, child.children[2])
         var_tree, expr_tree = cast(Tuple[lark.Tree, lark.Tree], args.children)
-        idents = list(var_tree.find_data("ident"))
-        if len(idents) != 1:
-            # Essentially impossible.
-            raise CELSyntaxError(  # pragma: no cover
-                f"{child.data} {child.children}: bad macro node",
-                line=child.meta.line,
-                column=child.meta.column,
-            )
-        identifier = cast(lark.Token, idents[0].children[0]).value
-        nested_eval = self.sub_evaluator(ast=expr_tree)
+        identifier = local_name(var_tree)
+        nested_eval = self.sub_evaluator(expr_tree, identifier)
 
         def sub_expr(v: celpy.celtypes.Value) -> Any:
             return nested_eval.evaluate({identifier: v})
@@ -2107,15 +2432,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         """
         args = cast(lark.Tree, child.children[2])
         var_tree, expr_tree = cast(Tuple[lark.Tree, lark.Tree], args.children)
-        idents = list(var_tree.find_data("ident"))
-        if len(idents) != 1:
-            # Essentially impossible.
-            raise CELSyntaxError(  # pragma: no cover
-                f"{child.data} {child.children}: bad macro node",
-                line=child.meta.line,
-                column=child.meta.column,
-            )
-        identifier = cast(lark.Token, idents[0].children[0]).value
+        identifier = local_name(var_tree)
         # identifier = FindIdent.in_tree(var_tree)
         # if identifier is None:  # pragma: no cover
         #     # This seems almost impossible.
@@ -2125,7 +2442,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         #         column=child.meta.column,
         #     )
         # nested_eval = Evaluator(ast=expr_tree, activation=self.activation)
-        nested_eval = self.sub_evaluator(ast=expr_tree)
+        nested_eval = self.sub_evaluator(expr_tree, identifier)
 
         def sub_expr(v: celpy.celtypes.Value) -> Any:
             try:
@@ -2160,17 +2477,8 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         reduce_var_tree, iter_var_tree, init_expr_tree, expr_tree = cast(
             Tuple[lark.Tree, lark.Tree, lark.Tree, lark.Tree], args.children
         )
-        reduce_idents = list(reduce_var_tree.find_data("ident"))
-        iter_idents = list(iter_var_tree.find_data("ident"))
-        if len(reduce_idents) != 1 or len(iter_idents) != 1:  # pragma: no cover
-            # This seems almost impossible.
-            raise CELSyntaxError(
-                f"{child.data} {child.children}: bad macro node",
-                line=child.meta.line,
-                column=child.meta.column,
-            )
-        reduce_ident = cast(lark.Token, reduce_idents[0].children[0]).value
-        iter_ident = cast(lark.Token, iter_idents[0].children[0]).value
+        reduce_ident = local_name(reduce_var_tree)
+        iter_ident = local_name(iter_var_tree)
         # reduce_ident = FindIdent.in_tree(reduce_var_tree)
         # iter_ident = FindIdent.in_tree(iter_var_tree)
         # if reduce_ident is None or iter_ident is None:  # pragma: no cover
@@ -2181,7 +2489,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         #         column=child.meta.column,
         #     )
         # nested_eval = Evaluator(ast=expr_tree, activation=self.activation)
-        nested_eval = self.sub_evaluator(ast=expr_tree)
+        nested_eval = self.sub_evaluator(expr_tree, reduce_ident, iter_ident)
 
         def sub_expr(r: Result, i: Result) -> Result:
             return nested_eval.evaluate({reduce_ident: r, iter_ident: i})
@@ -2319,6 +2627,9 @@ class Evaluator(lark.visitors.Interpreter[Result]):
             Tuple[lark.Tree, lark.Token], tree.children[:2]
         )
 
+        if binding := local_binding(tree):
+            return self.local_eval(tree, binding)
+
         if method_name_token.value in {
             "map",
             "filter",
@@ -2340,14 +2651,17 @@ class Evaluator(lark.visitors.Interpreter[Result]):
             if method_name_token.value == "map":
                 sub_expr = self.build_macro_eval(tree)
                 mapping = cast(
-                    Iterable[celpy.celtypes.Value], map(sub_expr, member_list)
+                    Iterable[celpy.celtypes.Value],
+                    map(sub_expr, macro_items(self.activation, member_list)),
                 )
                 result_value = celpy.celtypes.ListType(mapping)
                 return result_value
 
             elif method_name_token.value == "filter":
                 sub_expr = self.build_macro_eval(tree)
-                result_value = celpy.celtypes.ListType(filter(sub_expr, member_list))
+                result_value = celpy.celtypes.ListType(
+                    filter(sub_expr, macro_items(self.activation, member_list))
+                )
                 return result_value
 
             elif method_name_token.value == "all":
@@ -2359,7 +2673,9 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                     ),
                 )
                 reduction = reduce(
-                    and_oper, map(sub_expr, member_list), celpy.celtypes.BoolType(True)
+                    and_oper,
+                    map(sub_expr, macro_items(self.activation, member_list)),
+                    celpy.celtypes.BoolType(True),
                 )
                 return reduction
 
@@ -2372,14 +2688,20 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                     ),
                 )
                 reduction = reduce(
-                    or_oper, map(sub_expr, member_list), celpy.celtypes.BoolType(False)
+                    or_oper,
+                    map(sub_expr, macro_items(self.activation, member_list)),
+                    celpy.celtypes.BoolType(False),
                 )
                 return reduction
 
             elif method_name_token.value == "exists_one":
                 # Is there exactly 1?
                 sub_expr = self.build_macro_eval(tree)
-                count = sum(1 for value in member_list if bool(sub_expr(value)))
+                count = sum(
+                    1
+                    for value in macro_items(self.activation, member_list)
+                    if bool(sub_expr(value))
+                )
                 return celpy.celtypes.BoolType(count == 1)
 
             # Not formally part of CEL...
@@ -2389,7 +2711,11 @@ class Evaluator(lark.visitors.Interpreter[Result]):
                 # The args have two variables and two expressions.
                 reduce_expr, init_expr_tree = self.build_reduce_macro_eval(tree)
                 initial_value = self.visit(init_expr_tree)
-                reduction = reduce(reduce_expr, member_list, initial_value)
+                reduction = reduce(
+                    reduce_expr,
+                    macro_items(self.activation, member_list),
+                    initial_value,
+                )
                 return reduction
 
             # Not formally part of CEL...
@@ -2525,26 +2851,23 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         primary        : dot_ident_arg | dot_ident | ident_arg | ident
                        | paren_expr | list_lit | map_lit | literal
 
-        dot_ident_arg  : "." IDENT "(" [exprlist] ")"
-        dot_ident      : "." IDENT
-        ident_arg      : IDENT "(" [exprlist] ")"
-        ident          : IDENT
-        paren_expr     : "(" expr ")"
-        list_lit       : "[" [exprlist] "]"
-        map_lit        : "{" [mapinits] "}"
-
-        .. TODO:: Refactor into separate methods to skip these complex elif chain.
-
-            Top-level :py:meth:`primary` is similar to :py:meth:`method`.
-            Each of the individual rules then works with a tree instead of a child of the
-            primary tree.
+        Each of the individual rules has a method that works with the child of the ``primary`` tree.
+        In a shaped tree (see :py:class:`celpy.celparser.CELParser`), the ``primary`` node is
+        inlined, and these methods are visited directly.
 
         This includes function-like macros: ``has()`` and ``dyn()``.
         These are special cases and cannot be overridden.
         """
-        result_value: Result
-        name_token: lark.Token
-        if len(tree.children) != 1:
+        if len(tree.children) != 1 or cast(lark.Tree, tree.children[0]).data not in {
+            "literal",
+            "paren_expr",
+            "list_lit",
+            "map_lit",
+            "dot_ident",
+            "dot_ident_arg",
+            "ident_arg",
+            "ident",
+        }:
             raise CELSyntaxError(
                 f"{tree.data} {tree.children}: bad primary node",
                 line=tree.meta.line,
@@ -2556,170 +2879,182 @@ class Evaluator(lark.visitors.Interpreter[Result]):
             # A literal value
             values = self.visit_children(tree)
             return values[0]
+        return cast(Result, self.visit(child))
 
-        elif child.data == "paren_expr":
-            # A "(" expr ")"
-            values = self.visit_children(child)
-            return values[0]
-
-        elif child.data == "list_lit":
-            if len(child.children) == 0:
-                # Empty list
-                # TODO: Refactor into type_eval()
-                result_value = celpy.celtypes.ListType()
-            else:
-                # exprlist to be packaged as List.
-                values = self.visit_children(child)
-                result_value = values[0]
-            return result_value
+    @trace
+    def paren_expr(self, tree: lark.Tree) -> Result:
+        """
+        paren_expr     : "(" expr ")"
+        """
+        values = self.visit_children(tree)
+        return values[0]
 
-        elif child.data == "map_lit":
-            if len(child.children) == 0:
-                # Empty mapping
-                # TODO: Refactor into type_eval()
-                result_value = celpy.celtypes.MapType()
-            else:
-                # mapinits (a sequence of key-value tuples) to be packaged as a dict.
-                # OR. An CELEvalError in case of ValueError caused by duplicate keys.
-                # OR. An CELEvalError in case of TypeError cause by invalid key types.
-                # TODO: Refactor into type_eval()
-                try:
-                    values = self.visit_children(child)
-                    result_value = values[0]
-                except ValueError as ex:
-                    result_value = CELEvalError(
-                        ex.args[0], ex.__class__, ex.args, tree=tree
-                    )
-                except TypeError as ex:
-                    result_value = CELEvalError(
-                        ex.args[0], ex.__class__, ex.args, tree=tree
-                    )
-            return result_value
+    @trace
+    def list_lit(self, tree: lark.Tree) -> Result:
+        """
+        list_lit       : "[" [exprlist] "]"
+        """
+        result_value: Result
+        if len(tree.children) == 0:
+            # Empty list
+            # TODO: Refactor into type_eval()
+            result_value = celpy.celtypes.ListType()
+        else:
+            # exprlist to be packaged as List.
+            values = self.visit_children(tree)
+            result_value = values[0]
+        return result_value
 
-        elif child.data in ("dot_ident", "dot_ident_arg"):
-            # "." IDENT ["(" [exprlist] ")"]
-            # Leading "." means the name is resolved in the root scope **only**.
-            # No searching through alternative packages.
-            # len(child) == 1 -- "." IDENT
-            # len(child) == 2 -- "." IDENT "(" exprlist ")" -- TODO: Implement dot_ident_arg.
-            values = self.visit_children(child)
-            name_token = cast(lark.Token, values[0])
-            # Should not be a Function, should only be a Result
-            # TODO: implement dot_ident_arg using ``function_eval()``, which should match this code.
+    @trace
+    def map_lit(self, tree: lark.Tree) -> Result:
+        """
+        map_lit        : "{" [mapinits] "}"
+        """
+        result_value: Result
+        if len(tree.children) == 0:
+            # Empty mapping
+            # TODO: Refactor into type_eval()
+            result_value = celpy.celtypes.MapType()
+        else:
+            # mapinits (a sequence of key-value tuples) to be packaged as a dict.
+            # OR. An CELEvalError in case of ValueError caused by duplicate keys.
+            # OR. An CELEvalError in case of TypeError cause by invalid key types.
+            # TODO: Refactor into type_eval()
             try:
-                result_value = cast(
-                    Result, self.ident_value(name_token.value, root_scope=True)
+                values = self.visit_children(tree)
+                result_value = values[0]
+            except ValueError as ex:
+                result_value = CELEvalError(
+                    ex.args[0], ex.__class__, ex.args, tree=tree
                 )
-            except KeyError as ex:
+            except TypeError as ex:
                 result_value = CELEvalError(
                     ex.args[0], ex.__class__, ex.args, tree=tree
                 )
-            return result_value
+        return result_value
 
-        elif child.data == "ident_arg":
-            # IDENT ["(" [exprlist] ")"]
-            # Can be a proper function or one of the function-like macros: "has()", "dyn()".
-            exprlist: lark.Tree
-            if len(child.children) == 1:
-                name_token = cast(lark.Token, child.children[0])
-                exprlist = lark.Tree(data="exprlist", children=[])
-            elif len(child.children) == 2:
-                name_token, exprlist = cast(
-                    Tuple[lark.Token, lark.Tree], child.children
-                )
-            else:
-                raise CELSyntaxError(  # pragma: no cover
-                    f"{tree.data} {tree.children}: bad primary node",
-                    line=tree.meta.line,
-                    column=tree.meta.column,
-                )
+    @trace
+    def dot_ident(self, tree: lark.Tree) -> Result:
+        """
+        dot_ident      : "." IDENT
 
-            if name_token.value == "has":
-                # has() macro. True if the child expression is a member expression that evaluates.
-                # False if the child expression is a member expression that cannot be evaluated.
-                return self.macro_has_eval(exprlist)
-            elif name_token.value == "dyn":
-                # dyn() macro does nothing; it's for run-time type-checking.
-                dyn_values = self.visit_children(exprlist)
-                return dyn_values[0]
-            else:
-                # Ordinary function() evaluation.
-                values = self.visit_children(exprlist)
-                return self.function_eval(
-                    name_token, cast(Iterable[celpy.celtypes.Value], values)
-                )
+        Leading "." means the name is resolved in the root scope **only**.
+        No searching through alternative packages.
+        """
+        result_value: Result
+        values = self.visit_children(tree)
+        name_token = cast(lark.Token, values[0])
+        # Should not be a Function, should only be a Result
+        try:
+            result_value = cast(
+                Result, self.ident_value(name_token.value, root_scope=True)
+            )
+        except KeyError as ex:
+            result_value = CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+        return result_value
 
-        elif child.data == "ident":
-            # IDENT -- simple identifier from the current activation.
-            name_token = cast(lark.Token, child.children[0])
-            try:
-                # Should not be a Function.
-                # Generally Result object (i.e., a variable)
-                # Could be an Annotation object (i.e., a type) for protobuf messages
-                result_value = cast(Result, self.ident_value(name_token.value))
-            except KeyError as ex:
-                err = (
-                    f"undeclared reference to '{name_token}' "
-                    f"(in activation '{self.activation}')"
-                )
-                result_value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
-            return result_value
+    @trace
+    def dot_ident_arg(self, tree: lark.Tree) -> Result:
+        """
+        dot_ident_arg  : "." IDENT "(" [exprlist] ")"
+
+        TODO: implement dot_ident_arg using ``function_eval()``, which should match :py:meth:`dot_ident`.
+        """
+        return cast(Result, self.dot_ident(tree))
+
+    @trace
+    def ident_arg(self, tree: lark.Tree) -> Result:
+        """
+        ident_arg      : IDENT "(" [exprlist] ")"
 
+        Can be a proper function or one of the function-like macros: "has()", "dyn()".
+        """
+        name_token: lark.Token
+        exprlist: lark.Tree
+        if len(tree.children) == 1:
+            name_token = cast(lark.Token, tree.children[0])
+            exprlist = lark.Tree(data="exprlist", children=[])
+        elif len(tree.children) == 2:
+            name_token, exprlist = cast(Tuple[lark.Token, lark.Tree], tree.children)
         else:
-            raise CELSyntaxError(
-                f"{tree.data} {tree.children}: bad primary node",
+            raise CELSyntaxError(  # pragma: no cover
+                f"{tree.data} {tree.children}: bad ident_arg node",
                 line=tree.meta.line,
                 column=tree.meta.column,
             )
 
+        if name_token.value == "has":
+            # has() macro. True if the child expression is a member expression that evaluates.
+            # False if the child expression is a member expression that cannot be evaluated.
+            return self.macro_has_eval(exprlist)
+        elif name_token.value == "dyn":
+            # dyn() macro does nothing; it's for run-time type-checking.
+            dyn_values = self.visit_children(exprlist)
+            return dyn_values[0]
+        else:
+            # Ordinary function() evaluation.
+            values = self.visit_children(exprlist)
+            return self.function_eval(
+                name_token, cast(Iterable[celpy.celtypes.Value], values)
+            )
+
+    @trace
+    def ident(self, tree: lark.Tree) -> Result:
+        """
+        ident          : IDENT
+
+        A simple identifier from the current activation.
+        """
+        name_token = cast(lark.Token, tree.children[0])
+        return self.variable(name_token.value, tree)
+
+    def variable(self, name: str, tree: lark.Tree) -> Result:
+        """The value of a name: a local bound by ``cel.bind()`` or ``cel.block()``, or a variable."""
+        if name in self.locals:
+            return self.locals[name].get()
+        result_value: Result
+        try:
+            # Should not be a Function.
+            # Generally Result object (i.e., a variable)
+            # Could be an Annotation object (i.e., a type) for protobuf messages
+            result_value = cast(Result, self.ident_value(name))
+        except KeyError as ex:
+            err = (
+                f"undeclared reference to '{name}' (in activation '{self.activation}')"
+            )
+            result_value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+        return result_value
+
     @trace
     def literal(self, tree: lark.Tree) -> Result:
         """
         Create a literal from the token at the top of the parse tree.
+        See :py:func:`literal_value`.
+        """
+        return literal_value(tree)
+
+    @trace
+    def folded(self, tree: lark.Tree) -> Result:
+        """
+        folded         : a constant value computed by :py:mod:`celpy.optimizer`
 
-        ..  todo:: Use type provider conversions from string to CEL type objects.
+        The value may be a :py:class:`CELEvalError`.
         """
-        if len(tree.children) != 1:
-            raise CELSyntaxError(
-                f"{tree.data} {tree.children}: bad literal node",
-                line=tree.meta.line,
-                column=tree.meta.column,
-            )
-        value_token = cast(lark.Token, tree.children[0])
-        try:
-            result_value: Result
-            if value_token.type == "FLOAT_LIT":
-                result_value = celpy.celtypes.DoubleType(value_token.value)
-            elif value_token.type == "INT_LIT":
-                result_value = celpy.celtypes.IntType(value_token.value)
-            elif value_token.type == "UINT_LIT":
-                if not value_token.value[-1].lower() == "u":
-                    raise CELSyntaxError(
-                        f"invalid unsigned int literal {value_token!r}",
-                        line=tree.meta.line,
-                        column=tree.meta.column,
-                    )
-                result_value = celpy.celtypes.UintType(value_token.value[:-1])
-            elif value_token.type in ("MLSTRING_LIT", "STRING_LIT"):
-                result_value = celstr(value_token)
-            elif value_token.type == "BYTES_LIT":
-                result_value = celbytes(value_token)
-            elif value_token.type == "BOOL_LIT":
-                result_value = celpy.celtypes.BoolType(
-                    value_token.value.lower() == "true"
-                )
-            elif value_token.type == "NULL_LIT":
-                result_value = None
-            else:
-                raise CELUnsupportedError(
-                    f"{tree.data} {tree.children}: type not implemented",
-                    line=value_token.line or tree.meta.line,
-                    column=value_token.column or tree.meta.column,
-                )
-        except ValueError as ex:
-            result_value = CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+        return cast(Result, tree.children[0])
 
-        return result_value
+    @trace
+    def memo(self, tree: lark.Tree) -> Result:
+        """
+        memo           : SLOT subtree, a subtree used more than once, see :py:mod:`celpy.optimizer`
+
+        The subtree is evaluated the first time it's needed.
+        """
+        slot = int(cast(lark.Token, tree.children[0]).value)
+        if slot not in self.slots:
+            self.slots[slot] = cast(
+                Result, self.visit(cast(lark.Tree, tree.children[1]))
+            )
+        return self.slots[slot]
 
     @trace
     def exprlist(self, tree: lark.Tree) -> Result:
@@ -2754,7 +3089,7 @@ class Evaluator(lark.visitors.Interpreter[Result]):
         )
         for ident_node, expr_node in pairs:
             ident = ident_node.value
-            expr = cast(celpy.celtypes.Value, self.visit_children(expr_node)[0])
+            expr = cast(celpy.celtypes.Value, self.visit(expr_node))
             if ident in fields:
                 raise ValueError(f"Duplicate field label {ident!r}")
             fields[ident] = expr
@@ -2818,6 +3153,9 @@ def result(activation: Activation, cel_expr: Callable[[Activation], Result]) ->
     value: Result
     try:
         value = cel_expr(activation)
+    except CELEvalError as ex:
+        # A constant error, see :py:func:`raise_error`.
+        value = ex
     except (
         ValueError,
         KeyError,
@@ -2844,18 +3182,235 @@ def result(activation: Activation, cel_expr: Callable[[Activation], Result]) ->
     return value
 
 
-def macro_map(
-    activation: Activation,
-    bind_variable: str,
-    cel_expr: Callable[[Activation], celpy.celtypes.Value],
-    cel_gen: Callable[[Activation], Iterable[Activation]],
-) -> Result:
-    """The results of a source.map(v, expr) macro: a list of values."""
-    activations = (
-        activation.nested_activation(vars={bind_variable: cast(Result, _value)})
-        for _value in cel_gen(activation)
-    )
-    return celpy.celtypes.ListType(map(cel_expr, activations))
+def raise_error(error: CELEvalError) -> NoReturn:
+    """
+    Raises a :py:class:`CELEvalError` that was computed in advance by :py:mod:`celpy.optimizer`.
+
+    In transpiled code, an error is an exception until a ``result()`` function makes it a value.
+    A folded constant must behave the same way as the expression it replaced.
+
+    >>> expr = lambda activation: raise_error(CELEvalError("divide by zero"))
+    >>> result(Activation(), expr)
+    CELEvalError(*('divide by zero',))
+    """
+    raise error
+
+
+def memoize(
+    slots: Dict[int, Result],
+    slot: int,
+    cel_expr: Callable[[Activation], Result],
+    activation: Activation,
+) -> Result:
+    """
+    The value of a subtree used more than once, see :py:mod:`celpy.optimizer`.
+    The first use evaluates the expression and saves the value in the slot.
+
+    >>> slots = {}
+    >>> memoize(slots, 0, lambda activation: 355 // 113, Activation())
+    3
+    >>> memoize(slots, 0, lambda activation: 355 / 0, Activation())
+    3
+
+    An exception is not saved; each use raises it again.
+    """
+    if slot not in slots:
+        slots[slot] = cel_expr(activation)
+    return slots[slot]
+
+
+def short_circuit(
+    function: CELFunction,
+    activation: Activation,
+    left: Callable[[Activation], Result],
+    right: Callable[[Activation], Result],
+) -> Result:
+    """
+    The transpiled ``&&`` and ``||`` operators.
+    The right expression is evaluated only if the left value doesn't decide the result.
+
+    >>> short_circuit(celpy.celtypes.logical_and, Activation(), lambda activation: celpy.celtypes.BoolType(False), lambda activation: 355 / 0)
+    BoolType(False)
+    >>> short_circuit(celpy.celtypes.logical_and, Activation(), lambda activation: 355 / 0, lambda activation: celpy.celtypes.BoolType(False))
+    BoolType(False)
+    """
+    left_value = result(activation, left)
+    if is_decisive(function, left_value):
+        return left_value
+    return function(left_value, result(activation, right))
+
+
+#: The macros with variables, written as methods.
+MACRO_NAMES = frozenset({"map", "filter", "all", "exists", "exists_one", "reduce"})
+
+#: The ``cel.`` extensions for local bindings.
+LOCAL_BINDINGS = frozenset({"bind", "block", "index", "iterVar"})
+
+
+class LocalSlot:
+    """
+    A value bound by ``cel.bind()``, or an entry of ``cel.block()``.
+
+    These are local to the expression, and don't need a nested :py:class:`Activation`.
+    The expression is evaluated the first time the value is used, and the value is saved.
+    An exception is not saved; each use raises it again.
+
+    >>> slot = LocalSlot(lambda activation: 355 // 113, Activation())
+    >>> slot.get()
+    3
+    """
+
+    __slots__ = ("cel_expr", "activation", "value")
+
+    def __init__(
+        self, cel_expr: Callable[[Activation], Result], activation: Activation
+    ) -> None:
+        self.cel_expr: Optional[Callable[[Activation], Result]] = cel_expr
+        self.activation = activation
+        self.value: Result = None
+
+    def get(self) -> Result:
+        if self.cel_expr is not None:
+            self.value = self.cel_expr(self.activation)
+            self.cel_expr = None
+        return self.value
+
+
+def block(
+    slots: Dict[int, LocalSlot],
+    definitions: Dict[int, Callable[[Activation], Result]],
+    cel_expr: Callable[[Activation], Result],
+    activation: Activation,
+) -> Result:
+    """
+    Evaluates a transpiled ``cel.bind()`` or ``cel.block()``.
+    Each definition is saved, unevaluated, in its slot, and then the expression is evaluated.
+
+    >>> slots = {}
+    >>> block(slots, {0: lambda activation: 6}, lambda activation: slots[0].get() * 7, Activation())
+    42
+    """
+    for slot, definition in definitions.items():
+        slots[slot] = LocalSlot(definition, activation)
+    return cel_expr(activation)
+
+
+def passed_through(tree: lark.Tree) -> lark.Tree:
+    """The node below any single-child pass-through nodes, like ``expr`` or ``primary``."""
+    while (
+        tree.data in CELParser.SHAPED_RULES
+        and len(tree.children) == 1
+        and isinstance(tree.children[0], lark.Tree)
+    ):
+        tree = tree.children[0]
+    return tree
+
+
+def local_binding(tree: lark.Tree) -> Optional[str]:
+    """
+    The name of the local binding extension used by a ``member_dot_arg`` node:
+    ``"bind"``, ``"block"``, ``"index"``, or ``"iterVar"``. None for any other node.
+    """
+    if tree.data != "member_dot_arg" or len(tree.children) != 3:
+        return None
+    member, method = tree.children[:2]
+    if not isinstance(member, lark.Tree) or method not in LOCAL_BINDINGS:
+        return None
+    member = passed_through(member)
+    if member.data == "ident" and member.children[0] == "cel":
+        return str(method)
+    return None
+
+
+def local_arguments(tree: lark.Tree, count: int) -> List[lark.Tree]:
+    """The arguments of a local binding extension, which must have ``count`` arguments."""
+    arguments = cast(lark.Tree, tree.children[2]).children
+    if len(arguments) != count:
+        raise CELSyntaxError(
+            f"cel.{tree.children[1]}() requires {count} arguments",
+            line=tree.meta.line,
+            column=tree.meta.column,
+        )
+    return cast(List[lark.Tree], arguments)
+
+
+def local_name(tree: lark.Tree) -> str:
+    """
+    The name bound to a value.
+    This is an identifier, or the name used for ``cel.index(n)`` or ``cel.iterVar(i, j)``.
+    These names can't be confused with the ordinary names used in an expression.
+    """
+    node = passed_through(tree)
+    if node.data == "ident":
+        return str(node.children[0])
+    binding = local_binding(node)
+    if binding in {"index", "iterVar"}:
+        numbers = [
+            passed_through(argument)
+            for argument in local_arguments(node, 1 if binding == "index" else 2)
+        ]
+        if all(
+            number.data == "literal"
+            and cast(lark.Token, number.children[0]).type == "INT_LIT"
+            for number in numbers
+        ):
+            suffix = "_".join(str(number.children[0]) for number in numbers)
+            return f"__index_{suffix}__" if binding == "index" else f"__it_{suffix}__"
+    raise CELSyntaxError(
+        f"{tree_dump(tree).strip()!r} is not a variable name",
+        line=tree.meta.line,
+        column=tree.meta.column,
+    )
+
+
+def unshared(tree: lark.Tree) -> lark.Tree:
+    """A copy of an AST with no shared subtrees, see :py:func:`celpy.celparser.share`."""
+    return type(tree)(
+        tree.data,
+        [
+            unshared(child) if isinstance(child, lark.Tree) else child
+            for child in tree.children
+        ],
+        tree.meta,
+    )
+
+
+def block_entries(tree: lark.Tree) -> List[lark.Tree]:
+    """The expressions in the list literal that is the first argument of ``cel.block()``."""
+    entries = passed_through(local_arguments(tree, 2)[0])
+    if entries.data != "list_lit":
+        raise CELSyntaxError(
+            "cel.block() requires a list of expressions",
+            line=tree.meta.line,
+            column=tree.meta.column,
+        )
+    if not entries.children:
+        return []
+    return cast(List[lark.Tree], cast(lark.Tree, entries.children[0]).children)
+
+
+def macro_items(activation: Activation, values: Iterable[Any]) -> Iterable[Any]:
+    """
+    The items of a macro's list or map.
+    Each item is charged to the activation's :py:class:`CostBudget`, if there is one.
+    """
+    if activation.budget is None:
+        return values
+    return activation.budget.items(values)
+
+
+def macro_map(
+    activation: Activation,
+    bind_variable: str,
+    cel_expr: Callable[[Activation], celpy.celtypes.Value],
+    cel_gen: Callable[[Activation], Iterable[Activation]],
+) -> Result:
+    """The results of a source.map(v, expr) macro: a list of values."""
+    activations = (
+        activation.nested_activation(vars={bind_variable: cast(Result, _value)})
+        for _value in macro_items(activation, cel_gen(activation))
+    )
+    return celpy.celtypes.ListType(map(cel_expr, activations))
 
 
 def macro_filter(
@@ -2866,7 +3421,7 @@ def macro_filter(
 ) -> Result:
     """The results of a source.filter(v, expr) macro: a list of values."""
     r: list[celpy.celtypes.Value] = []
-    for value in cel_gen(activation):
+    for value in macro_items(activation, cel_gen(activation)):
         f = cel_expr(
             activation.nested_activation(vars={bind_variable: cast(Result, value)})
         )
@@ -2889,7 +3444,7 @@ def macro_exists_one(
     count = 0
     activations = (
         activation.nested_activation(vars={bind_variable: cast(Result, _value)})
-        for _value in cel_gen(activation)
+        for _value in macro_items(activation, cel_gen(activation))
     )
     for result in filter(cel_expr, activations):
         count += 1 if bool(result) else 0
@@ -2905,7 +3460,7 @@ def macro_exists(
     """The results of a source.exists(v, expr) macro: a list of values."""
     activations = (
         activation.nested_activation(vars={bind_variable: cast(Result, _value)})
-        for _value in cel_gen(activation)
+        for _value in macro_items(activation, cel_gen(activation))
     )
     return celpy.celtypes.BoolType(
         reduce(
@@ -2928,7 +3483,7 @@ def macro_all(
     """The results of a source.all(v, expr) macro: a list of values."""
     activations = (
         activation.nested_activation(vars={bind_variable: cast(Result, _value)})
-        for _value in cel_gen(activation)
+        for _value in macro_items(activation, cel_gen(activation))
     )
     return celpy.celtypes.BoolType(
         reduce(
@@ -2942,6 +3497,98 @@ def macro_all(
     )
 
 
+#: A Python AST node's type.
+Node = TypeVar("Node", bound=ast.AST)
+
+#: The expression contexts, shared by all of the nodes.
+LOAD = ast.Load()
+STORE = ast.Store()
+
+
+def python_node(node_class: Type[Node], **fields: Any) -> Node:
+    """
+    A Python AST node, with the location :py:func:`compile` requires.
+    All of the transpiled code is on the first line;
+    setting the location here avoids a separate pass of :py:func:`ast.fix_missing_locations`.
+    """
+    return cast(Node, cast(Any, node_class)(**fields, lineno=1, col_offset=0))
+
+
+def python_name(dotted_name: str) -> ast.expr:
+    """
+    The Python AST for a name, like ``activation`` or ``celpy.evaluation.result``.
+
+    >>> ast.unparse(python_name("celpy.evaluation.result"))
+    'celpy.evaluation.result'
+    """
+    first, *attributes = dotted_name.split(".")
+    node: ast.expr = python_node(ast.Name, id=first, ctx=LOAD)
+    for attribute in attributes:
+        node = python_node(ast.Attribute, value=node, attr=attribute, ctx=LOAD)
+    return node
+
+
+def python_call(function: Union[str, ast.expr], *args: ast.expr) -> ast.expr:
+    """
+    The Python AST for a function call.
+
+    >>> ast.unparse(python_call("operator.add", ast.Constant(1), ast.Constant(2)))
+    'operator.add(1, 2)'
+    """
+    func = python_name(function) if isinstance(function, str) else function
+    return python_node(ast.Call, func=func, args=list(args), keywords=[])
+
+
+def python_lambda(body: ast.expr) -> ast.expr:
+    """The Python AST for ``lambda activation: body``."""
+    return python_node(ast.Lambda, args=ACTIVATION_ARGUMENTS, body=body)
+
+
+def python_assign(name: str, value: ast.expr) -> ast.stmt:
+    """The Python AST for ``name = value``."""
+    return python_node(
+        ast.Assign,
+        targets=[python_node(ast.Name, id=name, ctx=STORE)],
+        value=value,
+    )
+
+
+def python_function(name: str, body: List[ast.stmt]) -> ast.stmt:
+    """The Python AST for ``def name(activation): body``."""
+    function = python_node(
+        ast.FunctionDef,
+        name=name,
+        args=ACTIVATION_ARGUMENTS,
+        body=body,
+        decorator_list=[],
+        returns=None,
+    )
+    if "type_params" in ast.FunctionDef._fields:
+        # New in Python 3.12.
+        setattr(function, "type_params", [])
+    return function
+
+
+#: The ``activation`` argument of the transpiled lambdas, shared by all of the nodes that use it.
+ACTIVATION = python_node(ast.Name, id="activation", ctx=LOAD)
+
+
+def slots_ref(name: str) -> ast.expr:
+    """The ``activation.memo_slots`` or ``activation.local_slots`` mapping, see :py:func:`slot_activation`."""
+    return python_node(ast.Attribute, value=ACTIVATION, attr=name, ctx=LOAD)
+
+
+ACTIVATION_ARGUMENTS = ast.arguments(
+    posonlyargs=[],
+    args=[python_node(ast.arg, arg="activation")],
+    kwonlyargs=[],
+    kw_defaults=[],
+    defaults=[],
+)
+#: The default transpiled code of a node, replaced by the :py:class:`Phase1Transpiler`.
+UNTRANSPILED = python_call("ex_0", ACTIVATION)
+
+
 class TranspilerTree(lark.Tree):
     data: str
     children: "Sequence[Union[lark.Token, TranspilerTree]]"  # type: ignore[assignment]
@@ -2954,12 +3601,27 @@ class TranspilerTree(lark.Tree):
     ) -> None:
         super().__init__(data, children, meta)  # type: ignore [arg-type]
         self.expr_number: int = 0  # Updated by visitor
-        self.transpiled: str = (
-            f"ex_{self.expr_number}(activation)"  # Default, often replaced.
-        )
-        self.checked_exception: Union[
-            tuple[Template, dict[str, Callable[[TranspilerTree], str]]], None
-        ] = None  # Optional
+        self.transpiled: ast.expr = UNTRANSPILED  # Default, often replaced.
+        self.checked_exception: Optional[List[ast.stmt]] = None  # Optional
+
+
+class CompactTranspilerTree(CompactTree, TranspilerTree):
+    """
+    A :py:class:`celpy.celparser.CompactTree` with the additional slots used by the :py:class:`Transpiler`.
+    """
+
+    __slots__ = ("expr_number", "transpiled", "checked_exception")
+
+    def __init__(
+        self,
+        data: str,
+        children: "Sequence[Union[lark.Token, TranspilerTree]]",
+        meta: Optional[Any] = None,
+    ) -> None:
+        CompactTree.__init__(self, data, cast(List[Any], children), meta)
+        self.expr_number = 0
+        self.transpiled = UNTRANSPILED
+        self.checked_exception = None
 
 
 class Transpiler:
@@ -2968,14 +3630,17 @@ class Transpiler:
     This is a **Facade** that wraps two visitor subclasses to do two phases
     of transpilation.
 
-    The resulting Python code can be used with ``compile()`` and ``exec()``.
+    The resulting Python module defines a ``cel_program(activation)`` function.
+    It's an :py:mod:`ast` module, which is compiled and executed once, with ``compile()`` and ``exec()``;
+    the function is called for each evaluation.
+    The Python source text, :py:attr:`source_text`, is only created when it's needed, for debugging.
 
     :Phase I:
         The easy transpilation.
-        It builds simple text expressions for each node of the AST.
+        It builds Python :py:mod:`ast` expressions for each node of the AST.
         This sets aside exception-checking code including short-circuit logic operators and macros.
         This decorates the AST with transpiled Python where possible.
-        It can also decorate with ``Template`` objects that require text from children.
+        It can also decorate with the statements that define the lambdas for the exception-checking code.
 
     :Phase II:
         Collects a sequence of statements.
@@ -3044,6 +3709,9 @@ class Transpiler:
 
     logger = logging.getLogger("celpy.Transpiler")
 
+    #: The Python AST, created by :py:meth:`transpile`.
+    module: Optional[ast.Module] = None
+
     def __init__(
         self,
         ast: TranspilerTree,
@@ -3058,6 +3726,8 @@ class Transpiler:
         self.ast = ast
         self.base_activation = activation
         self.activation = self.base_activation
+        # Values of ``folded`` nodes, referenced by index from the transpiled code.
+        self.constants: List[Result] = []
 
         self.logger.debug("Transpiler activation: %r", self.activation)
         # self.logger.debug("functions: %r", self.functions)  # Refactor ``self.functions`` into an Activation
@@ -3069,6 +3739,13 @@ class Transpiler:
         2. Expand into statements for lambdas that wrap checked exceptions.
         """
         phase_1 = Phase1Transpiler(self)
+        if any(
+            local_binding(node) in {"bind", "block"}
+            for node in self.ast.iter_subtrees()
+        ):
+            # A shared subtree may refer to a different local in each place it's used.
+            self.ast = cast(TranspilerTree, unshared(self.ast))
+            phase_1.find_locals(self.ast, {})
         phase_1.visit(self.ast)
 
         phase_2 = Phase2Transpiler(self)
@@ -3076,33 +3753,211 @@ class Transpiler:
 
         statements = phase_2.statements(self.ast)
 
-        # The complete sequence of statements and the code object.
-        self.source_text = "\n".join(statements)
-        self.executable_code = compile(self.source_text, "<string>", "exec")
+        # The complete module of statements and the code object.
+        self.module = ast.Module(body=statements, type_ignores=[])
+        self.executable_code = compile(self.module, "<string>", "exec")
+        self.create_program()
+
+    def load(self, executable_code: types.CodeType, constants: List[Result]) -> None:
+        """
+        Use the code object and constants of a previous :py:meth:`transpile`, saved by a :py:class:`CodeCache`,
+        instead of transpiling the AST.
+        There's no :py:attr:`source_text` for this code.
+        """
+        self.executable_code = executable_code
+        self.constants = constants
+        self.create_program()
+
+    def create_program(self) -> None:
+        """Execute the code object, once, to create the ``cel_program()`` function."""
+        # The names the code uses from the ``evaluation`` module, and the constants.
+        evaluation_globals = celpy.evaluation.result.__globals__
+        self.namespace: Dict[str, Any] = {
+            name: evaluation_globals[name]
+            for name in code_names(self.executable_code)
+            if name in evaluation_globals
+        }
+        self.namespace["constants"] = self.constants
+        # Create the ``ex_{n}`` lambdas and the ``cel_program()`` function, once.
+        exec(self.executable_code, self.namespace)
+        self.cel_program = cast(
+            Callable[[Activation], Result], self.namespace["cel_program"]
+        )
+
+    @property
+    def source_text(self) -> str:
+        """
+        The Python source of the transpiled module, for debugging.
+
+        :raises ValueError: for code from a :py:class:`CodeCache`, which has no source.
+        """
+        if self.module is None:
+            raise ValueError("No source for code loaded from a cache")
+        return ast.unparse(self.module)
 
     def evaluate(self, context: Context) -> celpy.celtypes.Value:
-        if context:
-            self.activation = self.base_activation.clone()
-            self.activation.identifiers.load_values(context)
+        """
+        Call the ``cel_program()`` function created by :py:meth:`transpile`.
+        It has no state outside each call, so several threads can evaluate at the same time.
+        """
+        activation = evaluation_activation(self.base_activation, context)
+        self.logger.debug("Activation: %r", activation)
+
+        with enforce_budget(activation):
+            try:
+                value = cast(celpy.celtypes.Value, self.cel_program(activation))
+                if isinstance(value, CELEvalError):
+                    raise value
+                return value
+            except Exception as ex:
+                # A Python problem during evaluation
+                self.logger.error("Internal error: %r", ex)
+                raise CELEvalError("evaluation error", type(ex), ex.args)
+
+
+def code_names(code: types.CodeType) -> Set[str]:
+    """The global and attribute names used by a code object, and the functions defined in it."""
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= code_names(constant)
+    return names
+
+
+class CodeCache(DirectoryCache):
+    """
+    An optional, persistent cache of transpiled code, used by the :py:class:`celpy.CompiledRunner`.
+
+    Each process transpiles each AST, and compiles the resulting Python.
+    This saves the code object and the ``constants`` of each :py:class:`Transpiler` in a directory,
+    so a later process can create the ``cel_program()`` function without transpiling.
+
+    The key is a hash of the AST, the functions bound to the program, the celpy version, and the Python version.
+    The values added to the AST by :py:mod:`celpy.optimizer` and :py:mod:`celpy.checker` are part of the hash.
+    The celpy version is a digest of the package's modules,
+    so a change to the transpiler, or to the types of the constants, creates a new key.
+    The Python version is the magic number of its bytecode, which :py:mod:`marshal` depends on.
+
+    An entry is a :py:mod:`marshal`-ed tuple of the code object and the :py:mod:`pickle`-ed constants.
+    A program with a constant that can't be pickled, or can't be restored, isn't saved.
+
+    See :py:class:`celpy.celparser.DirectoryCache` for the eviction of entries, and the sharing of the directory.
+
+    ..  important::
+
+        Loading an entry runs the code saved in the directory.
+        Use a directory only the application can write to.
+
+    ::
+
+        cache = CodeCache(Path.home() / ".cache" / "celpy")
+        env = Environment(runner_class=CompiledRunner, code_cache=cache)
+    """
+
+    SUFFIX = ".code"
+    FORMAT = 1
+    CELPY_VERSION: Optional[str] = None
+
+    @classmethod
+    def celpy_version(cls) -> str:
+        """A digest of the celpy modules, and the format of the entries."""
+        if cls.CELPY_VERSION is None:
+            digest = hashlib.sha256(f"{cls.FORMAT}".encode("utf-8"))
+            for path in sorted(Path(__file__).parent.glob("*.py")):
+                digest.update(path.read_bytes())
+            cls.CELPY_VERSION = digest.hexdigest()
+        return cls.CELPY_VERSION
+
+    @staticmethod
+    def value_key(value: Any) -> str:
+        """
+        A stable description of a function, or a value in the AST.
+
+        A :py:class:`MembershipIndex` is described by its list,
+        and a compiled ``matches()`` pattern by its text.
+
+        >>> CodeCache.value_key(celpy.celtypes.ListType([celpy.celtypes.IntType(1)]))
+        'celpy.celtypes.ListType:ListType([IntType(1)])'
+        >>> CodeCache.value_key(celpy.celtypes.logical_and)
+        'celpy.celtypes.logical_and'
+        """
+        if isinstance(value, MembershipIndex):
+            return f"MembershipIndex:{value.container!r}"
+        if hasattr(value, "__qualname__"):
+            return f"{value.__module__}.{value.__qualname__}"
+        if isinstance(pattern := getattr(value, "pattern", None), str):
+            return f"pattern:{pattern!r}"
+        return f"{type(value).__module__}.{type(value).__qualname__}:{value!r}"
+
+    def key(
+        self,
+        tree: lark.Tree,
+        functions: Optional[
+            Union[Mapping[str, CELFunction], Sequence[CELFunction]]
+        ] = None,
+    ) -> str:
+        """
+        The key for an AST, and the functions bound to the program.
+
+        :param tree: The AST to transpile.
+        :param functions: The additional functions of the :py:class:`celpy.Runner`.
+        """
+        if isinstance(functions, Mapping):
+            bindings = sorted(functions.items())
         else:
-            self.activation = self.base_activation
-        self.logger.debug("Activation: %r", self.activation)
+            bindings = [(function.__name__, function) for function in functions or []]
+        parts = [self.celpy_version(), importlib.util.MAGIC_NUMBER.hex()]
+        parts.extend(f"{name}={self.value_key(f)}" for name, f in bindings)
+
+        def describe(node: Any) -> None:
+            if isinstance(node, lark.Tree):
+                parts.append(f"({node.data}")
+                for child in node.children:
+                    describe(child)
+                parts.append(")")
+            elif isinstance(node, lark.Token):
+                parts.append(f"{node.type}:{node.value!r}")
+            else:
+                parts.append(self.value_key(node))
 
-        # Global for the top-level ``CEL = result(base_activation, ...)`` statement.
-        evaluation_globals = (
-            celpy.evaluation.result.__globals__
-        )  # the ``evaluation`` moodule
-        evaluation_globals["base_activation"] = self.activation
+        describe(tree)
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[types.CodeType, List[Result]]]:
+        """Returns the cached code object and constants, or ``None``."""
+        path = self.directory / f"{key}{self.SUFFIX}"
         try:
-            exec(self.executable_code, evaluation_globals)
-            value = cast(celpy.celtypes.Value, evaluation_globals["CEL"])
-            if isinstance(value, CELEvalError):
-                raise value
-            return value
+            executable_code, pickled = marshal.loads(path.read_bytes())
+            constants = pickle.loads(pickled)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (
+            EOFError,
+            ValueError,
+            TypeError,
+            AttributeError,
+            ImportError,
+            pickle.UnpicklingError,
+        ) as ex:
+            self.discard(path, ex)
+            return None
+        self.hit(path)
+        return executable_code, constants
+
+    def put(
+        self, key: str, executable_code: types.CodeType, constants: List[Result]
+    ) -> None:
+        """Saves a code object and its constants. Problems writing to the cache are logged, not raised."""
+        try:
+            pickled = pickle.dumps(constants)
+            # Some values can be pickled, but not restored.
+            pickle.loads(pickled)
+            data = marshal.dumps((executable_code, pickled))
         except Exception as ex:
-            # A Python problem during ``exec()``
-            self.logger.error("Internal error: %r", ex)
-            raise CELEvalError("evaluation error", type(ex), ex.args)
+            logger.debug("Not caching %s: %r", key, ex)
+            return
+        self.write(self.directory / f"{key}{self.SUFFIX}", data)
 
 
 class Phase1Transpiler(lark.visitors.Visitor_Recursive):
@@ -3112,17 +3967,21 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
     a simple ``ex_{n}`` name is present, and separate statements are provided as
     a decoration to handle the more complicated cases.
 
-    Each construct has an associated ``Template``.
+    The transpiled code is a Python :py:mod:`ast` expression, built from the children's expressions.
     For the simple cases, the transpiled value is the entire expression.
 
     >>> from unittest.mock import Mock
     >>> source = "7 * (3 + 3)"
     >>> parser = celpy.CELParser()
     >>> tree = parser.parse(source)
-    >>> tp = Phase1Transpiler(Mock(base_activation=celpy.Activation()))
+    >>> tp = Phase1Transpiler(Mock(base_activation=celpy.Activation(), constants=[]))
     >>> _ = tp.visit(tree)
-    >>> tree.transpiled
-    'operator.mul(celpy.celtypes.IntType(7), operator.add(celpy.celtypes.IntType(3), celpy.celtypes.IntType(3)))'
+    >>> ast.unparse(tree.transpiled)
+    'operator.mul(constants[0], operator.add(constants[1], constants[2]))'
+    >>> tp.facade.constants
+    [IntType(7), IntType(3), IntType(3)]
+
+    The literals are constants, created once, and shared by all evaluations.
 
     Some constructs wrap macros or short-circuit logic, and require a more sophisticated execution.
     There will be "checked exceptions", returned as values.
@@ -3135,18 +3994,88 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         self.facade = facade
         self.activation = facade.base_activation
         self.expr_number = 0
+        self.visited: Set[int] = set()
+        # The slots of ``cel.bind()`` and ``cel.block()`` nodes, and the slot each reference uses.
+        self.local_slots: Dict[int, List[int]] = {}
+        self.local_refs: Dict[int, int] = {}
+        self.locals = 0
+
+    def find_locals(self, tree: TranspilerTree, scope: Dict[str, int]) -> None:
+        """
+        Assign a slot to each name bound by ``cel.bind()`` or ``cel.block()``,
+        and find the references to each slot.
+
+        The ``scope`` maps the names bound at this point in the AST to their slots.
+        A macro variable hides a local with the same name.
+        """
+        binding = local_binding(tree)
+        if binding == "bind":
+            var_tree, init_tree, expr_tree = local_arguments(tree, 3)
+            slot = self.locals
+            self.locals += 1
+            self.local_slots[id(tree)] = [slot]
+            self.find_locals(cast(TranspilerTree, init_tree), scope)
+            inner_scope = {**scope, local_name(var_tree): slot}
+            self.find_locals(cast(TranspilerTree, expr_tree), inner_scope)
+        elif binding == "block":
+            inner_scope = dict(scope)
+            self.local_slots[id(tree)] = []
+            for n, entry in enumerate(block_entries(tree)):
+                self.find_locals(cast(TranspilerTree, entry), dict(inner_scope))
+                self.local_slots[id(tree)].append(self.locals)
+                inner_scope[f"__index_{n}__"] = self.locals
+                self.locals += 1
+            expr_tree = local_arguments(tree, 2)[1]
+            self.find_locals(cast(TranspilerTree, expr_tree), inner_scope)
+        elif tree.data == "ident" or binding in {"index", "iterVar"}:
+            if (name := local_name(tree)) in scope:
+                self.local_refs[id(tree)] = scope[name]
+        elif (
+            tree.data == "member_dot_arg"
+            and tree.children[1] in MACRO_NAMES
+            and len(tree.children) == 3
+        ):
+            self.find_locals(cast(TranspilerTree, tree.children[0]), scope)
+            arguments = cast(
+                List[TranspilerTree], cast(TranspilerTree, tree.children[2]).children
+            )
+            variables = arguments[:2] if tree.children[1] == "reduce" else arguments[:1]
+            hidden = {local_name(variable) for variable in variables}
+            body_scope = {
+                name: slot for name, slot in scope.items() if name not in hidden
+            }
+            if tree.children[1] == "reduce":
+                # The initial value is outside the scope of the variables.
+                self.find_locals(arguments[2], scope)
+            self.find_locals(arguments[-1], body_scope)
+        else:
+            for child in tree.children:
+                if isinstance(child, lark.Tree):
+                    self.find_locals(child, scope)
 
     def visit(self, tree: TranspilerTree) -> TranspilerTree:  # type: ignore[override]
-        """Initialize the decorations for each node."""
+        """
+        Initialize the decorations for each node.
+
+        A subtree shared by :py:func:`celpy.celparser.share` is decorated once.
+        Visiting it again would give it a new ``expr_number``,
+        breaking the ``ex_{n}`` names already used by other nodes.
+        """
+        if id(tree) in self.visited:
+            return tree
+        self.visited.add(id(tree))
         tree.expr_number = self.expr_number
         # tree.transpiled = f"ex_{tree.expr_number}(activation)"  # Default, will be replaced.
         # tree.checked_exception: Union[str, None] = None  # Optional
         self.expr_number += 1
         return super().visit(tree)  # type: ignore[return-value]
 
-    def func_name(self, label: str) -> str:
+    def func_name(self, label: str, function: Optional[CELFunction] = None) -> ast.expr:
         """
         Provide a transpiler-friendly name for the function.
+        A ``function``, like a specialized operator from :py:mod:`celpy.checker`,
+        is used instead of the activation's function for the label.
+        A callable object without a name, like a :py:class:`MembershipIndex`, is saved as a constant.
 
         Some internally-defined functions appear to come from ``_operator`` module.
         We need to rename some ``celpy`` functions to be from ``operator``.
@@ -3154,40 +4083,118 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         Some functions -- specifically lt, le, gt, ge, eq, ne -- are wrapped ``boolean(operator.f)``
         obscuring their name.
         """
+        if function is not None and not hasattr(function, "__qualname__"):
+            return self.constant(cast(Result, function))
         try:
             # func = self.functions[label]    # Refactor ``self.functions`` into an Activation
-            func = self.activation.resolve_function(label)
+            func = function or self.activation.resolve_function(label)
         except KeyError:
-            return f"CELEvalError('unbound function', KeyError, ({label!r},))"
+            return python_call(
+                "CELEvalError",
+                python_node(ast.Constant, value="unbound function"),
+                python_name("KeyError"),
+                python_node(
+                    ast.Tuple,
+                    elts=[python_node(ast.Constant, value=label)],
+                    ctx=LOAD,
+                ),
+            )
         module = {"_operator": "operator"}.get(func.__module__, func.__module__)
-        return f"{module}.{func.__qualname__}"
+        return python_name(f"{module}.{func.__qualname__}")
+
+    def constant(self, value: Result) -> ast.expr:
+        """
+        Save a value in the facade's ``constants`` list.
+        The list is built once, when the code is transpiled, and shared by all evaluations.
+
+        :returns: The reference to the value in the transpiled code.
+        """
+        self.facade.constants.append(value)
+        return python_node(
+            ast.Subscript,
+            value=python_name("constants"),
+            slice=python_node(ast.Constant, value=len(self.facade.constants) - 1),
+            ctx=LOAD,
+        )
+
+    @staticmethod
+    def expressions(tree: Optional[TranspilerTree]) -> List[ast.expr]:
+        """The transpiled expressions of an optional ``exprlist``, ``fieldinits``, or ``mapinits``."""
+        if tree is None:
+            return []
+        return cast(ast.Tuple, tree.transpiled).elts
+
+    @staticmethod
+    def deferred(tree: TranspilerTree) -> ast.expr:
+        """The ``ex_{n}(activation)`` call of the lambda defined by a node's statements."""
+        return python_call(f"ex_{tree.expr_number}", ACTIVATION)
 
     def expr(self, tree: TranspilerTree) -> None:
         """
         expr           : conditionalor ["?" conditionalor ":" expr]
+
+        The ``?:`` operator becomes these statements::
+
+            ex_{n}_c = lambda activation: {cond}
+            ex_{n}_l = lambda activation: {left}
+            ex_{n}_r = lambda activation: {right}
+            ex_{n} = lambda activation: {func_name}(celpy.evaluation.result(activation, ex_{n}_c), ...)
         """
         if len(tree.children) == 1:
             tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
         elif len(tree.children) == 3:
-            template = Template(
-                dedent("""\
-                # expr:
-                ex_${n}_c = lambda activation: ${cond}
-                ex_${n}_l = lambda activation: ${left}
-                ex_${n}_r = lambda activation: ${rght}
-                ex_${n} = lambda activation: ${func_name}(celpy.evaluation.result(activation, ex_${n}_c), celpy.evaluation.result(activation, ex_${n}_l), celpy.evaluation.result(activation, ex_${n}_r))""")
-            )
-            tree.checked_exception = (
-                template,
-                dict(
-                    n=lambda tree: str(tree.expr_number),
-                    func_name=lambda tree: self.func_name("_?_:_"),
-                    cond=lambda tree: cast(TranspilerTree, tree.children[0]).transpiled,
-                    left=lambda tree: cast(TranspilerTree, tree.children[1]).transpiled,
-                    rght=lambda tree: cast(TranspilerTree, tree.children[2]).transpiled,
+            n = tree.expr_number
+            parts = dict(zip("clr", cast(Sequence[TranspilerTree], tree.children)))
+            tree.checked_exception = [
+                python_assign(f"ex_{n}_{part}", python_lambda(child.transpiled))
+                for part, child in parts.items()
+            ] + [
+                python_assign(
+                    f"ex_{n}",
+                    python_lambda(
+                        python_call(
+                            self.func_name("_?_:_"),
+                            *(
+                                python_call(
+                                    "celpy.evaluation.result",
+                                    ACTIVATION,
+                                    python_name(f"ex_{n}_{part}"),
+                                )
+                                for part in parts
+                            ),
+                        )
+                    ),
+                )
+            ]
+            tree.transpiled = self.deferred(tree)
+
+    def short_circuit(self, tree: TranspilerTree, op_name: str) -> None:
+        """
+        The ``||`` and ``&&`` operators become these statements::
+
+            ex_{n}_l = lambda activation: {left}
+            ex_{n}_r = lambda activation: {right}
+            ex_{n} = lambda activation: celpy.evaluation.short_circuit({func_name}, activation, ex_{n}_l, ex_{n}_r)
+        """
+        n = tree.expr_number
+        left, right = cast(Sequence[TranspilerTree], tree.children)
+        tree.checked_exception = [
+            python_assign(f"ex_{n}_l", python_lambda(left.transpiled)),
+            python_assign(f"ex_{n}_r", python_lambda(right.transpiled)),
+            python_assign(
+                f"ex_{n}",
+                python_lambda(
+                    python_call(
+                        "celpy.evaluation.short_circuit",
+                        self.func_name(op_name),
+                        ACTIVATION,
+                        python_name(f"ex_{n}_l"),
+                        python_name(f"ex_{n}_r"),
+                    )
                 ),
-            )
-            tree.transpiled = f"ex_{tree.expr_number}(activation)"
+            ),
+        ]
+        tree.transpiled = self.deferred(tree)
 
     def conditionalor(self, tree: TranspilerTree) -> None:
         """
@@ -3196,23 +4203,7 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         if len(tree.children) == 1:
             tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
         elif len(tree.children) == 2:
-            template = Template(
-                dedent("""\
-                # conditionalor:
-                ex_${n}_l = lambda activation: ${left}
-                ex_${n}_r = lambda activation: ${rght}
-                ex_${n} = lambda activation: ${func_name}(celpy.evaluation.result(activation, ex_${n}_l), celpy.evaluation.result(activation, ex_${n}_r))""")
-            )
-            tree.checked_exception = (
-                template,
-                dict(
-                    n=lambda tree: str(tree.expr_number),
-                    func_name=lambda tree: self.func_name("_||_"),
-                    left=lambda tree: cast(TranspilerTree, tree.children[0]).transpiled,
-                    rght=lambda tree: cast(TranspilerTree, tree.children[1]).transpiled,
-                ),
-            )
-            tree.transpiled = f"ex_{tree.expr_number}(activation)"
+            self.short_circuit(tree, "_||_")
 
     def conditionaland(self, tree: TranspilerTree) -> None:
         """
@@ -3221,23 +4212,25 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         if len(tree.children) == 1:
             tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
         elif len(tree.children) == 2:
-            template = Template(
-                dedent("""\
-                # conditionaland:
-                ex_${n}_l = lambda activation: ${left}
-                ex_${n}_r = lambda activation: ${rght}
-                ex_${n} = lambda activation: ${func_name}(celpy.evaluation.result(activation, ex_${n}_l), celpy.evaluation.result(activation, ex_${n}_r))""")
+            self.short_circuit(tree, "_&&_")
+
+    def binary_operator(self, tree: TranspilerTree, op_names: Dict[str, str]) -> None:
+        """
+        A binary operator becomes ``{func_name}({left}, {right})``.
+        The ``op_names`` map the operator's rule name to the function's name.
+        """
+        if len(tree.children) == 1:
+            tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
+        elif len(tree.children) == 2:
+            left_op, right_tree = cast(
+                Tuple[TranspilerTree, TranspilerTree], tree.children
             )
-            tree.checked_exception = (
-                template,
-                dict(
-                    n=lambda tree: str(tree.expr_number),
-                    func_name=lambda tree: self.func_name("_&&_"),
-                    left=lambda tree: cast(TranspilerTree, tree.children[0]).transpiled,
-                    rght=lambda tree: cast(TranspilerTree, tree.children[1]).transpiled,
-                ),
+            func_name = self.func_name(op_names[left_op.data], specialized(left_op))
+            tree.transpiled = python_call(
+                func_name,
+                cast(TranspilerTree, left_op.children[0]).transpiled,
+                right_tree.transpiled,
             )
-            tree.transpiled = f"ex_{tree.expr_number}(activation)"
 
     def relation(self, tree: TranspilerTree) -> None:
         """
@@ -3252,13 +4245,9 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         relation_ne    : relation "!="
         relation_in    : relation "in"
         """
-        if len(tree.children) == 1:
-            tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
-        elif len(tree.children) == 2:
-            left_op, right_tree = cast(
-                Tuple[TranspilerTree, TranspilerTree], tree.children
-            )
-            op_name = {
+        self.binary_operator(
+            tree,
+            {
                 "relation_lt": "_<_",
                 "relation_le": "_<=_",
                 "relation_ge": "_>=_",
@@ -3266,14 +4255,8 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
                 "relation_eq": "_==_",
                 "relation_ne": "_!=_",
                 "relation_in": "_in_",
-            }[left_op.data]
-            func_name = self.func_name(op_name)
-            template = Template("${func_name}(${left}, ${right})")
-            tree.transpiled = template.substitute(
-                func_name=func_name,
-                left=cast(TranspilerTree, left_op.children[0]).transpiled,
-                right=right_tree.transpiled,
-            )
+            },
+        )
 
     def addition(self, tree: TranspilerTree) -> None:
         """
@@ -3282,23 +4265,13 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         addition_add   : addition "+"
         addition_sub   : addition "-"
         """
-        if len(tree.children) == 1:
-            tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
-        elif len(tree.children) == 2:
-            left_op, right_tree = cast(
-                Tuple[TranspilerTree, TranspilerTree], tree.children
-            )
-            op_name = {
+        self.binary_operator(
+            tree,
+            {
                 "addition_add": "_+_",
                 "addition_sub": "_-_",
-            }[left_op.data]
-            func_name = self.func_name(op_name)
-            template = Template("${func_name}(${left}, ${right})")
-            tree.transpiled = template.substitute(
-                func_name=func_name,
-                left=cast(TranspilerTree, left_op.children[0]).transpiled,
-                right=right_tree.transpiled,
-            )
+            },
+        )
 
     def multiplication(self, tree: TranspilerTree) -> None:
         """
@@ -3308,25 +4281,14 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         multiplication_div : multiplication "/"
         multiplication_mod : multiplication "%"
         """
-        if len(tree.children) == 1:
-            tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
-        elif len(tree.children) == 2:
-            template = Template("${func_name}(*${children})")
-            left_op, right_tree = cast(
-                Tuple[TranspilerTree, TranspilerTree], tree.children
-            )
-            op_name = {
+        self.binary_operator(
+            tree,
+            {
                 "multiplication_mul": "_*_",
                 "multiplication_div": "_/_",
                 "multiplication_mod": "_%_",
-            }[left_op.data]
-            func_name = self.func_name(op_name)
-            template = Template("${func_name}(${left}, ${right})")
-            tree.transpiled = template.substitute(
-                func_name=func_name,
-                left=cast(TranspilerTree, left_op.children[0]).transpiled,
-                right=right_tree.transpiled,
-            )
+            },
+        )
 
     def unary(self, tree: TranspilerTree) -> None:
         """
@@ -3338,7 +4300,6 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         if len(tree.children) == 1:
             tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
         elif len(tree.children) == 2:
-            template = Template("${func_name}(${children})")
             op_tree, right_tree = cast(
                 Tuple[TranspilerTree, TranspilerTree], tree.children
             )
@@ -3346,10 +4307,8 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
                 "unary_not": "!_",
                 "unary_neg": "-_",
             }[op_tree.data]
-            func_name = self.func_name(op_name)
-            children = right_tree.transpiled
-            tree.transpiled = template.substitute(
-                func_name=func_name, children=children
+            tree.transpiled = python_call(
+                self.func_name(op_name), right_tree.transpiled
             )
 
     def member(self, tree: TranspilerTree) -> None:
@@ -3383,9 +4342,11 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         member_tree, property_name_token = cast(
             Tuple[TranspilerTree, lark.Token], tree.children
         )
-        template = Template("${left}.get('${right}')")
-        tree.transpiled = template.substitute(
-            left=member_tree.transpiled, right=property_name_token.value
+        tree.transpiled = python_call(
+            python_node(
+                ast.Attribute, value=member_tree.transpiled, attr="get", ctx=LOAD
+            ),
+            python_node(ast.Constant, value=property_name_token.value),
         )
 
     def member_dot_arg(self, tree: TranspilerTree) -> None:
@@ -3393,6 +4354,12 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
         member_dot_arg : member "." IDENT "(" [exprlist] ")"
 
         Two flavors: macro and non-macro.
+
+        A macro becomes these statements::
+
+            ex_{n}_l = lambda activation: {member}
+            ex_{n}_x = lambda activation: {expr}
+            ex_{n} = lambda activation: celpy.evaluation.macro_{macro}(activation, '{bind_variable}', ex_{n}_x, ex_{n}_l)
         """
         exprlist: Union[TranspilerTree, None]
         if len(tree.children) == 3:
@@ -3405,7 +4372,9 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
                 Tuple[TranspilerTree, lark.Token], tree.children
             )
             exprlist = None
-        if property_name_token.value in {
+        if binding := local_binding(tree):
+            self.local_binding(tree, binding)
+        elif property_name_token.value in {
             "map",
             "filter",
             "all",
@@ -3415,352 +4384,1392 @@ class Phase1Transpiler(lark.visitors.Visitor_Recursive):
             "min",
         }:
             # Macro. Defer to Phase II.
-            template = Template(
-                dedent("""\
-                    # member_dot_arg ${macro}:
-                    ex_${n}_l = lambda activation: ${member}
-                    ex_${n}_x = lambda activation: ${expr}
-                    ex_${n} = lambda activation: celpy.evaluation.macro_${macro}(activation, '${bind_variable}', ex_${n}_x, ex_${n}_l)
-                    """)
-            )
-            if len(tree.children) == 3:
-                # Hackery. Undo the transpiling of the identifier and extract only the name.
-                context, bind_variable = cast(
-                    TranspilerTree, cast(TranspilerTree, tree.children[2]).children[0]
-                ).transpiled.split(".")
-            else:
+            if exprlist is None:
                 raise CELSyntaxError(  # pragma: no cover
                     f"no bind variable in {property_name_token.value} macro",
                     line=tree.meta.line,
                     column=tree.meta.column,
                 )
-
-            tree.checked_exception = (
-                template,
-                dict(
-                    n=lambda tree: str(tree.expr_number),
-                    macro=lambda tree: property_name_token.value,
-                    member=lambda tree: (
-                        cast(TranspilerTree, tree.children[0]).transpiled
-                    ),
-                    bind_variable=lambda tree: bind_variable,
-                    expr=lambda tree: (
-                        cast(
-                            TranspilerTree,
-                            cast(TranspilerTree, tree.children[2]).children[1],
-                        ).transpiled
-                        if len(tree.children) == 3
-                        else ""
+            variable_tree, expr_tree = cast(
+                Sequence[TranspilerTree], exprlist.children
+            )[:2]
+            n = tree.expr_number
+            tree.checked_exception = [
+                python_assign(f"ex_{n}_l", python_lambda(member_tree.transpiled)),
+                python_assign(f"ex_{n}_x", python_lambda(expr_tree.transpiled)),
+                python_assign(
+                    f"ex_{n}",
+                    python_lambda(
+                        python_call(
+                            f"celpy.evaluation.macro_{property_name_token.value}",
+                            ACTIVATION,
+                            python_node(ast.Constant, value=local_name(variable_tree)),
+                            python_name(f"ex_{n}_x"),
+                            python_name(f"ex_{n}_l"),
+                        )
                     ),
                 ),
-            )
-            tree.transpiled = f"ex_{tree.expr_number}(activation)"
+            ]
+            tree.transpiled = self.deferred(tree)
 
         else:
             # Non-macro method name.
-            if exprlist:
-                template = Template("${func_name}(${left}, ${right})")
-                func_name = self.func_name(property_name_token.value)
-                tree.transpiled = template.substitute(
-                    func_name=func_name,
-                    left=member_tree.transpiled,
-                    right=exprlist.transpiled,
-                )
-            else:
-                template = Template("${func_name}(${left})")
-                func_name = self.func_name(property_name_token.value)
-                tree.transpiled = template.substitute(
-                    func_name=func_name,
-                    left=member_tree.transpiled,
-                )
+            tree.transpiled = python_call(
+                self.func_name(property_name_token.value),
+                member_tree.transpiled,
+                *self.expressions(exprlist),
+            )
 
-    def member_index(self, tree: TranspilerTree) -> None:
+    def local_binding(self, tree: TranspilerTree, binding: str) -> None:
         """
-        member_item    : member "[" expr "]"
+        The local binding extensions: ``cel.bind()``, ``cel.block()``, ``cel.index()``, and ``cel.iterVar()``.
+
+        Each name bound by ``cel.bind()`` or ``cel.block()`` has a slot in the ``local`` mapping,
+        assigned by :py:meth:`find_locals`.
+        Each definition becomes a lambda; a reference to the name transpiles to ``local[{slot}].get()``.
+        A ``cel.iterVar(i, j)`` is a macro variable, in the activation.
+
+        A ``cel.bind()`` or ``cel.block()`` becomes these statements::
+
+            ex_{n}_{slot} = lambda activation: {definition}
+            ex_{n}_x = lambda activation: {expr}
+            ex_{n} = lambda activation: celpy.evaluation.block(local, {{slot}: ex_{n}_{slot}}, ex_{n}_x, activation)
+        """
+        if binding in {"index", "iterVar"}:
+            if id(tree) in self.local_refs:
+                tree.transpiled = self.local_ref(self.local_refs[id(tree)])
+            else:
+                tree.transpiled = python_call(
+                    "activation.get", python_node(ast.Constant, value=local_name(tree))
+                )
+            return
+        if binding == "bind":
+            _, init_tree, expr_tree = local_arguments(tree, 3)
+            definitions = [cast(TranspilerTree, init_tree)]
+        else:
+            definitions = cast(List[TranspilerTree], block_entries(tree))
+            expr_tree = local_arguments(tree, 2)[1]
+        n = tree.expr_number
+        slots = self.local_slots[id(tree)]
+        tree.checked_exception = [
+            python_assign(f"ex_{n}_{slot}", python_lambda(definition.transpiled))
+            for slot, definition in zip(slots, definitions)
+        ] + [
+            python_assign(
+                f"ex_{n}_x",
+                python_lambda(cast(TranspilerTree, expr_tree).transpiled),
+            ),
+            python_assign(
+                f"ex_{n}",
+                python_lambda(
+                    python_call(
+                        "celpy.evaluation.block",
+                        slots_ref("local_slots"),
+                        python_node(
+                            ast.Dict,
+                            keys=[
+                                python_node(ast.Constant, value=slot) for slot in slots
+                            ],
+                            values=[python_name(f"ex_{n}_{slot}") for slot in slots],
+                        ),
+                        python_name(f"ex_{n}_x"),
+                        ACTIVATION,
+                    )
+                ),
+            ),
+        ]
+        tree.transpiled = self.deferred(tree)
+
+    @staticmethod
+    def local_ref(slot: int) -> ast.expr:
+        """The ``activation.local_slots[{slot}].get()`` reference to a name bound by ``cel.bind()`` or ``cel.block()``."""
+        return python_call(
+            python_node(
+                ast.Attribute,
+                value=python_node(
+                    ast.Subscript,
+                    value=slots_ref("local_slots"),
+                    slice=python_node(ast.Constant, value=slot),
+                    ctx=LOAD,
+                ),
+                attr="get",
+                ctx=LOAD,
+            )
+        )
+
+    def member_index(self, tree: TranspilerTree) -> None:
+        """
+        member_item    : member "[" expr "]"
+        """
+        member, expr = cast(tuple[TranspilerTree, TranspilerTree], tree.children)
+        tree.transpiled = python_call(
+            self.func_name("_[_]"), member.transpiled, expr.transpiled
+        )
+
+    def member_object(self, tree: TranspilerTree) -> None:
+        """
+        member_object  : member "{" [fieldinits] "}"
+        """
+        member = cast(TranspilerTree, tree.children[0])
+        fieldinits = (
+            cast(TranspilerTree, tree.children[1]) if len(tree.children) == 2 else None
+        )
+        tree.transpiled = python_call(
+            member.transpiled,
+            python_node(ast.List, elts=self.expressions(fieldinits), ctx=LOAD),
+        )
+
+    def primary(self, tree: TranspilerTree) -> None:
+        """
+        primary        : dot_ident_arg | dot_ident | ident_arg | ident
+                       | paren_expr | list_lit | map_lit | literal
+        """
+        tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
+
+    def dot_ident_arg(self, tree: TranspilerTree) -> None:
+        """
+        dot_ident_arg  : "." IDENT "(" [exprlist] ")"
+        """
+        ident = cast(lark.Token, tree.children[0]).value
+        exprlist = (
+            cast(TranspilerTree, tree.children[1]) if len(tree.children) == 2 else None
+        )
+        tree.transpiled = python_call(
+            python_call(
+                "activation.resolve_variable", python_node(ast.Constant, value=ident)
+            ),
+            *self.expressions(exprlist),
+        )
+
+    def dot_ident(self, tree: TranspilerTree) -> None:
+        """
+        dot_ident      : "." IDENT
+        """
+        ident = cast(lark.Token, tree.children[0]).value
+        tree.transpiled = python_call(
+            "activation.resolve_variable", python_node(ast.Constant, value=ident)
+        )
+
+    def ident_arg(self, tree: TranspilerTree) -> None:
+        """
+        ident_arg      : IDENT "(" [exprlist] ")"
+
+        The ``has()`` macro becomes these statements::
+
+            ex_{n}_h = lambda activation: {exprlist}
+            ex_{n} = lambda activation: celpy.celtypes.BoolType(not isinstance(celpy.evaluation.result(activation, ex_{n}_h), CELEvalError))
+        """
+        op = cast(lark.Token, tree.children[0]).value
+        exprlist = (
+            cast(TranspilerTree, tree.children[1]) if len(tree.children) == 2 else None
+        )
+        if op in {"has", "dyn"}:
+            # Macro-like has() or dyn()
+            if op == "dyn":
+                tree.transpiled = self.expressions(exprlist)[0]
+            elif op == "has":
+                # try to evaluate the exprlist expression
+                # TODO: as macro_has() would be better...
+                n = tree.expr_number
+                tree.checked_exception = [
+                    python_assign(
+                        f"ex_{n}_h", python_lambda(self.expressions(exprlist)[0])
+                    ),
+                    python_assign(
+                        f"ex_{n}",
+                        python_lambda(
+                            python_call(
+                                "celpy.celtypes.BoolType",
+                                python_node(
+                                    ast.UnaryOp,
+                                    op=ast.Not(),
+                                    operand=python_call(
+                                        "isinstance",
+                                        python_call(
+                                            "celpy.evaluation.result",
+                                            ACTIVATION,
+                                            python_name(f"ex_{n}_h"),
+                                        ),
+                                        python_name("CELEvalError"),
+                                    ),
+                                ),
+                            )
+                        ),
+                    ),
+                ]
+                tree.transpiled = self.deferred(tree)
+        else:
+            # Other function
+            tree.transpiled = python_call(
+                self.func_name(op), *self.expressions(exprlist)
+            )
+
+    def ident(self, tree: TranspilerTree) -> None:
+        """
+        ident          : IDENT
+        """
+        if id(tree) in self.local_refs:
+            tree.transpiled = self.local_ref(self.local_refs[id(tree)])
+            return
+        tree.transpiled = python_node(
+            ast.Attribute,
+            value=ACTIVATION,
+            attr=cast(lark.Token, tree.children[0]).value,
+            ctx=LOAD,
+        )
+
+    def paren_expr(self, tree: TranspilerTree) -> None:
+        """
+        paren_expr     : "(" expr ")"
+        """
+        tree.transpiled = cast(Sequence[TranspilerTree], tree.children)[0].transpiled
+
+    def list_lit(self, tree: TranspilerTree) -> None:
+        """
+        list_lit       : "[" [exprlist] "]"
+
+        The items may be constants, but the list is built by each evaluation:
+        a list is mutable, and each result must be a new object.
+        """
+        exprlists = cast(Sequence[TranspilerTree], tree.children)
+        items = self.expressions(exprlists[0] if exprlists else None)
+        tree.transpiled = python_call(
+            "celpy.celtypes.ListType", python_node(ast.List, elts=items, ctx=LOAD)
+        )
+
+    def map_lit(self, tree: TranspilerTree) -> None:
+        """
+        map_lit        : "{" [mapinits] "}"
+
+        The keys and values may be constants, but the mapping is built by each evaluation, like a list.
+        """
+        mapinits = cast(Sequence[TranspilerTree], tree.children)
+        items = self.expressions(mapinits[0] if mapinits else None)
+        tree.transpiled = python_call(
+            "celpy.celtypes.MapType", python_node(ast.List, elts=items, ctx=LOAD)
+        )
+
+    def exprlist(self, tree: TranspilerTree) -> None:
+        """
+        exprlist       : expr ("," expr)*
+
+        The transpiled value is a tuple of the expressions, used as the arguments of a function.
+        """
+        tree.transpiled = python_node(
+            ast.Tuple,
+            elts=[c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)],
+            ctx=LOAD,
+        )
+
+    def fieldinits(self, tree: TranspilerTree) -> None:
+        """
+        fieldinits     : IDENT ":" expr ("," IDENT ":" expr)*
+
+        The transpiled value is a tuple of ``(name, value)`` pairs.
+        """
+        idents = [
+            cast(lark.Token, c).value
+            for c in cast(Sequence[TranspilerTree], tree.children)[::2]
+        ]
+        exprs = [
+            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[1::2]
+        ]
+        assert len(idents) == len(exprs), "Invalid AST"
+        tree.transpiled = python_node(
+            ast.Tuple,
+            elts=[
+                python_node(
+                    ast.Tuple,
+                    elts=[python_node(ast.Constant, value=n), v],
+                    ctx=LOAD,
+                )
+                for n, v in zip(idents, exprs)
+            ],
+            ctx=LOAD,
+        )
+
+    def mapinits(self, tree: TranspilerTree) -> None:
+        """
+        mapinits       : expr ":" expr ("," expr ":" expr)*
+
+        The transpiled value is a tuple of ``(key, value)`` pairs.
+        """
+        keys = [
+            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[::2]
+        ]
+        values = [
+            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[1::2]
+        ]
+        assert len(keys) == len(values)
+        tree.transpiled = python_node(
+            ast.Tuple,
+            elts=[
+                python_node(ast.Tuple, elts=[k, v], ctx=LOAD)
+                for k, v in zip(keys, values)
+            ],
+            ctx=LOAD,
+        )
+
+    def literal(self, tree: TranspilerTree) -> None:
+        """
+        literal        : UINT_LIT | FLOAT_LIT | INT_LIT | MLSTRING_LIT | STRING_LIT | BYTES_LIT
+               | BOOL_LIT | NULL_LIT
+
+        The value is created once, here, and saved in the facade's ``constants`` list.
+        """
+        value_token = cast(lark.Token, tree.children[0])
+        value = literal_value(tree)
+        if value_token.type == "NULL_LIT":
+            # Not celpy.celtypes.NullType() in transpiled code.
+            tree.transpiled = python_node(ast.Constant, value=None)
+        elif isinstance(value, CELEvalError):
+            # An invalid literal raises its exception during evaluation, like a folded error.
+            tree.transpiled = python_call(
+                "celpy.evaluation.raise_error", self.constant(value)
+            )
+        else:
+            tree.transpiled = self.constant(value)
+
+    def folded(self, tree: TranspilerTree) -> None:
+        """
+        folded         : a constant value computed by :py:mod:`celpy.optimizer`
+
+        The value is saved in the facade's ``constants`` list.
+        An error value is raised, the way the original expression would have raised it.
+        """
+        constant = self.constant(cast(Result, tree.children[0]))
+        if isinstance(tree.children[0], CELEvalError):
+            tree.transpiled = python_call("celpy.evaluation.raise_error", constant)
+        else:
+            tree.transpiled = constant
+
+    def memo(self, tree: TranspilerTree) -> None:
+        """
+        memo           : SLOT subtree, a subtree used more than once, see :py:mod:`celpy.optimizer`
+
+        The subtree becomes a ``memo_{slot}`` lambda.
+        Each use goes through the activation's ``memo_slots`` mapping, created once for each evaluation.
+        """
+        slot = cast(lark.Token, tree.children[0]).value
+        tree.checked_exception = [
+            python_assign(
+                f"memo_{slot}",
+                python_lambda(cast(TranspilerTree, tree.children[1]).transpiled),
+            )
+        ]
+        tree.transpiled = python_call(
+            "celpy.evaluation.memoize",
+            slots_ref("memo_slots"),
+            python_node(ast.Constant, value=int(slot)),
+            python_name(f"memo_{slot}"),
+            ACTIVATION,
+        )
+
+
+class Phase2Transpiler(lark.visitors.Visitor_Recursive):
+    """
+    Extract any checked_exception evaluation statements that decorate the parse tree.
+    Also, get the overall top-level expression, assigned to special variable, CEL,
+    and evaluated by the ``cel_program()`` function.
+
+    >>> from unittest.mock import Mock
+    >>> source = '["hello", "world"].map(x, x) == ["hello", "world"]'
+    >>> celpy.CELParser.CEL_PARSER = None
+    >>> parser = celpy.CELParser(tree_class=celpy.evaluation.TranspilerTree)
+    >>> tree = parser.parse(source)
+    >>> tp1 = Phase1Transpiler(Mock(base_activation=celpy.Activation(), constants=[]))
+    >>> _ = tp1.visit(tree)
+    >>> tp2 = Phase2Transpiler(Mock(base_activation=celpy.Activation()))
+    >>> _ = tp2.visit(tree)
+    >>> print(ast.unparse(ast.Module(body=tp2.statements(tree), type_ignores=[])))
+    ex_10_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
+    ex_10_x = lambda activation: activation.x
+    ex_10 = lambda activation: celpy.evaluation.macro_map(activation, 'x', ex_10_x, ex_10_l)
+    CEL = lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([constants[2], constants[3]]))
+    <BLANKLINE>
+    def cel_program(activation):
+        return celpy.evaluation.result(activation, CEL)
+    """
+
+    def __init__(self, facade: Transpiler) -> None:
+        self.facade = facade
+        self._statements: List[ast.stmt] = []
+        self.visited: Set[int] = set()
+        self.memos = 0
+        self.locals = 0
+
+    def visit(self, tree: TranspilerTree) -> TranspilerTree:  # type: ignore[override]
+        """Extract the statements for a shared subtree only once."""
+        if id(tree) in self.visited:
+            return tree
+        self.visited.add(id(tree))
+        return super().visit(tree)  # type: ignore[return-value]
+
+    def expr(self, tree: TranspilerTree) -> None:
+        """
+        expr           : conditionalor ["?" conditionalor ":" expr]
+
+        All checked_exception structures are a list of :py:mod:`ast` statements.
+        """
+        if tree.checked_exception:
+            self._statements.extend(tree.checked_exception)
+
+    conditionalor = expr
+    conditionaland = expr
+    ident_arg = expr
+
+    def memo(self, tree: TranspilerTree) -> None:
+        """A ``memo_{slot}`` lambda; the ``memo_slots`` mapping is created by :py:meth:`statements`."""
+        self.memos += 1
+        self.expr(tree)
+
+    def member_dot_arg(self, tree: TranspilerTree) -> None:
+        """A macro, or a ``cel.bind()`` or ``cel.block()``, which uses the ``local_slots`` mapping."""
+        if local_binding(tree) in {"bind", "block"}:
+            self.locals += 1
+        self.expr(tree)
+
+    def statements(self, tree: TranspilerTree) -> List[ast.stmt]:
+        """
+        Appends the final ``CEL = ...`` statement and the ``cel_program()`` function
+        to the sequence of statements, and returns the transpiled code.
+
+        Two patterns for ``CEL``:
+
+        1.  Top-most expr was a deferred template, and already is a lambda.
+            It will be an ``ex_{n}(activation)`` call.
+
+        2.  Top-most expr was **not** a deferred template, and needs a lambda wrapper.
+
+        The lambdas are created once, when the code is executed by :py:meth:`Transpiler.transpile`.
+        Each evaluation is one call to ``cel_program(activation)``.
+        The ``memo_slots`` and ``local_slots`` must be empty for each evaluation,
+        so when they're used, ``cel_program()`` evaluates ``CEL`` with a :py:func:`slot_activation`.
+        """
+        top = tree.transpiled
+        if (
+            isinstance(top, ast.Call)
+            and isinstance(top.func, ast.Name)
+            and top.func.id.startswith("ex_")
+        ):
+            final = python_assign("CEL", top.func)
+        else:
+            final = python_assign("CEL", python_lambda(top))
+        activation: ast.expr = ACTIVATION
+        if self.memos or self.locals:
+            # Slots for memo_{n} values, cel.bind() and cel.block() values, empty for each evaluation.
+            activation = python_call("celpy.evaluation.slot_activation", ACTIVATION)
+        program = python_node(
+            ast.Return,
+            value=python_call(
+                "celpy.evaluation.result", activation, python_name("CEL")
+            ),
+        )
+        return self._statements + [final, python_function("cel_program", [program])]
+
+
+#: The functions that combine the values of the ``all()`` and ``exists()`` macros.
+#: An error value is combined with the others, and may be ignored.
+MACRO_LOGIC: Dict[
+    str, Callable[[celpy.celtypes.BoolType, Result], celpy.celtypes.BoolType]
+] = {
+    "all": cast(
+        Callable[[celpy.celtypes.BoolType, Result], celpy.celtypes.BoolType],
+        eval_error("no such overload", TypeError)(celpy.celtypes.logical_and),
+    ),
+    "exists": cast(
+        Callable[[celpy.celtypes.BoolType, Result], celpy.celtypes.BoolType],
+        eval_error("no such overload", TypeError)(celpy.celtypes.logical_or),
+    ),
+}
+
+#: A CEL expression compiled by :py:class:`ClosureCompiler`: a function of the activation.
+CELClosure = Callable[[Activation], Result]
+
+
+class ClosureCompiler(lark.visitors.Interpreter[CELClosure]):
+    """
+    Compile the CEL construct(s) to a tree of Python closures.
+
+    Each node of the AST becomes a function of an :py:class:`Activation`,
+    which calls the functions built for the node's children.
+    The AST is examined once, when the closures are built:
+    the functions for operators and methods are resolved, literals are created,
+    each name is either a variable or a local bound by ``cel.bind()`` or ``cel.block()``,
+    and the pass-through nodes, like ``expr`` with a single child, disappear.
+    An evaluation only calls the closures.
+
+    The closures have the same semantics as the :py:class:`Evaluator`.
+    An error is a :py:class:`CELEvalError` value, which the ``&&``, ``||``, and ``?:`` operators can ignore.
+    A macro's expression is evaluated in a nested :py:class:`Activation` for each item.
+
+    >>> celpy.CELParser.CEL_PARSER = None
+    >>> tree = celpy.CELParser().parse("[1, 2, 3].map(n, n * 2)")
+    >>> cc = ClosureCompiler(tree, Activation())
+    >>> cc.evaluate({})
+    ListType([IntType(2), IntType(4), IntType(6)])
+    """
+
+    logger = logging.getLogger("celpy.ClosureCompiler")
+
+    def __init__(self, ast: lark.Tree, activation: Activation) -> None:
+        """
+        Compile an AST with specific functions and types.
+
+        :param ast: The AST to compile.
+        :param activation: An activation with functions and types to use.
+        """
+        self.ast = ast
+        self.base_activation = activation
+        self.activation = self.base_activation
+        # The ``slots`` with values of ``memo`` nodes, and the ``locals`` with values of names
+        # bound by ``cel.bind()`` and ``cel.block()``, for the evaluation in each thread.
+        self.frame = threading.local()
+        # While compiling, the locals bound at this point in the AST, and their slots.
+        self.scope: Dict[str, int] = {}
+        self.local_count = 0
+        self.closure = self.visit(ast)
+
+    def evaluate(self, context: Optional[Context] = None) -> celpy.celtypes.Value:
+        """
+        Evaluate the closures and return the value or raise an exception.
+        Several threads can evaluate at the same time.
+        """
+        activation = evaluation_activation(self.base_activation, context)
+        self.logger.debug("Activation: %r", activation)
+        self.frame.slots = {}
+        self.frame.locals = {}
+        with enforce_budget(activation):
+            value = self.closure(activation)
+        if isinstance(value, CELEvalError):
+            raise value
+        return cast(celpy.celtypes.Value, value)
+
+    def visit(self, tree: lark.Tree) -> CELClosure:
+        """Compile a subtree to a closure."""
+        return cast(CELClosure, super().visit(tree))
+
+    def scoped(self, tree: lark.Tree, scope: Dict[str, int]) -> CELClosure:
+        """Compile a subtree with the given locals."""
+        outer_scope, self.scope = self.scope, scope
+        try:
+            return self.visit(tree)
+        finally:
+            self.scope = outer_scope
+
+    def function(self, name: str) -> Optional[CELFunction]:
+        """The function for a name, or None if there's no such function."""
+        try:
+            return self.activation.resolve_function(name)
+        except KeyError:
+            return None
+
+    def expr(self, tree: lark.Tree) -> CELClosure:
+        """
+        expr           : conditionalor ["?" conditionalor ":" expr]
+
+        Only the chosen alternative is evaluated; see :py:meth:`Evaluator.expr`.
+        """
+        if len(tree.children) == 1:
+            return self.visit(cast(lark.Tree, tree.children[0]))
+        elif len(tree.children) != 3:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad expr node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        func = self.activation.resolve_function("_?_:_")
+        cond, left, right = [
+            self.visit(cast(lark.Tree, child)) for child in tree.children
+        ]
+
+        def cel_expr(activation: Activation) -> Result:
+            cond_value = cond(activation)
+            left_value = right_value = cast(Result, celpy.celtypes.BoolType(False))
+            try:
+                if cond_value:
+                    left_value = left(activation)
+                else:
+                    right_value = right(activation)
+                return func(cond_value, left_value, right_value)
+            except TypeError as ex:
+                err = (
+                    f"found no matching overload for _?_:_ "
+                    f"applied to '({type(cond_value)}, {type(left_value)}, {type(right_value)})'"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+
+        return cel_expr
+
+    def logical(self, tree: lark.Tree, op_name: str) -> CELClosure:
+        """
+        The ``&&`` and ``||`` operators.
+        When the left value decides the result, the right closure isn't called.
+        """
+        if len(tree.children) == 1:
+            return self.visit(cast(lark.Tree, tree.children[0]))
+        elif len(tree.children) != 2:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad {tree.data} node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        func = self.activation.resolve_function(op_name)
+        left, right = [self.visit(cast(lark.Tree, child)) for child in tree.children]
+
+        def cel_logical(activation: Activation) -> Result:
+            left_value = left(activation)
+            if is_decisive(func, left_value):
+                return left_value
+            right_value = right(activation)
+            try:
+                return func(left_value, right_value)
+            except TypeError as ex:
+                err = (
+                    f"found no matching overload for {op_name} "
+                    f"applied to '({type(left_value)}, {type(right_value)})'"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+
+        return cel_logical
+
+    def conditionalor(self, tree: lark.Tree) -> CELClosure:
+        """
+        conditionalor  : [conditionalor "||"] conditionaland
+        """
+        return self.logical(tree, "_||_")
+
+    def conditionaland(self, tree: lark.Tree) -> CELClosure:
+        """
+        conditionaland : [conditionaland "&&"] relation
+        """
+        return self.logical(tree, "_&&_")
+
+    def binary(
+        self,
+        tree: lark.Tree,
+        op_names: Dict[str, str],
+        errors: Tuple[Type[Exception], ...] = (),
+    ) -> CELClosure:
+        """
+        A binary operator, with the specialized function added by :py:mod:`celpy.checker`, if there is one.
+
+        A :exc:`TypeError` is an error value, as are the ``errors`` the operator can raise:
+        :exc:`ZeroDivisionError` and the overflow errors, :exc:`ValueError` and :exc:`OverflowError`.
+        """
+        if len(tree.children) == 1:
+            return self.visit(cast(lark.Tree, tree.children[0]))
+        elif len(tree.children) != 2:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad {tree.data} node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        left_op, right_tree = cast(Tuple[lark.Tree, lark.Tree], tree.children)
+        func = specialized(left_op) or self.activation.resolve_function(
+            op_names[left_op.data]
+        )
+        left = self.visit(cast(lark.Tree, left_op.children[0]))
+        right = self.visit(right_tree)
+
+        def cel_binary(activation: Activation) -> Result:
+            left_value = left(activation)
+            right_value = right(activation)
+            try:
+                return func(left_value, right_value)
+            except TypeError as ex:
+                err = (
+                    f"found no matching overload for {left_op.data!r} "
+                    f"applied to '({type(left_value)}, {type(right_value)})'"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+            except errors as ex:
+                err = (
+                    "modulus or divide by zero"
+                    if isinstance(ex, ZeroDivisionError)
+                    else "return error for overflow"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+
+        return cel_binary
+
+    def relation(self, tree: lark.Tree) -> CELClosure:
+        """
+        relation       : [relation_lt | relation_le | relation_ge | relation_gt
+                       | relation_eq | relation_ne | relation_in] addition
+        """
+        return self.binary(
+            tree,
+            {
+                "relation_lt": "_<_",
+                "relation_le": "_<=_",
+                "relation_ge": "_>=_",
+                "relation_gt": "_>_",
+                "relation_eq": "_==_",
+                "relation_ne": "_!=_",
+                "relation_in": "_in_",
+            },
+        )
+
+    def addition(self, tree: lark.Tree) -> CELClosure:
+        """
+        addition       : [addition_add | addition_sub] multiplication
+        """
+        return self.binary(
+            tree,
+            {"addition_add": "_+_", "addition_sub": "_-_"},
+            (ValueError, OverflowError),
+        )
+
+    def multiplication(self, tree: lark.Tree) -> CELClosure:
+        """
+        multiplication : [multiplication_mul | multiplication_div | multiplication_mod] unary
+        """
+        return self.binary(
+            tree,
+            {
+                "multiplication_mul": "_*_",
+                "multiplication_div": "_/_",
+                "multiplication_mod": "_%_",
+            },
+            (ZeroDivisionError, ValueError, OverflowError),
+        )
+
+    def unary(self, tree: lark.Tree) -> CELClosure:
+        """
+        unary          : [unary_not | unary_neg] member
+        """
+        if len(tree.children) == 1:
+            return self.visit(cast(lark.Tree, tree.children[0]))
+        elif len(tree.children) != 2:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad unary node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        op_tree, right_tree = cast(Tuple[lark.Tree, lark.Tree], tree.children)
+        op_name = {"unary_not": "!_", "unary_neg": "-_"}[op_tree.data]
+        func = self.activation.resolve_function(op_name)
+        right = self.visit(right_tree)
+
+        def cel_unary(activation: Activation) -> Result:
+            right_value = right(activation)
+            try:
+                return func(right_value)
+            except TypeError as ex:
+                err = (
+                    f"found no matching overload for {op_tree.data!r} "
+                    f"applied to '({type(right_value)})'"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+            except ValueError as ex:
+                value = CELEvalError(
+                    "return error for overflow", ex.__class__, ex.args, tree=tree
+                )
+                value.__cause__ = ex
+                return value
+
+        return cel_unary
+
+    def member(self, tree: lark.Tree) -> CELClosure:
+        """
+        member         : member_dot | member_dot_arg | member_item | member_object | primary
+        """
+        return self.visit(cast(lark.Tree, tree.children[0]))
+
+    def member_dot(self, tree: lark.Tree) -> CELClosure:
+        """
+        member_dot     : member "." IDENT
+
+        A name in a package, a field of a message, or a key of a map; see :py:meth:`Evaluator.member_dot`.
+        """
+        member_tree, property_name_token = cast(
+            Tuple[lark.Tree, lark.Token], tree.children
+        )
+        member = self.visit(member_tree)
+        property_name = property_name_token.value
+
+        def cel_member_dot(activation: Activation) -> Result:
+            member_value = member(activation)
+            if isinstance(member_value, CELEvalError):
+                return member_value
+            elif isinstance(member_value, NameContainer):
+                if property_name in member_value:
+                    return cast(Result, member_value[property_name].value)
+                err = f"No {property_name!r} in bindings {sorted(member_value.keys())}"
+                return CELEvalError(err, KeyError, None, tree=tree)
+            elif isinstance(member_value, celpy.celtypes.MessageType):
+                return cast(Result, member_value.get(property_name))
+            elif isinstance(member_value, celpy.celtypes.MapType):
+                try:
+                    return cast(Result, member_value[property_name])
+                except KeyError:
+                    err = f"no such member in mapping: {property_name!r}"
+                    return CELEvalError(err, KeyError, None, tree=tree)
+            err = f"{member_value!r} with type: '{type(member_value)}' does not support field selection"
+            return CELEvalError(err, TypeError, None, tree=tree)
+
+        return cel_member_dot
+
+    def member_dot_arg(self, tree: lark.Tree) -> CELClosure:
+        """
+        member_dot_arg : member "." IDENT "(" [exprlist] ")"
+
+        A local binding extension, a macro, or a method.
+        """
+        member_tree, method_name_token = cast(
+            Tuple[lark.Tree, lark.Token], tree.children[:2]
+        )
+        if binding := local_binding(tree):
+            return self.local_binding(tree, binding)
+        if method_name_token.value in MACRO_NAMES | {"min"}:
+            return self.macro(tree)
+
+        member = self.visit(member_tree)
+        exprlist = (
+            self.visit(cast(lark.Tree, tree.children[2]))
+            if len(tree.children) == 3
+            else None
+        )
+        function = self.function(method_name_token.value)
+
+        def cel_method(activation: Activation) -> Result:
+            member_value = member(activation)
+            arguments = exprlist(activation) if exprlist else None
+            if function is None:
+                err = (
+                    f"undeclared reference to {method_name_token.value!r} "
+                    f"(in activation '{activation}')"
+                )
+                return CELEvalError(
+                    err, KeyError, (method_name_token.value,), token=method_name_token
+                )
+            elif isinstance(member_value, CELEvalError):
+                return member_value
+            elif isinstance(arguments, CELEvalError):
+                return arguments
+            try:
+                return function(member_value, *cast(List[Result], arguments or []))
+            except ValueError as ex:
+                value = CELEvalError(
+                    "return error for overflow",
+                    ex.__class__,
+                    ex.args,
+                    token=method_name_token,
+                )
+                value.__cause__ = ex
+                return value
+            except (TypeError, AttributeError) as ex:
+                value = CELEvalError(
+                    "no such overload", ex.__class__, ex.args, token=method_name_token
+                )
+                value.__cause__ = ex
+                return value
+
+        return cel_method
+
+    def macro(self, tree: lark.Tree) -> CELClosure:
+        """
+        The ``map()``, ``filter()``, ``all()``, ``exists()``, ``exists_one()``, ``reduce()``, and ``min()`` macros.
+
+        The expression is compiled once.
+        For each item, it's evaluated in a nested :py:class:`Activation` with the item bound to the variable.
+        The variables hide any locals with the same names.
+        The items are charged to the activation's :py:class:`CostBudget`, if there is one.
+        """
+        member_tree, method_name_token = cast(
+            Tuple[lark.Tree, lark.Token], tree.children[:2]
+        )
+        method = method_name_token.value
+        member = self.visit(member_tree)
+
+        if method == "min":
+
+            def cel_min(activation: Activation) -> Result:
+                member_list = member(activation)
+                if isinstance(member_list, CELEvalError):
+                    return member_list
+                try:
+                    # Note. The Result type includes None, which will raise an exception.
+                    return cast(Result, min(member_list))  # type: ignore [type-var, arg-type]
+                except ValueError as ex:
+                    err = "Attempt to reduce an empty sequence or a sequence with a None value"
+                    return CELEvalError(err, ex.__class__, ex.args, tree=tree)
+
+            return cel_min
+
+        if len(tree.children) != 3:
+            raise CELSyntaxError(
+                f"no bind variable in {method} macro",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        arguments = cast(List[lark.Tree], cast(lark.Tree, tree.children[2]).children)
+
+        if method == "reduce":
+            reduce_var_tree, iter_var_tree, init_tree, expr_tree = arguments
+            reduce_ident = local_name(reduce_var_tree)
+            iter_ident = local_name(iter_var_tree)
+            init = self.visit(init_tree)
+            step_expr = self.scoped(
+                expr_tree,
+                {
+                    name: slot
+                    for name, slot in self.scope.items()
+                    if name not in {reduce_ident, iter_ident}
+                },
+            )
+
+            def cel_reduce(activation: Activation) -> Result:
+                member_list = member(activation)
+                if isinstance(member_list, CELEvalError):
+                    return member_list
+
+                def step(reduction: Result, item: Result) -> Result:
+                    value = step_expr(
+                        activation.nested_activation(
+                            vars={reduce_ident: reduction, iter_ident: item}
+                        )
+                    )
+                    if isinstance(value, CELEvalError):
+                        raise value
+                    return value
+
+                return reduce(
+                    step,
+                    macro_items(activation, cast(Iterable[Result], member_list)),
+                    init(activation),
+                )
+
+            return cel_reduce
+
+        var_tree, expr_tree = arguments
+        identifier = local_name(var_tree)
+        item_expr = self.scoped(
+            expr_tree,
+            {name: slot for name, slot in self.scope.items() if name != identifier},
+        )
+
+        def item_values(
+            activation: Activation, member_list: Result
+        ) -> Iterator[Tuple[Result, Result]]:
+            """Each item, and the value of the expression for the item."""
+            for item in macro_items(activation, cast(Iterable[Result], member_list)):
+                yield (
+                    item,
+                    item_expr(activation.nested_activation(vars={identifier: item})),
+                )
+
+        def checked(value: Result) -> Result:
+            """The value of the expression, which must not be an error."""
+            if isinstance(value, CELEvalError):
+                raise value
+            return value
+
+        def cel_macro(activation: Activation) -> Result:
+            member_list = member(activation)
+            if isinstance(member_list, CELEvalError):
+                return member_list
+            values = item_values(activation, member_list)
+            if method == "map":
+                return celpy.celtypes.ListType(
+                    [cast(celpy.celtypes.Value, checked(value)) for _, value in values]
+                )
+            elif method == "filter":
+                return celpy.celtypes.ListType(
+                    [
+                        cast(celpy.celtypes.Value, item)
+                        for item, value in values
+                        if bool(checked(value))
+                    ]
+                )
+            elif method == "exists_one":
+                count = sum(1 for _, value in values if bool(checked(value)))
+                return celpy.celtypes.BoolType(count == 1)
+            # ``all()`` and ``exists()`` can ignore an error value.
+            return reduce(
+                MACRO_LOGIC[method],
+                (value for _, value in values),
+                celpy.celtypes.BoolType(method == "all"),
+            )
+
+        return cel_macro
+
+    def local_binding(self, tree: lark.Tree, binding: str) -> CELClosure:
         """
-        template = Template("${func_name}(${member}, ${expr})")
-        member, expr = cast(tuple[TranspilerTree, TranspilerTree], tree.children)
-        func_name = self.func_name("_[_]")
-        tree.transpiled = template.substitute(
-            func_name=func_name,
-            member=member.transpiled,
-            expr=expr.transpiled,
-        )
+        The local binding extensions: ``cel.bind()``, ``cel.block()``, ``cel.index()``, and ``cel.iterVar()``.
 
-    def member_object(self, tree: TranspilerTree) -> None:
+        Each name bound by ``cel.bind()`` or ``cel.block()`` has a slot, assigned here.
+        A reference to the name uses the :py:class:`LocalSlot` in its slot.
+        A ``cel.iterVar(i, j)`` is a macro variable, in the activation.
+        """
+        if binding in {"index", "iterVar"}:
+            return self.variable(local_name(tree), tree)
+        scope = dict(self.scope)
+        definitions: Dict[int, CELClosure] = {}
+        if binding == "bind":
+            var_tree, init_tree, expr_tree = local_arguments(tree, 3)
+            definitions[self.local_count] = self.visit(init_tree)
+            scope[local_name(var_tree)] = self.local_count
+            self.local_count += 1
+        else:
+            for n, entry in enumerate(block_entries(tree)):
+                definitions[self.local_count] = self.scoped(entry, dict(scope))
+                scope[f"__index_{n}__"] = self.local_count
+                self.local_count += 1
+            expr_tree = local_arguments(tree, 2)[1]
+        expr = self.scoped(expr_tree, scope)
+        frame = self.frame
+
+        def cel_block(activation: Activation) -> Result:
+            return block(frame.locals, definitions, expr, activation)
+
+        return cel_block
+
+    def member_index(self, tree: lark.Tree) -> CELClosure:
+        """
+        member_item    : member "[" expr "]"
+        """
+        func = self.activation.resolve_function("_[_]")
+        member, index = [self.visit(cast(lark.Tree, child)) for child in tree.children]
+
+        def cel_member_index(activation: Activation) -> Result:
+            member_value = member(activation)
+            index_value = index(activation)
+            try:
+                return func(member_value, index_value)
+            except (TypeError, KeyError, IndexError) as ex:
+                err = {
+                    TypeError: (
+                        f"found no matching overload for _[_] "
+                        f"applied to '({type(member_value)}, {type(index_value)})'"
+                    ),
+                    KeyError: "no such key",
+                    IndexError: "invalid_argument",
+                }[ex.__class__]
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+
+        return cel_member_index
+
+    def member_object(self, tree: lark.Tree) -> CELClosure:
         """
         member_object  : member "{" [fieldinits] "}"
+
+        A protobuf message; see :py:meth:`Evaluator.member_object`.
         """
-        template = Template("${type_name}([${fieldinits}])")
-        member = cast(TranspilerTree, tree.children[0])
-        fieldinits: str
-        if len(tree.children) == 2:
-            fieldinits = cast(TranspilerTree, tree.children[1]).transpiled
-        else:
-            fieldinits = ""
-        type_name = member.transpiled
-        tree.transpiled = template.substitute(
-            type_name=type_name, fieldinits=fieldinits
+        if len(tree.children) not in {1, 2}:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad member_object node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        member = self.visit(cast(lark.Tree, tree.children[0]))
+        if len(tree.children) == 1 and (
+            cast(lark.Tree, tree.children[0]).data == "primary"
+        ):
+            return member
+        fieldinits = (
+            self.visit(cast(lark.Tree, tree.children[1]))
+            if len(tree.children) == 2
+            else None
         )
 
-    def primary(self, tree: TranspilerTree) -> None:
+        def cel_member_object(activation: Activation) -> Result:
+            member_value = member(activation)
+            fields = fieldinits(activation) if fieldinits else None
+            if fieldinits and isinstance(member_value, CELEvalError):
+                return member_value
+            protobuf_class = cast(celpy.celtypes.FunctionType, member_value)
+            try:
+                return cast(Result, protobuf_class(cast(celpy.celtypes.Value, fields)))
+            except (TypeError, ValueError) as ex:  # pragma: no cover
+                return CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+
+        return cel_member_object
+
+    def primary(self, tree: lark.Tree) -> CELClosure:
         """
         primary        : dot_ident_arg | dot_ident | ident_arg | ident
                        | paren_expr | list_lit | map_lit | literal
         """
-        tree.transpiled = cast(TranspilerTree, tree.children[0]).transpiled
+        if len(tree.children) != 1 or cast(lark.Tree, tree.children[0]).data not in {
+            "literal",
+            "paren_expr",
+            "list_lit",
+            "map_lit",
+            "dot_ident",
+            "dot_ident_arg",
+            "ident_arg",
+            "ident",
+        }:
+            raise CELSyntaxError(
+                f"{tree.data} {tree.children}: bad primary node",
+                line=tree.meta.line,
+                column=tree.meta.column,
+            )
+        return self.visit(cast(lark.Tree, tree.children[0]))
 
-    def dot_ident_arg(self, tree: TranspilerTree) -> None:
+    def paren_expr(self, tree: lark.Tree) -> CELClosure:
         """
-        dot_ident_arg  : "." IDENT "(" [exprlist] ")"
+        paren_expr     : "(" expr ")"
         """
-        template = Template("activation.resolve_variable('${ident}')(${exprlist})")
-        ident = cast(lark.Token, tree.children[0]).value
-        if len(tree.children) == 2:
-            exprlist = cast(TranspilerTree, tree.children[1]).transpiled
-        else:
-            exprlist = ""
-        tree.transpiled = template.substitute(ident=ident, exprlist=exprlist)
+        return self.visit(cast(lark.Tree, tree.children[0]))
 
-    def dot_ident(self, tree: TranspilerTree) -> None:
+    def list_lit(self, tree: lark.Tree) -> CELClosure:
         """
-        dot_ident      : "." IDENT
+        list_lit       : "[" [exprlist] "]"
         """
-        template = Template("activation.resolve_variable('${ident}')")
-        ident = cast(lark.Token, tree.children[0]).value
-        tree.transpiled = template.substitute(ident=ident)
+        if not tree.children:
 
-    def ident_arg(self, tree: TranspilerTree) -> None:
-        """
-        ident_arg      : IDENT "(" [exprlist] ")"
-        """
-        op = cast(lark.Token, tree.children[0]).value
-        if len(tree.children) == 2:
-            exprlist = cast(TranspilerTree, tree.children[1]).transpiled
-        else:
-            exprlist = ""
-        if op in {"has", "dyn"}:
-            # Macro-like has() or dyn()
-            if op == "dyn":
-                tree.transpiled = cast(TranspilerTree, tree.children[1]).transpiled
-            elif op == "has":
-                # try to evaluate the exprlist expression
-                # TODO: as macro_has() would be better...
-                template = Template(
-                    dedent("""\
-                    # ident_arg has:
-                    ex_${n}_h = lambda activation: ${exprlist}
-                    ex_${n} = lambda activation: not isinstance(celpy.evaluation.result(activation, ex_${n}_h), CELEvalError)
-                    """)
-                )
-                tree.checked_exception = (
-                    template,
-                    dict(
-                        n=lambda tree: str(tree.expr_number),
-                        exprlist=lambda tree: (
-                            cast(TranspilerTree, tree.children[1]).transpiled
-                        ),
-                    ),
-                )
-                tree.transpiled = f"ex_{tree.expr_number}(activation)"
-        else:
-            # Other function
-            template = Template("${func_name}(${exprlist})")
-            func_name = self.func_name(op)
-            if len(tree.children) == 2:
-                exprlist = cast(TranspilerTree, tree.children[1]).transpiled
-            else:
-                exprlist = ""
-            tree.transpiled = template.substitute(
-                func_name=func_name, exprlist=exprlist
-            )
+            def cel_empty_list(activation: Activation) -> Result:
+                return celpy.celtypes.ListType()
 
-    def ident(self, tree: TranspilerTree) -> None:
+            return cel_empty_list
+        return self.visit(cast(lark.Tree, tree.children[0]))
+
+    def map_lit(self, tree: lark.Tree) -> CELClosure:
         """
-        ident          : IDENT
+        map_lit        : "{" [mapinits] "}"
+
+        Duplicate keys and invalid key types are errors.
         """
-        template = Template("activation.${ident}")
-        tree.transpiled = template.substitute(
-            ident=cast(lark.Token, tree.children[0]).value
-        )
+        if not tree.children:
 
-    def paren_expr(self, tree: TranspilerTree) -> None:
+            def cel_empty_map(activation: Activation) -> Result:
+                return celpy.celtypes.MapType()
+
+            return cel_empty_map
+        mapinits = self.visit(cast(lark.Tree, tree.children[0]))
+
+        def cel_map_lit(activation: Activation) -> Result:
+            try:
+                return mapinits(activation)
+            except (ValueError, TypeError) as ex:
+                return CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+
+        return cel_map_lit
+
+    def dot_ident(self, tree: lark.Tree) -> CELClosure:
         """
-        paren_expr     : "(" expr ")"
+        dot_ident      : "." IDENT
         """
-        tree.transpiled = cast(Sequence[TranspilerTree], tree.children)[0].transpiled
+        name = cast(lark.Token, tree.children[0]).value
 
-    def list_lit(self, tree: TranspilerTree) -> None:
+        def cel_dot_ident(activation: Activation) -> Result:
+            try:
+                return cast(Result, activation.resolve_variable(name))
+            except KeyError as ex:
+                return CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+
+        return cel_dot_ident
+
+    def dot_ident_arg(self, tree: lark.Tree) -> CELClosure:
         """
-        list_lit       : "[" [exprlist] "]"
+        dot_ident_arg  : "." IDENT "(" [exprlist] ")"
+
+        Like the :py:class:`Evaluator`, this is the same as :py:meth:`dot_ident`.
         """
-        if tree.children:
-            exprlist = cast(Sequence[TranspilerTree], tree.children)[0].transpiled
-        else:
-            exprlist = ""
-        template = Template("celpy.celtypes.ListType([${exprlist}])")
-        tree.transpiled = template.substitute(exprlist=exprlist)
+        return self.dot_ident(tree)
 
-    def map_lit(self, tree: TranspilerTree) -> None:
+    def ident_arg(self, tree: lark.Tree) -> CELClosure:
         """
-        map_lit        : "{" [mapinits] "}"
+        ident_arg      : IDENT "(" [exprlist] ")"
+
+        A function, or one of the function-like macros: ``has()`` and ``dyn()``.
         """
-        if tree.children:
-            mapinits = cast(Sequence[TranspilerTree], tree.children)[0].transpiled
-        else:
-            mapinits = ""
-        template = Template("celpy.celtypes.MapType([${mapinits}])")
-        tree.transpiled = template.substitute(mapinits=mapinits)
+        name_token = cast(lark.Token, tree.children[0])
+        arguments = (
+            [
+                self.visit(cast(lark.Tree, child))
+                for child in cast(lark.Tree, tree.children[1]).children
+            ]
+            if len(tree.children) == 2
+            else []
+        )
 
-    def exprlist(self, tree: TranspilerTree) -> None:
+        if name_token.value == "has":
+
+            def cel_has(activation: Activation) -> Result:
+                values = [argument(activation) for argument in arguments]
+                return celpy.celtypes.BoolType(not isinstance(values[0], CELEvalError))
+
+            return cel_has
+        elif name_token.value == "dyn":
+            return arguments[0]
+
+        function = self.function(name_token.value)
+
+        def cel_function(activation: Activation) -> Result:
+            values = [argument(activation) for argument in arguments]
+            if function is None:
+                err = (
+                    f"undeclared reference to '{name_token}' "
+                    f"(in activation '{activation}')"
+                )
+                return CELEvalError(
+                    err, KeyError, (name_token.value,), token=name_token
+                )
+            for value in values:
+                if isinstance(value, CELEvalError):
+                    return value
+            try:
+                return function(*values)
+            except ValueError as ex:
+                error = CELEvalError(
+                    "return error for overflow", ex.__class__, ex.args, token=name_token
+                )
+                error.__cause__ = ex
+                return error
+            except (TypeError, AttributeError) as ex:
+                error = CELEvalError(
+                    "no such overload", ex.__class__, ex.args, token=name_token
+                )
+                error.__cause__ = ex
+                return error
+
+        return cel_function
+
+    def ident(self, tree: lark.Tree) -> CELClosure:
         """
-        exprlist       : expr ("," expr)*
+        ident          : IDENT
         """
-        exprs = ", ".join(
-            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)
-        )
-        tree.transpiled = exprs
+        return self.variable(cast(lark.Token, tree.children[0]).value, tree)
 
-    def fieldinits(self, tree: TranspilerTree) -> None:
+    def variable(self, name: str, tree: lark.Tree) -> CELClosure:
+        """A local bound by ``cel.bind()`` or ``cel.block()``, or a variable."""
+        if name in self.scope:
+            slot = self.scope[name]
+            frame = self.frame
+
+            def cel_local(activation: Activation) -> Result:
+                return cast(Result, frame.locals[slot].get())
+
+            return cel_local
+
+        def cel_variable(activation: Activation) -> Result:
+            try:
+                return cast(Result, activation.resolve_variable(name))
+            except KeyError as ex:
+                err = f"undeclared reference to '{name}' (in activation '{activation}')"
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+                return value
+
+        return cel_variable
+
+    def constant(self, value: Result) -> CELClosure:
+        """A value created once, and shared by all evaluations."""
+
+        def cel_constant(activation: Activation) -> Result:
+            return value
+
+        return cel_constant
+
+    def literal(self, tree: lark.Tree) -> CELClosure:
         """
-        fieldinits     : IDENT ":" expr ("," IDENT ":" expr)*
+        Create a literal from the token at the top of the parse tree.
+        See :py:func:`literal_value`.
         """
-        idents = [
-            cast(lark.Token, c).value
-            for c in cast(Sequence[TranspilerTree], tree.children)[::2]
-        ]
-        exprs = [
-            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[1::2]
-        ]
-        assert len(idents) == len(exprs), "Invalid AST"
-        items = ", ".join(f"('{n}', {v})" for n, v in zip(idents, exprs))
-        tree.transpiled = items
+        return self.constant(literal_value(tree))
 
-    def mapinits(self, tree: TranspilerTree) -> None:
+    def folded(self, tree: lark.Tree) -> CELClosure:
         """
-        mapinits       : expr ":" expr ("," expr ":" expr)*
+        folded         : a constant value computed by :py:mod:`celpy.optimizer`
+
+        The value may be a :py:class:`CELEvalError`.
         """
-        keys = [
-            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[::2]
-        ]
-        values = [
-            c.transpiled for c in cast(Sequence[TranspilerTree], tree.children)[1::2]
-        ]
-        assert len(keys) == len(values)
-        items = ", ".join(f"({k}, {v})" for k, v in zip(keys, values))
-        tree.transpiled = items
+        return self.constant(cast(Result, tree.children[0]))
 
-    def literal(self, tree: TranspilerTree) -> None:
+    def memo(self, tree: lark.Tree) -> CELClosure:
         """
-        literal        : UINT_LIT | FLOAT_LIT | INT_LIT | MLSTRING_LIT | STRING_LIT | BYTES_LIT
-               | BOOL_LIT | NULL_LIT
+        memo           : SLOT subtree, a subtree used more than once, see :py:mod:`celpy.optimizer`
+
+        The subtree is evaluated the first time it's needed in an evaluation.
         """
-        value_token = cast(lark.Token, tree.children[0])
-        if value_token.type == "FLOAT_LIT":
-            lit_text = f"celpy.celtypes.DoubleType({value_token.value})"
-        elif value_token.type == "INT_LIT":
-            lit_text = f"celpy.celtypes.IntType({value_token.value})"
-        elif value_token.type == "UINT_LIT":
-            if not value_token.value[-1].lower() == "u":
-                raise CELSyntaxError(
-                    f"invalid unsigned int literal {value_token!r}",
-                    line=tree.meta.line,
-                    column=tree.meta.column,
-                )  # pragma: no cover
-            lit_text = f"celpy.celtypes.UintType({value_token.value[:-1]})"
-        elif value_token.type in ("MLSTRING_LIT", "STRING_LIT"):
-            lit_text = f"celpy.celtypes.{celstr(value_token)!r}"
-        elif value_token.type == "BYTES_LIT":
-            lit_text = f"celpy.celtypes.{celbytes(value_token)!r}"
-        elif value_token.type == "BOOL_LIT":
-            lit_text = f"celpy.celtypes.BoolType({value_token.value.lower() == 'true'})"
-        elif value_token.type == "NULL_LIT":
-            lit_text = "None"  # Not celpy.celtypes.NullType() in transpiled code.
-        else:
-            raise CELUnsupportedError(
-                f"{tree.data} {tree.children}: type not implemented",
-                line=value_token.line or tree.meta.line,
-                column=value_token.column or tree.meta.column,
-            )  # pragma: no cover
-        tree.transpiled = lit_text
+        slot = int(cast(lark.Token, tree.children[0]).value)
+        expr = self.visit(cast(lark.Tree, tree.children[1]))
+        frame = self.frame
 
+        def cel_memo(activation: Activation) -> Result:
+            return memoize(frame.slots, slot, expr, activation)
 
-class Phase2Transpiler(lark.visitors.Visitor_Recursive):
-    """
-    Extract any checked_exception evaluation statements that decorate the parse tree.
-    Also, get the overall top-level expression, assigned to special variable, CEL.
+        return cel_memo
 
-    >>> from unittest.mock import Mock
-    >>> from pprint import pprint
-    >>> source = '["hello", "world"].map(x, x) == ["hello", "world"]'
-    >>> celpy.CELParser.CEL_PARSER = None
-    >>> parser = celpy.CELParser(tree_class=celpy.evaluation.TranspilerTree)
-    >>> tree = parser.parse(source)
-    >>> tp1 = Phase1Transpiler(Mock(base_activation=celpy.Activation()))
-    >>> _ = tp1.visit(tree)
-    >>> tp2 = Phase2Transpiler(Mock(base_activation=celpy.Activation()))
-    >>> _ = tp2.visit(tree)
-    >>> pprint(tp2.statements(tree), width=256)
-    ['# member_dot_arg map:',
-     "ex_10_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')])",
-     'ex_10_x = lambda activation: activation.x',
-     "ex_10 = lambda activation: celpy.evaluation.macro_map(activation, 'x', ex_10_x, ex_10_l)",
-     "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')])))\\n"]
+    def exprlist(self, tree: lark.Tree) -> CELClosure:
+        """
+        exprlist       : expr ("," expr)*
 
-    """
+        A list of the values, or the first error.
+        """
+        exprs = [self.visit(cast(lark.Tree, child)) for child in tree.children]
 
-    def __init__(self, facade: Transpiler) -> None:
-        self.facade = facade
-        self._statements: list[str] = []
+        def cel_exprlist(activation: Activation) -> Result:
+            values = [expr(activation) for expr in exprs]
+            for value in values:
+                if isinstance(value, CELEvalError):
+                    return value
+            return celpy.celtypes.ListType(cast(List[celpy.celtypes.Value], values))
 
-    def expr(self, tree: TranspilerTree) -> None:
+        return cel_exprlist
+
+    def fieldinits(self, tree: lark.Tree) -> CELClosure:
         """
-        expr           : conditionalor ["?" conditionalor ":" expr]
+        fieldinits     : IDENT ":" expr ("," IDENT ":" expr)*
 
-        All checked_exception structures are a tuple[Template, dict[str, Callable[[Tree], str]]
+        A mapping used by :py:meth:`member_object` to create a protobuf message.
+        Duplicate names are an error.
         """
-        if tree.checked_exception:
-            template, bindings = tree.checked_exception
-            self._statements.extend(
-                template.substitute(
-                    {k: v(tree) for k, v in bindings.items()}
-                ).splitlines()
-            )
+        fields = [
+            (cast(lark.Token, ident).value, self.visit(cast(lark.Tree, expr)))
+            for ident, expr in zip(tree.children[0::2], tree.children[1::2])
+        ]
 
-    conditionalor = expr
-    conditionaland = expr
-    member_dot_arg = expr
-    ident_arg = expr
+        def cel_fieldinits(activation: Activation) -> Result:
+            values: Dict[str, Any] = {}
+            for ident, expr in fields:
+                value = expr(activation)
+                if ident in values:
+                    raise ValueError(f"Duplicate field label {ident!r}")
+                values[ident] = value
+            return celpy.celtypes.MessageType(**values)
 
-    def statements(self, tree: TranspilerTree) -> list[str]:
+        return cel_fieldinits
+
+    def mapinits(self, tree: lark.Tree) -> CELClosure:
         """
-        Appends the final CEL = ... statement to the sequence of statements,
-        and returns the transpiled code.
+        mapinits       : expr ":" expr ("," expr ":" expr)*
 
-        Two patterns:
+        This raises an exception on a duplicate key.
+        """
+        pairs = [
+            (self.visit(cast(lark.Tree, key)), self.visit(cast(lark.Tree, value)))
+            for key, value in zip(tree.children[0::2], tree.children[1::2])
+        ]
 
-        1.  Top-most expr was a deferred template, and already is a lambda.
-            It will be a string of the form ``"ex_\\d+(activation)"``.
+        def cel_mapinits(activation: Activation) -> Result:
+            result_value = celpy.celtypes.MapType()
+            keys_values = [(key(activation), value(activation)) for key, value in pairs]
+            for key_value, value_value in keys_values:
+                if key_value in result_value:
+                    raise ValueError(f"Duplicate key {key_value!r}")
+                result_value[cast(celpy.celtypes.Value, key_value)] = cast(
+                    celpy.celtypes.Value, value_value
+                )
+            return result_value
 
-        2.  Top-most expr was **not** a deferred template, and needs a lambda wrapper.
-            It will **not** be a simple ``"ex_\\d+"`` reference.
-        """
-        expr_pattern = re.compile(r"^(ex_\d+)\(\w+\)$")
-        if match := expr_pattern.match(tree.transpiled):
-            template = Template(
-                dedent("""\
-                CEL = celpy.evaluation.result(base_activation, ${lambda_name})
-            """)
-            )
-            final = template.substitute(n=tree.expr_number, lambda_name=match.group(1))
-        else:
-            template = Template(
-                dedent("""\
-                CEL = celpy.evaluation.result(base_activation, lambda activation: ${expr})
-            """)
-            )
-            final = template.substitute(n=tree.expr_number, expr=tree.transpiled)
-        return self._statements + [final]
+        return cel_mapinits
 
 
 CEL_ESCAPES_PAT = re.compile(
@@ -3874,3 +5883,54 @@ def celbytes(token: lark.Token) -> celpy.celtypes.BytesType:
     else:
         raise ValueError(f"Invalid bytes literal {token.value!r}")
     return expanded
+
+
+def literal_value(tree: lark.Tree) -> Result:
+    """
+    Create a literal from the token at the top of the parse tree.
+    A value that can't be represented, like an out-of-range integer, is a :py:class:`CELEvalError`.
+
+    >>> literal_value(lark.Tree("literal", [lark.Token("INT_LIT", "42")]))
+    IntType(42)
+
+    ..  todo:: Use type provider conversions from string to CEL type objects.
+    """
+    if len(tree.children) != 1:
+        raise CELSyntaxError(
+            f"{tree.data} {tree.children}: bad literal node",
+            line=tree.meta.line,
+            column=tree.meta.column,
+        )
+    value_token = cast(lark.Token, tree.children[0])
+    try:
+        result_value: Result
+        if value_token.type == "FLOAT_LIT":
+            result_value = celpy.celtypes.DoubleType(value_token.value)
+        elif value_token.type == "INT_LIT":
+            result_value = celpy.celtypes.IntType(value_token.value)
+        elif value_token.type == "UINT_LIT":
+            if not value_token.value[-1].lower() == "u":
+                raise CELSyntaxError(
+                    f"invalid unsigned int literal {value_token!r}",
+                    line=tree.meta.line,
+                    column=tree.meta.column,
+                )
+            result_value = celpy.celtypes.UintType(value_token.value[:-1])
+        elif value_token.type in ("MLSTRING_LIT", "STRING_LIT"):
+            result_value = celstr(value_token)
+        elif value_token.type == "BYTES_LIT":
+            result_value = celbytes(value_token)
+        elif value_token.type == "BOOL_LIT":
+            result_value = celpy.celtypes.BoolType(value_token.value.lower() == "true")
+        elif value_token.type == "NULL_LIT":
+            result_value = None
+        else:
+            raise CELUnsupportedError(
+                f"{tree.data} {tree.children}: type not implemented",
+                line=value_token.line or tree.meta.line,
+                column=value_token.column or tree.meta.column,
+            )
+    except ValueError as ex:
+        result_value = CELEvalError(ex.args[0], ex.__class__, ex.args, tree=tree)
+
+    return result_value
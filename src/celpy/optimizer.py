@@ -0,0 +1,1192 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Optimizations of a CEL AST, applied by :py:meth:`celpy.Environment.program`.
+
+The AST from :py:meth:`celpy.Environment.compile` is a faithful copy of the source text.
+Expressions like those created by the C7N rewriter have parts that never change,
+for example ``now - duration("86400s")`` or ``x in ["a", "b", "c"]``.
+The ``duration("86400s")`` and the list are built again for every evaluation.
+
+..  rubric:: Constant Folding
+
+The :py:class:`ConstantFolder` finds the largest subtrees that depend only on literals
+and built-in operators and functions.
+Each of these is evaluated once, and replaced with a ``folded`` node that holds the value.
+Both runners use the value in the ``folded`` node instead of evaluating the subtree.
+
+A subtree is constant when it has no identifiers, no macros,
+and every operator and function it uses is the built-in implementation from
+:py:data:`celpy.evaluation.base_functions`.
+A function provided to :py:meth:`celpy.Environment.program` replaces a built-in function,
+and is never folded, since it may depend on data outside the expression.
+
+A constant that evaluates to an error, like ``1 / 0``, is folded into the
+:py:class:`celpy.evaluation.CELEvalError` value.
+The error is part of the result only where the unfolded expression would have used it;
+``true || 1 / 0 == 0`` is still ``true``.
+
+A list or map can be changed by the code that gets it, so it's only folded as the operand of ``in``,
+which only reads it. Elsewhere, like ``[1, 2] + [3]``, each evaluation builds a new list.
+The value is computed by the :py:class:`celpy.evaluation.Evaluator`,
+so the message of a folded error is the message the :py:class:`celpy.InterpretedRunner` provides.
+
+>>> import celpy
+>>> env = celpy.Environment()
+>>> ast = env.compile('x > duration("86400s") + duration("1h")')
+>>> optimized = fold_constants(ast, celpy.Activation())
+>>> [node.children[0] for node in optimized.find_data("folded")]
+[DurationType('90000s')]
+>>> celpy.celparser.tree_dump(optimized)
+'x >  duration("86400s") +  duration("1h")'
+
+..  rubric:: Partial Evaluation
+
+Some variables are known long before the others.
+A policy's parameters and ``now`` are known before the loop over the resources, for example.
+The :py:class:`PartialEvaluator` is a :py:class:`ConstantFolder` that treats the known variables as constants.
+The :py:func:`fold_known` function creates the residual AST,
+where the subtrees that depend only on known variables are folded,
+and the ``&&``, ``||``, and ``?:`` operators with a known operand are simplified.
+The :py:meth:`celpy.Runner.partial_evaluate` method creates a runner for the residual AST.
+
+>>> ast = env.compile('x > limit * 2 && (strict || y)')
+>>> known = {"limit": celpy.celtypes.IntType(5), "strict": celpy.celtypes.BoolType(False)}
+>>> residual = fold_known(ast, known, celpy.Activation())
+>>> [node.children[0] for node in residual.find_data("folded")]
+[IntType(10)]
+>>> celpy.celparser.tree_dump(residual)
+'x >  limit *  2 && (y)'
+
+..  rubric:: Common Subexpressions
+
+The :py:class:`CommonSubexpressions` finds the pure subtrees used more than once in an expression,
+like the ``x.y`` in ``has(x.y) && x.y > 0 && x.y < 10``.
+Each occurrence is replaced by one shared ``memo`` node with a slot number.
+The runners evaluate the subtree once per evaluation, saving the value in the slot.
+
+>>> ast = env.compile('has(x.y) && x.y > 0 && x.y < 10')
+>>> optimized = eliminate_common_subexpressions(ast, celpy.Activation())
+>>> [celpy.celparser.tree_dump(node) for node in optimized.find_data("memo")]
+['x.y']
+
+..  rubric:: Membership
+
+The ``_in_`` operator scans a list, comparing each item.
+For an expression like ``resource.ImageId in ["ami-1", "ami-2", ...]``, with a constant list,
+:py:func:`index_membership` evaluates the list once,
+and adds a :py:class:`celpy.evaluation.MembershipIndex` to the ``relation_in`` node.
+Both runners use the index, a hash lookup, instead of :py:func:`celpy.evaluation.operator_in`.
+The result is the same, including the errors for items that can't be compared.
+
+>>> ast = env.compile('x in ["a", "b", "c"]')
+>>> indexed = index_membership(ast, celpy.Activation())
+>>> [node.children[1] for node in indexed.find_data("relation_in")]
+[MembershipIndex(3 items)]
+
+..  rubric:: Patterns
+
+The ``matches()`` function compiles its pattern.
+When the pattern is a string literal, :py:func:`compile_patterns` compiles it once,
+and the compiled pattern replaces the literal.
+An invalid pattern is reported when the program is created, instead of by each evaluation.
+Other patterns are compiled by :py:func:`celpy.evaluation.compile_pattern`, which keeps the most recently used.
+
+>>> ast = env.compile('x.matches("^a+$")')
+>>> compiled = compile_patterns(ast, celpy.Activation())
+>>> celpy.celparser.tree_dump(compiled)
+'x.matches("^a+$")'
+
+..  rubric:: Operand Order
+
+CEL's ``&&`` and ``||`` are commutative, even with errors as operands.
+The runners evaluate the operands left to right, stopping when an operand decides the result.
+An expression like ``get_metrics(...) > 10 && resource.State == "running"`` pays for the expensive
+function even when the cheap comparison would decide the result.
+
+An :py:class:`OperandProfile` describes each chain of ``&&`` or ``||`` operators,
+like ``a && b && c``, and measures the cost of each operand,
+and how often it decides the result.
+The :py:class:`OperandProfiler` evaluates an expression, measuring every operand of every chain.
+Then :py:func:`reorder_operands` rebuilds each chain with the cheapest, most decisive operands first.
+
+>>> ast = env.compile('x > 0 && x > 5')
+>>> profile = OperandProfile(ast)
+>>> for x in [1, 2, 3]:
+...     _ = OperandProfiler(ast, celpy.Activation(), profile).evaluate({"x": celpy.celtypes.IntType(x)})
+>>> celpy.celparser.tree_dump(reorder_operands(ast, profile))
+'x >  5 && x >  0'
+
+In all cases, the AST provided is not changed.
+"""
+
+from contextlib import contextmanager, nullcontext
+import logging
+import math
+import sys
+import time
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Set, Tuple, cast
+
+import lark
+
+from celpy.celparser import tree_dump
+import celpy.celtypes
+from celpy.evaluation import (
+    Activation,
+    CELEvalError,
+    Context,
+    Evaluator,
+    MembershipIndex,
+    Result,
+    base_functions,
+    compile_pattern,
+    is_decisive,
+    literal_value,
+    local_binding,
+    passed_through,
+)
+
+logger = logging.getLogger("celpy.optimizer")
+
+# The CEL function used by each operator node of the AST.
+OPERATORS: Dict[str, str] = {
+    "expr": "_?_:_",
+    "conditionalor": "_||_",
+    "conditionaland": "_&&_",
+    "relation_lt": "_<_",
+    "relation_le": "_<=_",
+    "relation_gt": "_>_",
+    "relation_ge": "_>=_",
+    "relation_eq": "_==_",
+    "relation_ne": "_!=_",
+    "relation_in": "_in_",
+    "addition_add": "_+_",
+    "addition_sub": "_-_",
+    "multiplication_mul": "_*_",
+    "multiplication_div": "_/_",
+    "multiplication_mod": "_%_",
+    "unary_not": "!_",
+    "unary_neg": "-_",
+    "member_index": "_[_]",
+}
+
+# Nodes that compute nothing on their own; they're constant if their children are.
+STRUCTURE = frozenset(
+    {
+        "relation",
+        "addition",
+        "multiplication",
+        "unary",
+        "member",
+        "member_dot",
+        "primary",
+        "paren_expr",
+        "list_lit",
+        "map_lit",
+        "exprlist",
+        "mapinits",
+        "literal",
+    }
+)
+
+# Nodes that produce a value, and can be replaced with a ``folded`` node.
+VALUES = frozenset(
+    {
+        "expr",
+        "conditionalor",
+        "conditionaland",
+        "relation",
+        "addition",
+        "multiplication",
+        "unary",
+        "member",
+        "member_dot",
+        "member_dot_arg",
+        "member_index",
+        "primary",
+        "paren_expr",
+        "list_lit",
+        "map_lit",
+        "ident_arg",
+    }
+)
+
+# The values a folded node can't share, since the code that gets one can change it.
+# A ``+`` of two lists is a plain ``list``.
+CONTAINERS = (list, dict)
+
+# The logic operators only compute something when there's more than one child.
+LOGIC = frozenset({"expr", "conditionalor", "conditionaland"})
+
+# Nodes, other than operators, that compute a value worth folding.
+COMPUTED = frozenset(
+    {"ident_arg", "member_dot_arg", "member_dot", "list_lit", "map_lit"}
+)
+
+# Nodes that, with a single child, only pass along the child's value.
+PASS_THROUGH = frozenset(
+    {
+        "expr",
+        "conditionalor",
+        "conditionaland",
+        "relation",
+        "addition",
+        "multiplication",
+        "unary",
+        "member",
+        "paren_expr",
+    }
+)
+
+# The chains of commutative operators that can be reordered.
+CHAINS: Dict[str, str] = {
+    "conditionalor": "_||_",
+    "conditionaland": "_&&_",
+}
+
+# Function-like names that are macros, not functions.
+MACROS = frozenset(
+    {"has", "dyn", "map", "filter", "all", "exists", "exists_one", "reduce", "min"}
+)
+
+
+class Optimizer:
+    """
+    The features common to the optimizations:
+    deciding which nodes are pure, and rebuilding a node with new children.
+
+    The new nodes are the same class as the nodes they replace,
+    so this works for shaped, compact, and shared ASTs.
+
+    :param activation: The :py:class:`celpy.evaluation.Activation` the runner will use.
+        This provides the functions, which determine what is pure.
+    """
+
+    def __init__(self, activation: Activation) -> None:
+        self.activation = activation
+        self.builtins: Dict[str, bool] = {}
+        self.purity: Dict[int, bool] = {}
+        self.computation: Dict[int, bool] = {}
+        self.rewritten: Dict[int, lark.Tree] = {}
+
+    def builtin(self, name: str) -> bool:
+        """True if the activation uses the built-in function for this name."""
+        if name not in self.builtins:
+            try:
+                function = self.activation.resolve_function(name)
+                self.builtins[name] = function is base_functions.get(name)
+            except KeyError:
+                self.builtins[name] = False
+        return self.builtins[name]
+
+    def pure(self, tree: lark.Tree) -> bool:
+        """True if this node -- ignoring its children -- always computes the same value."""
+        if tree.data in STRUCTURE:
+            return True
+        elif tree.data in OPERATORS:
+            return self.builtin(OPERATORS[tree.data])
+        elif tree.data == "ident_arg":
+            name = cast(lark.Token, tree.children[0]).value
+            return name not in MACROS and self.builtin(name)
+        elif tree.data == "member_dot_arg":
+            name = cast(lark.Token, tree.children[1]).value
+            return name not in MACROS and self.builtin(name)
+        return False
+
+    def is_pure(self, tree: lark.Tree) -> bool:
+        """True if this node and all of its children are pure."""
+        if id(tree) not in self.purity:
+            self.purity[id(tree)] = self.pure(tree) and all(
+                self.is_pure(child)
+                for child in tree.children
+                if isinstance(child, lark.Tree)
+            )
+        return self.purity[id(tree)]
+
+    def computing(self, tree: lark.Tree) -> bool:
+        """True if this node -- ignoring its children -- computes something worth saving."""
+        raise NotImplementedError  # pragma: no cover
+
+    def computes(self, tree: lark.Tree) -> bool:
+        """True if this node or any of its children computes something worth saving."""
+        if id(tree) not in self.computation:
+            self.computation[id(tree)] = self.computing(tree) or any(
+                self.computes(child)
+                for child in tree.children
+                if isinstance(child, lark.Tree)
+            )
+        return self.computation[id(tree)]
+
+    @staticmethod
+    def rebuild(tree: lark.Tree, children: List[Any]) -> lark.Tree:
+        """A copy of the node with new children, or the node itself if no child changed."""
+        if all(new is old for new, old in zip(children, tree.children)):
+            return tree
+        return type(tree)(tree.data, children, tree.meta)
+
+
+class ConstantFolder(Optimizer):
+    """
+    Replaces the constant subtrees of an AST with ``folded`` nodes.
+
+    A ``folded`` node has two children: the value, and a ``FOLDED`` token
+    with the source text of the subtree, used by :py:func:`celpy.celparser.tree_dump`.
+    """
+
+    def __init__(self, activation: Activation) -> None:
+        super().__init__(activation)
+        self.folds = 0
+
+    def computing(self, tree: lark.Tree) -> bool:
+        """Any operator or function; a subtree with only literals isn't worth folding."""
+        return (
+            tree.data in COMPUTED
+            or (tree.data in OPERATORS and tree.data not in LOGIC)
+            or (tree.data in LOGIC and len(tree.children) > 1)
+        )
+
+    def fold(self, tree: lark.Tree, operand: bool = False) -> lark.Tree:
+        """
+        Evaluate a constant subtree, returning the ``folded`` node.
+
+        If evaluation raises an exception, rather than returning a value,
+        the subtree isn't folded, and the exception is left for the runner.
+
+        A list or map can be changed by the code that gets it, so it's only folded
+        when it's the operand of ``in``, see :py:meth:`operand`.
+        Otherwise, the subtree is searched for smaller constants, and each evaluation builds a new list or map.
+        """
+        try:
+            value = Evaluator(ast=tree, activation=self.activation).visit(tree)
+        except Exception as ex:
+            logger.debug("Not folding %s: %r", tree_dump(tree), ex)
+            return tree
+        if isinstance(value, CONTAINERS) and not operand:
+            logger.debug("Not folding %s: %s", tree_dump(tree), type(value).__name__)
+            return self.rewrite_children(tree)
+        self.folds += 1
+        source = lark.Token("FOLDED", tree_dump(tree))
+        return type(tree)("folded", [value, source], tree.meta)
+
+    def rewrite(self, tree: lark.Tree) -> lark.Tree:
+        """
+        Replace the largest constant subtrees with ``folded`` nodes.
+        A constant node that isn't a value, like an ``exprlist``, is searched for values.
+        A node is only copied if one of its children changed.
+        """
+        if id(tree) in self.rewritten:
+            return self.rewritten[id(tree)]
+        new_tree: lark.Tree
+        if self.is_pure(tree) and not self.computes(tree):
+            new_tree = tree
+        elif self.is_pure(tree) and tree.data in VALUES:
+            new_tree = self.fold(tree)
+        elif (
+            tree.data == "ident_arg"
+            and cast(lark.Token, tree.children[0]).value == "has"
+        ):
+            # The has() macro examines the structure of its argument.
+            new_tree = tree
+        elif local_binding(tree) == "block":
+            # The cel.block() entries must remain a list of expressions.
+            new_tree = tree
+        else:
+            new_tree = self.rewrite_children(tree)
+        self.rewritten[id(tree)] = new_tree
+        return new_tree
+
+    def rewrite_children(self, tree: lark.Tree) -> lark.Tree:
+        """Replace the constant subtrees of the children. A node is only copied if one of its children changed."""
+        return self.rebuild(
+            tree, [self.operand(tree, child) for child in tree.children]
+        )
+
+    def operand(self, tree: lark.Tree, child: Any) -> Any:
+        """
+        The rewritten child of a node.
+        The list or map on the right of ``in`` is only read by the operator, and never escapes,
+        so it's folded, and can be indexed by :py:class:`MembershipIndexer`.
+        """
+        if not isinstance(child, lark.Tree):
+            return child
+        if (
+            tree.data == "relation"
+            and len(tree.children) == 2
+            and child is tree.children[1]
+            and cast(lark.Tree, tree.children[0]).data == "relation_in"
+            and child.data in VALUES
+            and self.is_pure(child)
+            and self.computes(child)
+        ):
+            return self.fold(child, operand=True)
+        return self.rewrite(child)
+
+
+class PartialEvaluator(ConstantFolder):
+    """
+    Replaces the subtrees computed from known variables, as well as constants, with ``folded`` nodes.
+    A ``&&``, ``||``, or ``?:`` operator with a known operand is simplified,
+    so ``false && resource.x`` becomes ``false``,
+    and ``true && resource.x`` becomes ``resource.x``.
+
+    The activation has the values of the ``known`` variables.
+    A name bound by a macro or ``cel.bind()`` anywhere in the AST isn't known.
+    """
+
+    def __init__(self, activation: Activation, known: Set[str]) -> None:
+        super().__init__(activation)
+        self.known = known
+        self.simplified = 0
+
+    def pure(self, tree: lark.Tree) -> bool:
+        if tree.data == "ident":
+            return str(tree.children[0]) in self.known
+        elif tree.data in {"folded", "memo"}:
+            return True
+        elif (
+            tree.data == "ident_arg"
+            and cast(lark.Token, tree.children[0]).value == "has"
+        ):
+            return True
+        return super().pure(tree)
+
+    def computing(self, tree: lark.Tree) -> bool:
+        """A known variable is worth folding, as well as any operator or function."""
+        return tree.data == "ident" or super().computing(tree)
+
+    @staticmethod
+    def value(tree: lark.Tree) -> Optional[Result]:
+        """The value of a folded subtree or a literal, or None for anything else."""
+        node = passed_through(tree)
+        while node.data == "paren_expr":
+            node = passed_through(cast(lark.Tree, node.children[0]))
+        if node.data == "folded":
+            return cast(Result, node.children[0])
+        elif node.data == "literal":
+            return literal_value(node)
+        return None
+
+    def simplify(self, tree: lark.Tree) -> lark.Tree:
+        """A logic operator with a known operand, replaced by the operand that decides the result."""
+        if not self.builtin(OPERATORS[tree.data]):
+            return tree
+        result: Optional[lark.Tree] = None
+        if tree.data == "expr":
+            cond, left, right = cast(List[lark.Tree], tree.children)
+            value = self.value(cond)
+            if isinstance(value, celpy.celtypes.BoolType):
+                result = left if value else right
+        else:
+            decisive = celpy.celtypes.BoolType(tree.data == "conditionalor")
+            left, right = cast(List[lark.Tree], tree.children)
+            left_value, right_value = self.value(left), self.value(right)
+            if any(
+                isinstance(value, celpy.celtypes.BoolType) and value == decisive
+                for value in (left_value, right_value)
+            ):
+                source = lark.Token("FOLDED", tree_dump(tree))
+                result = type(tree)("folded", [decisive, source], tree.meta)
+            elif isinstance(left_value, celpy.celtypes.BoolType):
+                result = right
+            elif isinstance(right_value, celpy.celtypes.BoolType):
+                result = left
+        if result is None:
+            return tree
+        self.simplified += 1
+        return result
+
+    def rewrite(self, tree: lark.Tree) -> lark.Tree:
+        """Fold the known subtrees, then simplify the logic operators."""
+        if id(tree) in self.rewritten:
+            return self.rewritten[id(tree)]
+        new_tree = super().rewrite(tree)
+        if new_tree.data in LOGIC and len(new_tree.children) > 1:
+            new_tree = self.simplify(new_tree)
+        self.rewritten[id(tree)] = new_tree
+        return new_tree
+
+
+class CommonSubexpressions(Optimizer):
+    """
+    Replaces the repeated subtrees of an AST with ``memo`` nodes.
+
+    A ``memo`` node has two children: a ``SLOT`` token with the slot number,
+    and the subtree.
+    Every occurrence of a repeated subtree is replaced by the same ``memo`` node.
+    The runner evaluates the subtree the first time the slot is used in an evaluation,
+    and reuses the value for the other occurrences.
+    Slots are filled lazily, so a subtree skipped by ``&&``, ``||``, or ``?:`` is not evaluated.
+
+    Only pure subtrees are candidates.
+    Unlike constant folding, identifiers are pure: the activation doesn't change during an evaluation.
+    The bodies of macros, which are evaluated with a changing bind variable,
+    the argument to ``has()``, which isn't evaluated as an expression,
+    and the ``cel.bind()`` and ``cel.block()`` extensions, which bind their own locals,
+    are not searched.
+    """
+
+    def __init__(self, activation: Activation) -> None:
+        super().__init__(activation)
+        self.keys: Dict[Any, int] = {}
+        self.key_of: Dict[int, int] = {}
+        self.candidates: Dict[int, Optional[int]] = {}
+        self.uses: Dict[int, int] = {}
+        self.memos: Dict[int, lark.Tree] = {}
+        self.plan: List[Tuple[int, int, str]] = []
+
+    def pure(self, tree: lark.Tree) -> bool:
+        if tree.data in {"ident", "dot_ident", "folded"}:
+            return True
+        elif tree.data == "ident_arg" and cast(lark.Token, tree.children[0]).value in {
+            "has",
+            "dyn",
+        }:
+            return True
+        return super().pure(tree)
+
+    def key(self, tree: lark.Tree) -> int:
+        """An integer that is the same for all structurally identical subtrees."""
+        if id(tree) not in self.key_of:
+            parts = (tree.data,) + tuple(
+                self.key(child)
+                if isinstance(child, lark.Tree)
+                else (child.type, child.value)
+                for child in tree.children
+                if isinstance(child, (lark.Tree, lark.Token))
+            )
+            self.key_of[id(tree)] = self.keys.setdefault(parts, len(self.keys))
+        return self.key_of[id(tree)]
+
+    @staticmethod
+    def searched(tree: lark.Tree) -> List[int]:
+        """The positions of the children that are evaluated as ordinary expressions."""
+        if (
+            tree.data == "ident_arg"
+            and cast(lark.Token, tree.children[0]).value == "has"
+        ) or local_binding(tree):
+            return []
+        elif (
+            tree.data == "member_dot_arg"
+            and cast(lark.Token, tree.children[1]).value in MACROS
+        ):
+            return [0]
+        elif tree.data == "member_object":
+            # The type name is resolved, not evaluated.
+            return list(range(1, len(tree.children)))
+        return [
+            n for n, child in enumerate(tree.children) if isinstance(child, lark.Tree)
+        ]
+
+    def candidate(self, tree: lark.Tree, parent: Optional[lark.Tree]) -> Optional[int]:
+        """
+        The key, if the subtree can be replaced by a ``memo`` node, otherwise None.
+
+        A pass-through node with one child is not a candidate; its child is.
+        The child of a ``primary`` node is not a candidate; the ``primary`` node is.
+        """
+        if id(tree) not in self.candidates:
+            self.candidates[id(tree)] = (
+                self.key(tree)
+                if tree.data in VALUES | {"ident", "dot_ident"}
+                and not (tree.data in PASS_THROUGH and len(tree.children) == 1)
+                and not (parent is not None and parent.data == "primary")
+                and self.is_pure(tree)
+                and self.computes(tree)
+                else None
+            )
+        return self.candidates[id(tree)]
+
+    def computing(self, tree: lark.Tree) -> bool:
+        """Anything but a literal or a folded constant is worth saving."""
+        return tree.data not in PASS_THROUGH | {"primary", "literal", "folded"}
+
+    def count(
+        self,
+        tree: lark.Tree,
+        parent: Optional[lark.Tree],
+        repeated: Set[int],
+        seen: Set[int],
+    ) -> None:
+        """
+        Count the uses of each candidate subtree.
+        A subtree in the ``repeated`` set is searched only at its first occurrence,
+        since it will be evaluated only once.
+        """
+        key = self.candidate(tree, parent)
+        if key is not None:
+            self.uses[key] = self.uses.get(key, 0) + 1
+            if key in repeated:
+                if key in seen:
+                    return
+                seen.add(key)
+        for n in self.searched(tree):
+            self.count(cast(lark.Tree, tree.children[n]), tree, repeated, seen)
+
+    def plan_slots(self, tree: lark.Tree) -> None:
+        """
+        Count the uses of each candidate subtree.
+
+        The ``x`` in ``x.y + x.y`` is used twice, but both uses are inside ``x.y``,
+        which is evaluated once.
+        The counting is repeated until the set of repeated subtrees doesn't change.
+        """
+        repeated: Set[int] = set()
+        while True:
+            self.uses = {}
+            self.count(tree, None, repeated, set())
+            now_repeated = {key for key, uses in self.uses.items() if uses > 1}
+            if now_repeated == repeated:
+                break
+            repeated = now_repeated
+
+    def memo(self, tree: lark.Tree) -> lark.Tree:
+        """The ``memo`` node for a repeated subtree."""
+        key = self.key(tree)
+        if key not in self.memos:
+            slot = len(self.plan)
+            self.plan.append((slot, self.uses[key], tree_dump(tree)))
+            definition = self.rewrite_children(tree)
+            self.memos[key] = type(tree)(
+                "memo", [lark.Token("SLOT", str(slot)), definition], tree.meta
+            )
+        return self.memos[key]
+
+    def rewrite_children(self, tree: lark.Tree) -> lark.Tree:
+        searched = self.searched(tree)
+        return self.rebuild(
+            tree,
+            [
+                self.rewrite(cast(lark.Tree, child), tree) if n in searched else child
+                for n, child in enumerate(tree.children)
+            ],
+        )
+
+    def rewrite(self, tree: lark.Tree, parent: Optional[lark.Tree] = None) -> lark.Tree:
+        """Replace each candidate subtree used more than once with its ``memo`` node."""
+        key = self.candidate(tree, parent)
+        if key is not None and self.uses[key] > 1:
+            return self.memo(tree)
+        if id(tree) not in self.rewritten:
+            self.rewritten[id(tree)] = self.rewrite_children(tree)
+        return self.rewritten[id(tree)]
+
+
+class MembershipIndexer(Optimizer):
+    """
+    Adds a :py:class:`celpy.evaluation.MembershipIndex` to each ``_in_`` operator with a constant list.
+
+    The ``relation_in`` node gets the index as a second child,
+    and the list becomes a ``folded`` node, so it's not built again by each evaluation.
+    """
+
+    def __init__(self, activation: Activation) -> None:
+        super().__init__(activation)
+        self.indexes = 0
+
+    def constant_list(self, tree: lark.Tree) -> Optional[celpy.celtypes.ListType]:
+        """The value of a constant list, or None for anything else."""
+        node = passed_through(tree)
+        value: Result
+        if node.data == "folded":
+            value = cast(Result, node.children[0])
+        elif node.data == "list_lit" and self.is_pure(node):
+            try:
+                value = Evaluator(ast=node, activation=self.activation).visit(node)
+            except Exception as ex:
+                logger.debug("Not indexing %s: %r", tree_dump(node), ex)
+                return None
+        else:
+            return None
+        return value if isinstance(value, celpy.celtypes.ListType) else None
+
+    def index(self, children: List[Any]) -> List[Any]:
+        """
+        The children of a ``relation`` node, with an index if the right operand is a constant list.
+        The folded list is only given to the index, which ignores it, so it's never part of a result.
+        """
+        op_tree, right = cast(Tuple[lark.Tree, lark.Tree], children)
+        container = self.constant_list(right)
+        if container is None:
+            return children
+        self.indexes += 1
+        source = lark.Token("FOLDED", tree_dump(right))
+        return [
+            type(op_tree)(
+                op_tree.data,
+                [op_tree.children[0], MembershipIndex(container)],
+                op_tree.meta,
+            ),
+            type(right)("folded", [container, source], right.meta),
+        ]
+
+    def rewrite(self, tree: lark.Tree) -> lark.Tree:
+        """Add an index to each ``_in_`` with a constant list. A node is only copied if one of its children changed."""
+        if id(tree) in self.rewritten:
+            return self.rewritten[id(tree)]
+        children = [
+            self.rewrite(child) if isinstance(child, lark.Tree) else child
+            for child in tree.children
+        ]
+        if (
+            tree.data == "relation"
+            and len(children) == 2
+            and children[0].data == "relation_in"
+            and len(children[0].children) == 1
+        ):
+            children = self.index(children)
+        new_tree = self.rebuild(tree, children)
+        self.rewritten[id(tree)] = new_tree
+        return new_tree
+
+
+class PatternCompiler(Optimizer):
+    """
+    Replaces each string literal pattern of a ``matches()`` function with a ``folded`` node
+    holding the compiled pattern.
+
+    :raises CELEvalError: for an invalid pattern.
+    """
+
+    def __init__(self, activation: Activation) -> None:
+        super().__init__(activation)
+        self.patterns = 0
+
+    def compiled(self, tree: lark.Tree) -> lark.Tree:
+        """A ``folded`` node with the compiled pattern, or the node itself if it's not a string literal."""
+        node = passed_through(tree)
+        if node.data == "folded":
+            value = node.children[0]
+        elif node.data == "literal":
+            value = literal_value(node)
+        else:
+            return tree
+        if not isinstance(value, celpy.celtypes.StringType):
+            return tree
+        try:
+            pattern = compile_pattern(value)
+        except Exception as ex:
+            raise CELEvalError("match error", ex.__class__, ex.args, tree=node)
+        self.patterns += 1
+        source = lark.Token("FOLDED", tree_dump(tree))
+        return type(tree)("folded", [pattern, source], tree.meta)
+
+    @staticmethod
+    def matches(tree: lark.Tree) -> bool:
+        """True for a ``matches()`` function with arguments."""
+        if tree.data == "member_dot_arg" and len(tree.children) == 3:
+            name, exprlist = tree.children[1:]
+        elif tree.data == "ident_arg" and len(tree.children) == 2:
+            name, exprlist = tree.children
+        else:
+            return False
+        return name == "matches" and isinstance(exprlist, lark.Tree)
+
+    def rewrite(self, tree: lark.Tree) -> lark.Tree:
+        """Compile each literal pattern. A node is only copied if one of its children changed."""
+        if id(tree) in self.rewritten:
+            return self.rewritten[id(tree)]
+        children = [
+            self.rewrite(child) if isinstance(child, lark.Tree) else child
+            for child in tree.children
+        ]
+        if self.matches(tree):
+            # The pattern is the last argument.
+            exprlist = cast(lark.Tree, children[-1])
+            arguments = exprlist.children[:-1] + [
+                self.compiled(cast(lark.Tree, exprlist.children[-1]))
+            ]
+            children[-1] = self.rebuild(exprlist, arguments)
+        new_tree = self.rebuild(tree, children)
+        self.rewritten[id(tree)] = new_tree
+        return new_tree
+
+
+def fold_constants(
+    tree: lark.Tree, activation: Optional[Activation] = None
+) -> lark.Tree:
+    """
+    Creates a new AST with the constant subtrees evaluated.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with ``folded`` nodes. If nothing is constant, this is the original AST.
+    """
+    folder = ConstantFolder(activation or Activation())
+    optimized = folder.rewrite(tree)
+    logger.debug("Folded %d constant subtrees", folder.folds)
+    return optimized
+
+
+def local_names(tree: lark.Tree) -> Set[str]:
+    """The names bound by the macros and ``cel.bind()`` extensions of an AST."""
+    names = set()
+    for node in tree.iter_subtrees():
+        if node.data != "member_dot_arg" or len(node.children) != 3:
+            continue
+        method, exprlist = node.children[1:]
+        if not isinstance(exprlist, lark.Tree):
+            continue
+        if local_binding(node) == "bind" or method in MACROS:
+            names |= {
+                str(passed_through(argument).children[0])
+                for argument in exprlist.children[:2]
+                if passed_through(argument).data == "ident"
+            }
+    return names
+
+
+def fold_known(
+    tree: lark.Tree, context: Context, activation: Optional[Activation] = None
+) -> lark.Tree:
+    """
+    Creates a new AST with the subtrees computed from the known variables evaluated.
+    This is a residual AST: it needs values for the remaining variables.
+
+    The constant subtrees are also evaluated, and ``&&``, ``||``, and ``?:`` operators
+    with a known operand are simplified.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param context: The values of the known variables.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with ``folded`` nodes. If nothing is known, this is the original AST.
+    """
+    known_activation = (activation or Activation()).clone()
+    known_activation.identifiers.load_values(context)
+    known = set(context) - local_names(tree)
+    evaluator = PartialEvaluator(known_activation, known)
+    optimized = evaluator.rewrite(tree)
+    logger.debug(
+        "Folded %d subtrees with %s, simplified %d operators",
+        evaluator.folds,
+        sorted(known),
+        evaluator.simplified,
+    )
+    return optimized
+
+
+def eliminate_common_subexpressions(
+    tree: lark.Tree, activation: Optional[Activation] = None
+) -> lark.Tree:
+    """
+    Creates a new AST where each repeated subtree is evaluated once per evaluation.
+
+    The plan -- the slots, the number of uses, and the source of each subtree -- is logged.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with ``memo`` nodes. If nothing is repeated, this is the original AST.
+    """
+    cse = CommonSubexpressions(activation or Activation())
+    cse.plan_slots(tree)
+    optimized = cse.rewrite(tree)
+    if cse.plan:
+        logger.info(
+            "Common subexpressions:\n%s",
+            "\n".join(
+                f"  memo {slot}: {uses} uses of {source}"
+                for slot, uses, source in cse.plan
+            ),
+        )
+    return optimized
+
+
+def index_membership(
+    tree: lark.Tree, activation: Optional[Activation] = None
+) -> lark.Tree:
+    """
+    Creates a new AST where each ``_in_`` operator with a constant list uses a hash index.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with :py:class:`celpy.evaluation.MembershipIndex` objects. If there are no constant lists, this is the original AST.
+    """
+    indexer = MembershipIndexer(activation or Activation())
+    if not indexer.builtin("_in_"):
+        # A function provided for ``_in_`` is used as-is.
+        return tree
+    optimized = indexer.rewrite(tree)
+    logger.debug("Indexed %d constant lists", indexer.indexes)
+    return optimized
+
+
+def compile_patterns(
+    tree: lark.Tree, activation: Optional[Activation] = None
+) -> lark.Tree:
+    """
+    Creates a new AST where each ``matches()`` function with a string literal pattern uses a compiled pattern.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    :returns: An AST with compiled patterns. If there are no literal patterns, this is the original AST.
+    :raises CELEvalError: for an invalid literal pattern.
+    """
+    compiler = PatternCompiler(activation or Activation())
+    if not compiler.builtin("matches"):
+        # A function provided for ``matches`` is used as-is.
+        return tree
+    optimized = compiler.rewrite(tree)
+    logger.debug("Compiled %d patterns", compiler.patterns)
+    return optimized
+
+
+class OperandStats:
+    """
+    The measurements of one operand of a ``&&`` or ``||`` chain.
+
+    The ``rank`` is the average cost divided by the fraction of evaluations where the operand decided the result.
+    That's the expected cost of deciding the result with this operand.
+    An operand that never decided the result has an infinite rank.
+    """
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.evaluations = 0
+        self.seconds = 0.0
+        self.decided = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({self.source!r}, evaluations={self.evaluations}, "
+            f"seconds={self.seconds:.6f}, decided={self.decided})"
+        )
+
+    @property
+    def cost(self) -> float:
+        """The average time to evaluate the operand."""
+        return self.seconds / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def selectivity(self) -> float:
+        """The fraction of evaluations where the operand decided the result."""
+        return self.decided / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def rank(self) -> float:
+        return self.seconds / self.decided if self.decided else math.inf
+
+
+class OperandProfile:
+    """
+    The operands of each ``&&`` and ``||`` chain in an AST, and the :py:class:`OperandStats` of each operand.
+
+    The parser makes ``a && b && c`` into ``(a && b) && c``.
+    The root of the chain is the outermost node, and the operands are ``a``, ``b``, and ``c``.
+    A parenthesized sub-expression, or a chain of the other operator, is a single operand.
+    The chains are identified by the ``id()`` of the root node.
+
+    A chain of an operator replaced by a function provided to :py:meth:`celpy.Environment.program`
+    may not be commutative, and isn't profiled.
+
+    :param tree: An AST from :py:meth:`celpy.Environment.compile`.
+    :param activation: The :py:class:`celpy.evaluation.Activation` with the functions the runner will use.
+        By default, only the built-in functions are used.
+    """
+
+    def __init__(
+        self, tree: lark.Tree, activation: Optional[Activation] = None
+    ) -> None:
+        self.activation = activation or Activation()
+        self.roots: List[lark.Tree] = []
+        self.operands: Dict[int, List[lark.Tree]] = {}
+        self.stats: Dict[int, List[OperandStats]] = {}
+        self.evaluations = 0
+        self.rewritten: Dict[int, lark.Tree] = {}
+        self.find_chains(tree, set())
+
+    @staticmethod
+    def chain(tree: lark.Tree) -> List[lark.Tree]:
+        """The operands of the chain with this root, left to right."""
+        operator = tree.data
+        operands = []
+        while tree.data == operator and len(tree.children) == 2:
+            operands.append(cast(lark.Tree, tree.children[1]))
+            tree = cast(lark.Tree, tree.children[0])
+        operands.append(tree)
+        return operands[::-1]
+
+    def find_chains(self, tree: lark.Tree, seen: Set[int]) -> None:
+        if id(tree) in seen:
+            return
+        seen.add(id(tree))
+        children = tree.children
+        if (
+            tree.data in CHAINS
+            and len(tree.children) == 2
+            and self.activation.resolve_function(CHAINS[tree.data])
+            is base_functions[CHAINS[tree.data]]
+        ):
+            operands = self.chain(tree)
+            self.roots.append(tree)
+            self.operands[id(tree)] = operands
+            self.stats[id(tree)] = [OperandStats(tree_dump(op)) for op in operands]
+            children = operands
+        for child in children:
+            if isinstance(child, lark.Tree):
+                self.find_chains(child, seen)
+
+    def record(self, tree: lark.Tree, n: int, seconds: float, value: Result) -> None:
+        """Record one evaluation of the ``n``-th operand of a chain."""
+        stats = self.stats[id(tree)][n]
+        stats.evaluations += 1
+        stats.seconds += seconds
+        if is_decisive(base_functions[CHAINS[tree.data]], value):
+            stats.decided += 1
+
+    def order(self, tree: lark.Tree) -> List[int]:
+        """The positions of the operands of a chain, lowest rank first."""
+        stats = self.stats[id(tree)]
+        return sorted(range(len(stats)), key=lambda n: stats[n].rank)
+
+    def plan(self) -> List[List[str]]:
+        """The source of the operands of each chain, lowest rank first."""
+        return [
+            [self.stats[id(root)][n].source for n in self.order(root)]
+            for root in self.roots
+        ]
+
+    def rewrite(self, tree: lark.Tree) -> lark.Tree:
+        """Rebuild each chain with the operands in rank order."""
+        if id(tree) in self.rewritten:
+            return self.rewritten[id(tree)]
+        new_tree: lark.Tree
+        if id(tree) in self.operands:
+            operands = [self.rewrite(op) for op in self.operands[id(tree)]]
+            order = self.order(tree)
+            if order == sorted(order) and all(
+                new is old for new, old in zip(operands, self.operands[id(tree)])
+            ):
+                new_tree = tree
+            else:
+                new_tree = operands[order[0]]
+                for n in order[1:]:
+                    new_tree = type(tree)(tree.data, [new_tree, operands[n]], tree.meta)
+        else:
+            new_tree = Optimizer.rebuild(
+                tree,
+                [
+                    self.rewrite(child) if isinstance(child, lark.Tree) else child
+                    for child in tree.children
+                ],
+            )
+        self.rewritten[id(tree)] = new_tree
+        return new_tree
+
+
+class OperandProfiler(Evaluator):
+    """
+    An :py:class:`celpy.evaluation.Evaluator` that measures the operands of each ``&&`` and ``||`` chain.
+
+    Every operand of a chain is evaluated, without short-circuiting, so every operand is measured.
+    The result is the same as the result from an ordinary :py:class:`celpy.evaluation.Evaluator`.
+    The operands an ordinary evaluator would skip aren't charged to the activation's cost budget.
+    """
+
+    def __init__(
+        self, ast: lark.Tree, activation: Activation, profile: OperandProfile
+    ) -> None:
+        super().__init__(ast, activation)
+        self.profile = profile
+
+    def sub_evaluator(self, ast: lark.Tree, *variables: str) -> "Evaluator":
+        """Macro bodies are measured, also."""
+        nested_eval = OperandProfiler(ast, self.activation, self.profile)
+        nested_eval.locals = super().sub_evaluator(ast, *variables).locals
+        return nested_eval
+
+    @contextmanager
+    def uncharged(self) -> Iterator[None]:
+        """
+        Evaluate an operand after the one that decided the result.
+        Its macros can't exceed the cost limit, and the cost is restored afterwards.
+        """
+        budget = self.activation.budget
+        if budget is None:
+            yield
+            return
+        cost, limit = budget.cost, budget.limit
+        budget.limit = sys.maxsize
+        try:
+            yield
+        finally:
+            budget.cost, budget.limit = cost, limit
+
+    def measure(self, tree: lark.Tree) -> Result:
+        """Evaluate all of the operands of a chain, left to right."""
+        name = CHAINS[tree.data]
+        func = self.activation.resolve_function(name)
+        value: Result = None
+        decided = False
+        for n, operand in enumerate(self.profile.operands[id(tree)]):
+            charging: ContextManager[None] = (
+                self.uncharged() if decided else nullcontext()
+            )
+            start = time.perf_counter()
+            with charging:
+                operand_value = cast(Result, self.visit(operand))
+            self.profile.record(tree, n, time.perf_counter() - start, operand_value)
+            if n == 0:
+                value = operand_value
+                decided = is_decisive(func, value)
+                continue
+            if decided:
+                # The ordinary evaluator skips this operand; the value is decided.
+                continue
+            try:
+                value = func(value, operand_value)
+            except TypeError as ex:
+                err = (
+                    f"found no matching overload for {name} "
+                    f"applied to '({type(value)}, {type(operand_value)})'"
+                )
+                value = CELEvalError(err, ex.__class__, ex.args, tree=tree)
+                value.__cause__ = ex
+        return value
+
+    def conditionalor(self, tree: lark.Tree) -> Result:
+        if id(tree) in self.profile.operands:
+            return self.measure(tree)
+        return cast(Result, super().conditionalor(tree))
+
+    def conditionaland(self, tree: lark.Tree) -> Result:
+        if id(tree) in self.profile.operands:
+            return self.measure(tree)
+        return cast(Result, super().conditionaland(tree))
+
+
+def reorder_operands(tree: lark.Tree, profile: OperandProfile) -> lark.Tree:
+    """
+    Creates a new AST where the operands of each ``&&`` and ``||`` chain are in rank order,
+    using the measurements collected by an :py:class:`OperandProfiler`.
+
+    The order of the operands of each chain is logged.
+
+    :param tree: The AST used to create the :py:class:`OperandProfile`.
+    :param profile: The measurements of the operands.
+    :returns: An AST with the chains rebuilt. If no order changed, this is the original AST.
+    """
+    optimized = profile.rewrite(tree)
+    if optimized is not tree:
+        logger.info(
+            "Operand order after %d evaluations:\n%s",
+            profile.evaluations,
+            "\n".join(f"  {' | '.join(sources)}" for sources in profile.plan()),
+        )
+    return optimized
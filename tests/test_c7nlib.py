@@ -26,7 +26,9 @@ There are three collections of tests.
 
 import datetime
 import io
+import time
 import zlib
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 from unittest.mock import Mock, call, sentinel
 
@@ -1112,6 +1114,35 @@ def test_C7N_extension_function(mock_filter_class, mock_manager, caplog):
     assert cel_result
 
 
+def test_C7N_evaluate_many():
+    """
+    GIVEN a C7N_Interpreted_Runner with a function that uses the C7N filter
+    WHEN contexts are evaluated by several threads, with different filters
+    THEN each evaluation uses its own filter
+    """
+
+    def filter_name(resource):
+        time.sleep(0.001)
+        return celpy.celtypes.StringType(celpy.c7nlib.C7N.filter.name)
+
+    cel_env = celpy.Environment(runner_class=celpy.c7nlib.C7N_Interpreted_Runner)
+    cel_prgm = cel_env.program(
+        cel_env.compile("filter_name(resource) + resource.id"),
+        functions={"filter_name": filter_name},
+    )
+    contexts = [{"resource": celpy.json_to_cel({"id": str(n)})} for n in range(20)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {
+            name: executor.submit(
+                cel_prgm.evaluate_many, contexts, filter=SimpleNamespace(name=name)
+            )
+            for name in ["a", "b"]
+        }
+    for name, future in futures.items():
+        assert future.result() == [f"{name}{n}" for n in range(20)]
+    assert celpy.c7nlib.C7N.context is None
+
+
 def test_C7N_CELFilter_image(celfilter_instance):
     mock_filter = celfilter_instance["the_filter"]
     ec2_doc = {"ResourceType": "ec2"}
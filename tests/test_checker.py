@@ -0,0 +1,239 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Test the static type checker.
+"""
+
+import pytest
+
+import celpy
+from celpy.celparser import tree_dump
+from celpy.celtypes import (
+    BoolType,
+    DoubleType,
+    IntType,
+    MapType,
+    StringType,
+    UintType,
+)
+from celpy.checker import (
+    CELTypeError,
+    TypeChecker,
+    check_types,
+    int_add,
+    int_lt,
+    string_eq,
+    uint_sub,
+)
+
+ANNOTATIONS = {
+    "i": IntType,
+    "u": UintType,
+    "d": DoubleType,
+    "s": StringType,
+    "m": MapType,
+    "a.b": IntType,
+}
+
+
+def specialized_names(ast):
+    return [
+        node.children[1].__name__
+        for node in ast.iter_subtrees_topdown()
+        if node.data.startswith(("relation_", "addition_", "multiplication_"))
+        and len(node.children) == 2
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("i", IntType),
+        ("i + 1", IntType),
+        ("u * 2u", UintType),
+        ("d / 2.0", DoubleType),
+        ("i < 2", BoolType),
+        ("-i", IntType),
+        ("!(i < 2)", BoolType),
+        ("i < 2 && s == 'x'", BoolType),
+        ("i < 2 ? 1 : 2", IntType),
+        ("i < 2 ? 1 : 'x'", None),
+        ("a.b", IntType),
+        ("m.c", None),
+        ("s.size()", IntType),
+        ("string(i)", StringType),
+        ("dyn(i)", None),
+        ("[i].all(i, i > 0)", BoolType),
+        ("[1, 2]", celpy.celtypes.ListType),
+        ("{'a': 1}", MapType),
+    ],
+)
+def test_types(text, expected):
+    """
+    GIVEN annotations
+    WHEN types are checked
+    THEN the types of the expressions are inferred from annotations and literals
+    """
+    env = celpy.Environment(annotations=ANNOTATIONS)
+    checker = TypeChecker(ANNOTATIONS)
+    _, cel_type = checker.check(env.compile(text))
+    assert cel_type is expected
+    assert checker.issues == []
+
+
+def test_specialized():
+    """
+    GIVEN operators applied to operands with known types
+    WHEN types are checked
+    THEN operators with two operands of the same type are specialized, and the original AST is unchanged
+    """
+    env = celpy.Environment(annotations=ANNOTATIONS)
+    ast = env.compile("i + 1 < 10 && s == 'x' && u - 1u > 0u && d * 2.0 > 1.0")
+    before = tree_dump(ast)
+    checked = check_types(ast, ANNOTATIONS)
+    assert specialized_names(checked) == [
+        "int_lt",
+        "int_add",
+        "string_eq",
+        "uint_gt",
+        "uint_sub",
+    ]
+    assert tree_dump(checked) == before
+    assert specialized_names(ast) == []
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "m.c + 1",
+        "[1].map(i, i + 's')",
+        "cel.bind(i, 'x', i + 'y')",
+        "[1, 2].reduce(s, n, 0, s + n) > 0",
+    ],
+)
+def test_not_checked(text):
+    """
+    GIVEN expressions with dynamic types, or local names hiding annotated variables
+    WHEN types are checked
+    THEN there's no type error
+    """
+    env = celpy.Environment(annotations=ANNOTATIONS)
+    check_types(env.compile(text), ANNOTATIONS)
+
+
+def test_overridden_function():
+    """
+    GIVEN an activation with a function replacing an operator
+    WHEN types are checked
+    THEN the operator isn't checked or specialized
+    """
+    env = celpy.Environment(annotations=ANNOTATIONS)
+    ast = env.compile("i + 's' == i")
+    activation = celpy.Activation(
+        functions={"_+_": lambda a, b: a, "_==_": lambda a, b: a}
+    )
+    assert check_types(ast, ANNOTATIONS, activation) is ast
+
+
+def test_type_errors():
+    """
+    GIVEN an expression with type errors
+    WHEN types are checked
+    THEN all the errors are reported, with the position of the first
+    """
+    env = celpy.Environment(annotations=ANNOTATIONS)
+    with pytest.raises(CELTypeError) as exc_info:
+        check_types(env.compile("i < 2 ||\n  i + s > 0 || i == 1.0"), ANNOTATIONS)
+    assert exc_info.value.args == (
+        "found no matching overload for '_+_' applied to '(int, string)'",
+    )
+    assert exc_info.value.issues == [
+        "found no matching overload for '_+_' applied to '(int, string)'",
+        "found no matching overload for '_==_' applied to '(int, double)'",
+    ]
+    assert (exc_info.value.line, exc_info.value.column) == (2, 3)
+
+
+@pytest.mark.parametrize(
+    "function, a, b, expected",
+    [
+        (int_lt, IntType(1), IntType(2), BoolType(True)),
+        (int_lt, IntType(1), DoubleType(2.0), TypeError),
+        (int_add, IntType(1), IntType(2), IntType(3)),
+        (int_add, IntType(2**63 - 1), IntType(1), ValueError),
+        (uint_sub, UintType(1), UintType(2), ValueError),
+        (string_eq, StringType("a"), StringType("a"), BoolType(True)),
+        (string_eq, StringType("a"), None, BoolType(False)),
+    ],
+)
+def test_specialized_functions(function, a, b, expected):
+    """
+    GIVEN a specialized function
+    WHEN it's applied to values of the expected types, or other types
+    THEN the result matches the generic function
+    """
+    if isinstance(expected, type) and issubclass(expected, Exception):
+        with pytest.raises(expected):
+            function(a, b)
+    else:
+        result = function(a, b)
+        assert result == expected
+        assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_program_check(runner_class):
+    """
+    GIVEN Environment with annotations
+    WHEN programs are created with check=True
+    THEN type errors are raised, and the results match the unchecked programs
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(annotations=ANNOTATIONS, runner_class=runner_class)
+    context = {
+        "i": IntType(3),
+        "u": UintType(2),
+        "d": DoubleType(1.5),
+        "s": StringType("abc"),
+        "m": MapType({StringType("c"): IntType(1)}),
+    }
+    expressions = [
+        "i + 1 < 10 && s == 'abc'",
+        "u * 2u >= 4u ? d * 2.0 : 0.0",
+        "[1, 2, 3].filter(n, n * i > 3 && n - 1 != i)",
+        "m.c + i == 4",
+    ]
+    for text in expressions:
+        ast = env.compile(text)
+        expected = env.program(ast).evaluate(context)
+        checked = env.program(ast, check=True, optimize=True)
+        assert checked.evaluate(context) == expected
+
+    overflow = env.compile("i * 9223372036854775807 > 0")
+    for check in [False, True]:
+        with pytest.raises(celpy.CELEvalError):
+            env.program(overflow, check=check).evaluate(context)
+
+    # A value that doesn't match its annotation uses the generic function.
+    prgm = env.program(env.compile("i < 2"), check=True)
+    assert prgm.evaluate({"i": IntType(1)}) == BoolType(True)
+    assert prgm.evaluate({"i": UintType(1)}) == BoolType(True)
+
+    with pytest.raises(CELTypeError):
+        env.program(env.compile("s < i"), check=True)
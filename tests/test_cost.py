@@ -0,0 +1,140 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Test the cost estimates and cost limits.
+"""
+
+import math
+
+import pytest
+
+import celpy
+from celpy.cost import CostEstimate, estimate_cost
+from celpy.evaluation import CostBudget
+
+SIZES = {"x": 10, "y": 100, "r.tags": 5}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("1 + 2", CostEstimate(0, 0)),
+        ("[1, 2, 3].map(n, n * 2)", CostEstimate(3, 3)),
+        ("{'a': 1, 'b': 2}.all(k, k != '')", CostEstimate(2, 2)),
+        ("[1, 2, 3].exists(n, n == 1)", CostEstimate(3, 3)),
+        ("[].exists(n, x.exists(m, m == n))", CostEstimate(0, 0)),
+        ("x.filter(n, n > 0)", CostEstimate(0, 10)),
+        ("x.exists(a, y.exists(b, a == b))", CostEstimate(0, 1010)),
+        ("x.map(n, n * 2).filter(n, n > 0).size()", CostEstimate(0, 20)),
+        ("r.tags.exists_one(t, t == 'a') && x.all(n, n > 0)", CostEstimate(0, 15)),
+        ("r.x ? [1, 2].map(n, n) : [1].map(n, n)", CostEstimate(1, 2)),
+        ("[1, 2].reduce(s, n, 0, s + n)", CostEstimate(2, 2)),
+        ("x.map(y, y.size())", CostEstimate(0, 10)),
+        ("[x].map(x, x.map(n, n))", CostEstimate(1, math.inf)),
+        ("z.map(n, n)", CostEstimate(0, math.inf)),
+    ],
+)
+def test_estimate_cost(text, expected):
+    """
+    GIVEN an expression and size hints
+    WHEN the cost is estimated
+    THEN the smallest and largest number of macro items are found
+    """
+    env = celpy.Environment()
+    assert estimate_cost(env.compile(text), SIZES) == expected
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_estimate_charged(runner_class):
+    """
+    GIVEN all() and exists() macros decided by the first item
+    WHEN programs with a cost limit of the smallest estimate are evaluated
+    THEN every item is charged, and the limit is enough
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    for text in ["[1, 2, 3].exists(n, n == 1)", "[1, 2, 3].all(n, n > 1)"]:
+        ast = env.compile(text)
+        smallest = estimate_cost(ast).min
+        assert env.program(ast, cost_limit=smallest).evaluate({}) is not None
+        with pytest.raises(celpy.CELEvalError):
+            env.program(ast, cost_limit=smallest - 1).evaluate({})
+
+
+def test_cost_budget():
+    """
+    GIVEN a CostBudget
+    WHEN items are charged
+    THEN the items past the limit raise an error
+    """
+    budget = CostBudget(3)
+    assert list(budget.items([1, 2])) == [1, 2]
+    assert not budget.exceeded
+    with pytest.raises(celpy.CELEvalError) as exc_info:
+        list(budget.items([3, 4]))
+    assert exc_info.value.args == ("cost limit exceeded", ValueError, (3,))
+    assert budget.exceeded
+    assert repr(budget) == "CostBudget(limit=3, cost=4)"
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+@pytest.mark.parametrize("adaptive", [0, 2])
+def test_program_cost_limit(runner_class, adaptive):
+    """
+    GIVEN expressions with nested macros
+    WHEN programs with a cost limit are evaluated
+    THEN an evaluation that exceeds the limit raises an error, even if the error would be ignored,
+        and the other evaluations are not changed
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    ast = env.compile("x.exists(a, y.exists(b, a == b)) || true")
+    context = {
+        "x": celpy.json_to_cel(list(range(10))),
+        "y": celpy.json_to_cel(list(range(100, 200))),
+    }
+    prgm = env.program(ast, cost_limit=1010, adaptive=adaptive, sizes=SIZES)
+    assert prgm.cost == CostEstimate(0, 1010)
+    for _ in range(3):
+        assert prgm.evaluate(context) == celpy.celtypes.BoolType(True)
+
+    # A profiled program may move ``true`` first, and skip the macros.
+    limited = env.program(ast, cost_limit=1009)
+    assert limited.cost == CostEstimate(0, math.inf)
+    for _ in range(3):
+        with pytest.raises(celpy.CELEvalError) as exc_info:
+            limited.evaluate(context)
+        assert exc_info.value.args[0] == "cost limit exceeded"
+        assert limited.evaluate({**context, "x": celpy.json_to_cel([1])})
+
+    # While profiling, an operand the ordinary evaluator would skip isn't charged.
+    skipped = env.compile("true || y.all(b, b > 0)")
+    skipped_prgm = env.program(skipped, cost_limit=1, adaptive=adaptive)
+    for _ in range(4):
+        assert skipped_prgm.evaluate(context) == celpy.celtypes.BoolType(True)
+
+    # The residual program keeps the limit; ``|| true`` would be folded away.
+    nested = env.compile("x.exists(a, y.exists(b, a == b))")
+    nested_prgm = env.program(nested, cost_limit=1009, adaptive=adaptive)
+    residual = nested_prgm.partial_evaluate({"y": context["y"]})
+    with pytest.raises(celpy.CELEvalError):
+        residual.evaluate({"x": context["x"]})
@@ -184,6 +184,52 @@ def test_operator_in():
     assert isinstance(operator_in(celtypes.IntType(-1), container_2), CELEvalError)
 
 
+@pytest.mark.parametrize(
+    "container",
+    [
+        [celtypes.StringType("a"), celtypes.StringType("b")],
+        [celtypes.IntType(1), celtypes.StringType("b"), celtypes.UintType(2)],
+        [celtypes.BoolType(True), celtypes.DoubleType(2.0), celtypes.IntType(3)],
+        [
+            celtypes.DoubleType(float("nan")),
+            celtypes.ListType([celtypes.IntType(1)]),
+            None,
+        ],
+        [],
+    ],
+)
+@pytest.mark.parametrize(
+    "item",
+    [
+        celtypes.StringType("b"),
+        celtypes.StringType("z"),
+        celtypes.IntType(1),
+        celtypes.IntType(3),
+        celtypes.UintType(2),
+        celtypes.DoubleType(2.0),
+        celtypes.DoubleType(float("nan")),
+        celtypes.BoolType(True),
+        celtypes.ListType([celtypes.IntType(1)]),
+        None,
+        CELEvalError("error"),
+    ],
+)
+def test_membership_index(container, item):
+    """
+    GIVEN a constant list and a MembershipIndex
+    WHEN a value is sought
+    THEN the result matches operator_in, including errors
+    """
+    container = celtypes.ListType(container)
+    index = MembershipIndex(container)
+    expected = operator_in(item, container)
+    for _ in range(2):
+        actual = index(item, sentinel.ignored)
+        assert type(actual) is type(expected)
+        if not isinstance(expected, CELEvalError):
+            assert actual == expected
+
+
 @pytest.mark.skipif(
     "re2" not in celpy.evaluation.function_matches.__globals__, reason="Not using RE2"
 )
@@ -209,6 +255,28 @@ def test_function_matches():
     assert function_matches(empty_string, "^$")
 
 
+def test_compile_pattern():
+    compile_pattern.cache_clear()
+    text = celtypes.StringType("abc")
+    assert function_matches(text, "^a") == celtypes.BoolType(True)
+    assert function_matches(text, "^a") == celtypes.BoolType(True)
+    assert function_matches(text, compile_pattern("c$")) == celtypes.BoolType(True)
+    assert isinstance(function_matches(text, "("), CELEvalError)
+    info = compile_pattern.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 3, 2)
+
+
+def test_compile_pattern_no_re2(monkeypatch):
+    def no_module(name):
+        raise ImportError(f"No module named {name!r}")
+
+    compile_pattern.cache_clear()
+    monkeypatch.setattr(celpy.evaluation, "re2", None)
+    monkeypatch.setattr(celpy.evaluation.importlib, "import_module", no_module)
+    with pytest.raises(ImportError):
+        function_matches(celtypes.StringType("abc"), "^a")
+
+
 def test_function_size():
     container_1 = celtypes.ListType(
         [
@@ -379,6 +447,31 @@ def test_activation_bad_dot_name_syntax():
         a = Activation(package="x", vars={"x.y+z": celtypes.DoubleType(42.0)})
 
 
+def test_evaluation_activation():
+    """
+    GIVEN a base activation
+    WHEN activations for evaluations are created
+    THEN the context's values are layered over the base, which isn't changed
+    """
+    base = Activation(annotations={"a.b": celtypes.IntType})
+    assert evaluation_activation(base, {}) is base
+    activation = evaluation_activation(
+        base, {"a.b": celtypes.IntType(1), "c": celtypes.IntType(2)}
+    )
+    assert activation.identifiers.parent is base.identifiers
+    assert activation.resolve_variable("a")["b"].value == celtypes.IntType(1)
+    assert activation.resolve_variable("c") == celtypes.IntType(2)
+    assert base.resolve_variable("a")["b"].value == celtypes.IntType
+    with pytest.raises(KeyError):
+        base.resolve_variable("c")
+
+    base.budget = CostBudget(10)
+    base.budget.cost = 5
+    activation = evaluation_activation(base, {})
+    assert activation is not base
+    assert (activation.budget.limit, activation.budget.cost) == (10, 0)
+
+
 @pytest.fixture
 def mock_tree():
     tree = Mock(name="mock_tree", data="ident", children=[Mock(value=sentinel.ident)])
@@ -782,6 +875,22 @@ def test_eval_conditionaland_2_bad_override():
         evaluator.evaluate()
 
 
+@pytest.mark.parametrize(
+    "data, function, lit_value",
+    [
+        ("conditionaland", celtypes.logical_and, "false"),
+        ("conditionalor", celtypes.logical_or, "true"),
+    ],
+)
+def test_eval_conditional_short_circuit(data, function, lit_value):
+    """Assert ``false && invalid`` and ``true || invalid`` do not execute the invalid expression."""
+    tree = binop_2_tree(data, "BOOL_LIT", lit_value, lit_value)
+    tree.children[1] = sentinel.DO_NOT_EVALUATE
+    activation = Mock(resolve_function=Mock(return_value=function))
+    evaluator = Evaluator(tree, activation)
+    assert evaluator.evaluate() == celtypes.BoolType(lit_value == "true")
+
+
 def test_eval_conditionaland_0():
     tree = binop_broken_tree("conditionaland")
     activation = Mock()
@@ -1580,7 +1689,7 @@ def test_member_dot_arg_map(monkeypatch):
 
     tree = macro_member_tree("map")
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.ListType(
         [
             celtypes.StringType("hello"),
@@ -1598,7 +1707,7 @@ def test_member_dot_arg_filter(monkeypatch):
 
     tree = macro_member_tree("filter")
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.ListType(
         [
             celtypes.BoolType(True),
@@ -1615,7 +1724,7 @@ def test_member_dot_arg_all(monkeypatch):
 
     tree = macro_member_tree("all")
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.BoolType(False)
 
 
@@ -1638,7 +1747,7 @@ def test_member_dot_arg_exists(monkeypatch):
 
     tree = macro_member_tree("exists")
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.BoolType(True)
 
 
@@ -1651,7 +1760,7 @@ def test_member_dot_arg_exists_one(monkeypatch):
 
     tree = macro_member_tree("exists_one")
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.BoolType(True)
 
 
@@ -1675,7 +1784,7 @@ def test_member_dot_arg_reduce(monkeypatch):
         lark.Tree(data="expr", children=[]),  # Reduction function
     )
 
-    evaluator_0 = Evaluator(tree, activation=Mock())
+    evaluator_0 = Evaluator(tree, activation=Mock(budget=None))
     assert evaluator_0.member_dot_arg(tree.children[0]) == celtypes.IntType(9)
 
 
@@ -1704,6 +1813,44 @@ def test_member_dot_arg_min_error(monkeypatch):
     assert isinstance(result, CELEvalError)
 
 
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("cel.bind(x, 6, x * 7)", celtypes.IntType(42)),
+        ("cel.bind(x, 1, cel.bind(x, 2, x) + x)", celtypes.IntType(3)),
+        (
+            "cel.bind(x, 1, [2, 3].map(x, x))",
+            [celtypes.IntType(2), celtypes.IntType(3)],
+        ),
+        ("cel.bind(y, x, cel.bind(x, 1, y))", celtypes.IntType(5)),
+        ("cel.block([6, cel.index(0) * 7], cel.index(1))", celtypes.IntType(42)),
+        ("cel.block([1 / 0, 42], cel.index(1))", celtypes.IntType(42)),
+        (
+            "[1, 2].map(cel.iterVar(0, 0), cel.iterVar(0, 0) + 1)",
+            [celtypes.IntType(2), celtypes.IntType(3)],
+        ),
+    ],
+)
+def test_member_dot_arg_local_bindings(source, expected):
+    """
+    The cel.bind() and cel.block() extensions bind names in a lexical scope.
+    A binding that isn't used isn't evaluated.
+    """
+    tree = celparser.CELParser().parse(source)
+    activation = Activation(vars={"x": celtypes.IntType(5)})
+    assert Evaluator(tree, activation=activation).evaluate() == expected
+
+
+@pytest.mark.parametrize(
+    "source", ["cel.bind(x, 1)", "cel.bind(x.y, 1, 2)", "cel.block(1, 2)"]
+)
+def test_member_dot_arg_local_bindings_error(source):
+    """The cel.bind() and cel.block() extensions have a required structure."""
+    tree = celparser.CELParser().parse(source)
+    with pytest.raises(CELSyntaxError):
+        Evaluator(tree, activation=Activation()).evaluate()
+
+
 index_operator_params = [
     (
         celtypes.ListType(
@@ -2061,6 +2208,7 @@ def test_primary_dot_ident_not_found(monkeypatch):
                 children=[
                     lark.Token("IDENT", "name"),
                 ],
+                meta=Mock(line=1, column=1),
             )
         ],
         meta=Mock(line=1, column=1),
@@ -2188,6 +2336,7 @@ def test_primary_ident_bad(monkeypatch):
                 children=[
                     lark.Token("IDENT", "name"),
                 ],
+                meta=Mock(line=1, column=1),
             )
         ],
         meta=Mock(line=1, column=1),
@@ -2251,7 +2400,9 @@ def map_init_tree():
         data="primary",
         children=[
             lark.Tree(
-                data="map_lit", children=[lark.Tree(data="mapinits", children=[])]
+                data="map_lit",
+                children=[lark.Tree(data="mapinits", children=[])],
+                meta=Mock(line=1, column=1),
             )
         ],
         meta=Mock(line=1, column=1),
@@ -2387,8 +2538,8 @@ def test_fieldinits(monkeypatch):
 
         fieldinits     : IDENT ":" expr ("," IDENT ":" expr)*
     """
-    visit_children = Mock(return_value=[sentinel.literal_value])
-    monkeypatch.setattr(Evaluator, "visit_children", visit_children)
+    visit = Mock(return_value=sentinel.literal_value)
+    monkeypatch.setattr(Evaluator, "visit", visit)
 
     tree = lark.Tree(
         data="fieldinits",
@@ -2413,8 +2564,8 @@ def test_fieldinits_duplicate(monkeypatch):
 
         fieldinits     : IDENT ":" expr ("," IDENT ":" expr)*
     """
-    visit_children = Mock(return_value=[sentinel.literal_value])
-    monkeypatch.setattr(Evaluator, "visit_children", visit_children)
+    visit = Mock(return_value=sentinel.literal_value)
+    monkeypatch.setattr(Evaluator, "visit", visit)
 
     tree = lark.Tree(
         data="fieldinits",
@@ -2484,3 +2635,64 @@ def test_mapinits_bad():
     evaluator_0 = Evaluator(tree, activation=Mock())
     with pytest.raises(ValueError):
         evaluator_0.mapinits(tree)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "1 + 2 * 3 - 4 / 2 % 3",
+        "-x[0] < 0 && !(x.size() == 0)",
+        "x.map(n, n * 2).filter(n, n > 2)",
+        "x.all(n, n > 0) && x.exists(n, n == 2) && x.exists_one(n, n == 3)",
+        "x.exists(n, 1 / (n - 1) > 0)",
+        "x.reduce(s, n, 0, s + n) == 6 ? 'six' : 'other'",
+        "x.min()",
+        "has(m.a) && !has(m.b) ? m.a : m.b",
+        ".m.a + m['a']",
+        "{'k': x, 'v': [1, 2u, 3.0]}.k[1]",
+        "cel.bind(t, x.size(), [t, t].map(x, x + t))",
+        "cel.block([x.size(), cel.index(0) * 2], cel.index(1))",
+        "'abc'.startsWith('a') && size('abc') == 3 && dyn(3) == 3",
+        "1 / 0 || true",
+        "1 / 0",
+        "x[5]",
+        "m.b",
+        "undefined",
+        "undefined_function(1)",
+        "x.undefined_method()",
+        "x.map(n, 1 / 0)",
+        "{'a': 1, 'a': 2}",
+        "9223372036854775807 + 1",
+    ],
+)
+def test_closure_compiler(source):
+    """
+    GIVEN an expression
+    WHEN it's compiled to closures and evaluated
+    THEN the value, or the error, matches the Evaluator
+    """
+    celparser.CELParser.CEL_PARSER = None
+    tree = celparser.CELParser().parse(source)
+    context = {
+        "x": celtypes.ListType([celtypes.IntType(n) for n in (1, 2, 3)]),
+        "m": celtypes.MapType({celtypes.StringType("a"): celtypes.StringType("A")}),
+    }
+    try:
+        expected = Evaluator(tree, Activation()).evaluate(context)
+    except CELEvalError as ex:
+        expected = ex
+    cc = ClosureCompiler(tree, Activation())
+    for _ in range(2):
+        try:
+            value = cc.evaluate(context)
+        except CELEvalError as ex:
+            value = ex
+        if isinstance(expected, CELEvalError):
+            assert isinstance(value, CELEvalError)
+            assert (
+                value.args[0].split(" (in activation")[0]
+                == (expected.args[0].split(" (in activation")[0])
+            )
+        else:
+            assert value == expected
+            assert type(value) is type(expected)
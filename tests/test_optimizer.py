@@ -0,0 +1,582 @@
+# SPDX-Copyright: Copyright (c) Capital One Services, LLC
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2020 Capital One Services, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+
+"""
+Test the AST optimizations.
+"""
+
+import pytest
+
+import celpy
+from celpy.celparser import tree_dump
+from celpy.evaluation import passed_through
+from celpy.optimizer import (
+    OperandProfile,
+    OperandProfiler,
+    compile_patterns,
+    eliminate_common_subexpressions,
+    fold_constants,
+    fold_known,
+    index_membership,
+    reorder_operands,
+)
+
+
+def folded_values(ast):
+    return [node.children[0] for node in ast.find_data("folded")]
+
+
+def test_fold_constants():
+    """
+    GIVEN an AST with constant subtrees
+    WHEN constants are folded
+    THEN the largest constant subtrees are replaced, and the original AST is unchanged
+    """
+    env = celpy.Environment()
+    ast = env.compile('x > duration("86400s") + duration("1h") && x < duration("2d")')
+    before = tree_dump(ast)
+    optimized = fold_constants(ast)
+    assert folded_values(optimized) == [
+        celpy.celtypes.DurationType("90000s"),
+        celpy.celtypes.DurationType("2d"),
+    ]
+    assert tree_dump(optimized) == before
+    assert tree_dump(ast) == before
+    assert not list(ast.find_data("folded"))
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["x + 1", '"abc"', "has({'a': 1}.a)", "[x].map(n, n + 1)", "dyn(1)", "x.size()"],
+)
+def test_fold_nothing(text):
+    """
+    GIVEN an AST with no computed constant subtrees
+    WHEN constants are folded
+    THEN the original AST is returned
+    """
+    env = celpy.Environment()
+    ast = env.compile(text)
+    assert fold_constants(ast) is ast
+
+
+def test_fold_overridden_function():
+    """
+    GIVEN an AST with calls to a replaced function
+    WHEN constants are folded
+    THEN the calls to the replaced function, and the list it's given, are not folded
+    """
+
+    def size(value):
+        return celpy.celtypes.IntType(42)
+
+    env = celpy.Environment()
+    ast = env.compile('size("abc") + size([1, 2 * 3])')
+    optimized = fold_constants(ast, celpy.Activation(functions={"size": size}))
+    assert folded_values(optimized) == [celpy.celtypes.IntType(6)]
+    assert env.program(ast, {"size": size}, optimize=True).evaluate({}) == 84
+
+
+def test_fold_error():
+    """
+    GIVEN an AST with a constant subtree that is an error
+    WHEN constants are folded
+    THEN the error is the value of the folded node
+    """
+    env = celpy.Environment()
+    optimized = fold_constants(env.compile("x || 1 / 0 == 0"))
+    [error] = folded_values(optimized)
+    assert isinstance(error, celpy.CELEvalError)
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_fold_containers(runner_class):
+    """
+    GIVEN constant lists and maps
+    WHEN constants are folded
+    THEN only the operand of ``in`` is folded, and each evaluation has a new list or map
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    ast = env.compile("x in [1, 2] + [3] && [1, 2] + [3] == [1, 2, 3]")
+    assert folded_values(fold_constants(ast)) == [
+        celpy.celtypes.ListType([celpy.celtypes.IntType(n) for n in (1, 2, 3)]),
+        celpy.celtypes.BoolType(True),
+    ]
+    for text in ["[1, 2] + [3]", '{"a": [1 + 1]}', "[[1], [2]][0]"]:
+        expected = env.program(env.compile(text)).evaluate({})
+        prgm = env.program(env.compile(text), optimize=True)
+        first = prgm.evaluate({})
+        if isinstance(first, celpy.celtypes.MapType):
+            first[celpy.celtypes.StringType("a")].append(celpy.celtypes.IntType(99))
+        else:
+            first.append(celpy.celtypes.IntType(99))
+        assert prgm.evaluate({}) == expected
+
+
+@pytest.mark.parametrize("shaped", [False, True])
+def test_common_subexpressions(shaped):
+    """
+    GIVEN an AST with repeated subtrees
+    WHEN common subexpressions are eliminated
+    THEN each repeated subtree is replaced by a single memo node
+    """
+    celpy.CELParser.CEL_PARSER = None
+    celpy.CELParser.CEL_SHAPED_PARSER = None
+    env = celpy.Environment(shaped=shaped)
+    ast = env.compile("(x.y + 1) * (x.y + 1) > x.y && size(x.z) > 0 && size(x.z) < 9")
+    optimized = eliminate_common_subexpressions(ast)
+    memos = {
+        id(node): node for node in optimized.iter_subtrees() if node.data == "memo"
+    }
+    sources = sorted(" ".join(tree_dump(node).split()) for node in memos.values())
+    addition = "x.y + 1" if shaped else "(x.y + 1)"
+    assert sources == sorted([addition, "size(x.z)", "x", "x.y"])
+    assert tree_dump(optimized) == tree_dump(ast)
+    assert not list(ast.find_data("memo"))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "x.y + 1",
+        "f(1) + f(1)",
+        "a.map(n, x.y + n) == b.filter(n, x.y > n)",
+        "has(x.y) || x.z",
+    ],
+)
+def test_common_subexpressions_nothing(text):
+    """
+    GIVEN an AST with no repeated, pure subtrees outside macros and has()
+    WHEN common subexpressions are eliminated
+    THEN the original AST is returned
+    """
+    env = celpy.Environment()
+    ast = env.compile(text)
+    activation = celpy.Activation(functions={"f": lambda v: v})
+    assert eliminate_common_subexpressions(ast, activation) is ast
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+@pytest.mark.parametrize("shaped", [False, True])
+def test_program_optimize(runner_class, shaped):
+    """
+    GIVEN Environment
+    WHEN programs are created with optimize=True
+    THEN the results match the unoptimized programs
+    """
+    celpy.CELParser.CEL_PARSER = None
+    celpy.CELParser.CEL_SHAPED_PARSER = None
+    env = celpy.Environment(runner_class=runner_class, shaped=shaped)
+    context = {
+        "x": celpy.json_to_cel({"y": 2}),
+        "y": celpy.celtypes.BoolType(False),
+    }
+    expressions = [
+        "x.y * (2 + 3) > -1 && 'abc'.startsWith('a')",
+        "x.y in [1, 2, 3] ? {'a': [1, 2]}.a[1] + x.y : 0",
+        "[1, 2].map(n, n * (x.y + 1) * (2 - 1))",
+        'timestamp("2024-01-01T00:00:00Z") + duration("1h") > timestamp("2024-01-01T00:30:00Z")',
+        "y || 1 / 0 == 0 || true",
+        "true || 1 / 0 == 0",
+        "(x.y + 1) * (x.y + 1) > x.y || x.y == 0",
+        "x.z > 1 || x.z + x.z > 0 || true",
+    ]
+    for text in expressions:
+        ast = env.compile(text)
+        expected = env.program(ast).evaluate(context)
+        optimized = env.program(ast, optimize=True)
+        assert list(optimized.ast.find_data("folded")) or list(
+            optimized.ast.find_data("memo")
+        )
+        assert optimized.evaluate(context) == expected
+
+    prgm = env.program(env.compile("x.y + 1 / 0"), optimize=True)
+    with pytest.raises(celpy.CELEvalError):
+        prgm.evaluate(context)
+
+
+def test_common_subexpressions_source():
+    """
+    GIVEN a CompiledRunner
+    WHEN a program is created with optimize=True
+    THEN the transpiled source shows each memo slot
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=celpy.CompiledRunner)
+    prgm = env.program(env.compile("x.y * x.y"), optimize=True)
+    assert prgm.tp.source_text.splitlines() == [
+        "memo_0 = lambda activation: activation.x.get('y')",
+        "CEL = lambda activation: operator.mul("
+        "celpy.evaluation.memoize(activation.memo_slots, 0, memo_0, activation), "
+        "celpy.evaluation.memoize(activation.memo_slots, 0, memo_0, activation))",
+        "",
+        "def cel_program(activation):",
+        "    return celpy.evaluation.result(celpy.evaluation.slot_activation(activation), CEL)",
+    ]
+    assert prgm.evaluate({"x": celpy.json_to_cel({"y": 3})}) == 9
+    assert prgm.evaluate({"x": celpy.json_to_cel({"y": 4})}) == 16
+
+
+def test_operand_profile():
+    """
+    GIVEN an AST with chains of && and || operators
+    WHEN the operands are measured and reordered
+    THEN the operands that decide the result come first, and the original AST is unchanged
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment()
+    ast = env.compile("x > 0 && x > 5 && (x == 1 || x == 2)")
+    before = tree_dump(ast)
+    profile = OperandProfile(ast)
+    assert profile.plan() == [
+        ["x >  0", "x >  5", "(x ==  1 || x ==  2)"],
+        ["x ==  1", "x ==  2"],
+    ]
+    for x in [2, 3, 4]:
+        evaluator = OperandProfiler(ast, celpy.Activation(), profile)
+        assert evaluator.evaluate({"x": celpy.celtypes.IntType(x)}) is not None
+    [[always, never, sometimes], [one, two]] = profile.stats.values()
+    assert (always.evaluations, always.decided, always.selectivity) == (3, 0, 0.0)
+    assert (never.decided, sometimes.decided) == (3, 2)
+    assert (one.decided, two.decided) == (0, 1)
+    optimized = reorder_operands(ast, profile)
+    assert tree_dump(optimized) == "x >  5 && (x ==  2 || x ==  1) && x >  0"
+    assert tree_dump(ast) == before
+
+
+def test_operand_profile_overridden_function():
+    """
+    GIVEN a function provided for the && operator
+    WHEN the operands are profiled
+    THEN the chain isn't reordered
+    """
+    env = celpy.Environment()
+    ast = env.compile("x > 0 && x > 5")
+    activation = celpy.Activation(
+        functions={"_&&_": lambda a, b: celpy.celtypes.logical_and(a, b)}
+    )
+    assert OperandProfile(ast, activation).plan() == []
+
+
+def get_metrics(resource):
+    """Stands in for an expensive C7N function."""
+    metrics_calls.append(resource)
+    return celpy.celtypes.IntType(42)
+
+
+metrics_calls = []
+
+
+@pytest.mark.parametrize("shaped", [False, True])
+def test_program_adaptive(shaped):
+    """
+    GIVEN an expression with an expensive function call before a cheap, decisive comparison
+    WHEN a program is created with adaptive evaluations
+    THEN after the profiling evaluations, the expensive function isn't called
+    """
+    celpy.CELParser.CEL_PARSER = None
+    celpy.CELParser.CEL_SHAPED_PARSER = None
+    env = celpy.Environment(shaped=shaped)
+    metrics_calls.clear()
+    ast = env.compile('get_metrics(r) > 10 && r.state == "running"')
+    prgm = env.program(ast, {"get_metrics": get_metrics}, adaptive=3)
+    context = {"r": celpy.json_to_cel({"state": "stopped"})}
+    for _ in range(3):
+        assert prgm.evaluate(context) == celpy.celtypes.BoolType(False)
+    assert len(metrics_calls) == 3
+    assert prgm.order == [['r.state ==  "running"', "get_metrics(r) >  10"]]
+    assert prgm.evaluate(context) == celpy.celtypes.BoolType(False)
+    assert len(metrics_calls) == 3
+    running = {"r": celpy.json_to_cel({"state": "running"})}
+    assert prgm.evaluate(running) == celpy.celtypes.BoolType(True)
+    assert len(metrics_calls) == 4
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_program_adaptive_runner(runner_class):
+    """
+    GIVEN Environment
+    WHEN a program is created with adaptive evaluations
+    THEN the profiled evaluations and the reordered runner match the ordinary program
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    ast = env.compile("[1, 2, 3].all(n, n < x || n == 2) && x > 2 && x > 0")
+    prgm = env.program(ast, adaptive=2)
+    expected = env.program(ast)
+    for x in [1, 2, 4, 3]:
+        context = {"x": celpy.celtypes.IntType(x)}
+        assert prgm.evaluate(context) == expected.evaluate(context)
+    assert isinstance(prgm.runner, runner_class)
+    assert prgm.order[0][0] == "x >  2"
+    assert tree_dump(prgm.runner.ast).startswith("x >  2 && ")
+
+    plain = env.program(env.compile("x + 1"), adaptive=2)
+    assert isinstance(plain.runner, runner_class)
+    assert plain.order == []
+
+
+def test_index_membership():
+    """
+    GIVEN an AST with _in_ operators
+    WHEN constant lists are indexed
+    THEN each constant list is folded and indexed, and the original AST is unchanged
+    """
+    env = celpy.Environment()
+    ast = env.compile(
+        'x in ["a", "b"] && x in [y, "c"] && x in {"a": 1} && 2 in [1 + 1]'
+    )
+    before = tree_dump(ast)
+    indexed = index_membership(ast)
+    assert [
+        node.children[1].container
+        for node in indexed.find_data("relation_in")
+        if len(node.children) == 2
+    ] == [
+        celpy.celtypes.ListType(
+            [celpy.celtypes.StringType("a"), celpy.celtypes.StringType("b")]
+        ),
+        celpy.celtypes.ListType([celpy.celtypes.IntType(2)]),
+    ]
+    assert tree_dump(indexed) == before
+    assert tree_dump(ast) == before
+    assert not list(ast.find_data("folded"))
+
+    activation = celpy.Activation(functions={"_in_": lambda a, b: a in b})
+    assert index_membership(ast, activation) is ast
+    computed = env.compile("x in y + ['a']")
+    assert index_membership(computed) is computed
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+@pytest.mark.parametrize("optimize", [False, True])
+def test_program_membership(runner_class, optimize):
+    """
+    GIVEN Environment
+    WHEN programs with _in_ and a constant list are created
+    THEN the results match the unindexed runners, including errors
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    amis = ", ".join(f'"ami-{n:04d}"' for n in range(500))
+    expressions = [
+        f"x in [{amis}]",
+        "x in [1, 'ami-0042', 2u]",
+        "x in [1, 2, 3]",
+        "[x] in [['ami-0042'], []]",
+    ]
+    for text in expressions:
+        ast = env.compile(text)
+        prgm = env.program(ast, optimize=optimize)
+        assert list(prgm.ast.find_data("folded"))
+        plain = runner_class(env, ast)
+        for x in ["ami-0042", "ami-9999", 2]:
+            context = {"x": celpy.json_to_cel(x)}
+            try:
+                expected = plain.evaluate(context)
+            except celpy.CELEvalError:
+                with pytest.raises(celpy.CELEvalError):
+                    prgm.evaluate(context)
+            else:
+                assert prgm.evaluate(context) == expected
+
+
+def test_compile_patterns():
+    """
+    GIVEN an AST with matches() functions
+    WHEN patterns are compiled
+    THEN each string literal pattern is folded and compiled, and the original AST is unchanged
+    """
+    env = celpy.Environment()
+    ast = env.compile('x.matches("^a") && matches(x, "b$") && x.matches(y)')
+    before = tree_dump(ast)
+    compiled = compile_patterns(ast)
+    assert [value.pattern for value in folded_values(compiled)] == ["^a", "b$"]
+    assert tree_dump(compiled) == before
+    assert not list(ast.find_data("folded"))
+
+    activation = celpy.Activation(functions={"matches": lambda a, b: a == b})
+    assert compile_patterns(ast, activation) is ast
+    dynamic = env.compile("x.matches(y + 'a')")
+    assert compile_patterns(dynamic) is dynamic
+
+    with pytest.raises(celpy.CELEvalError) as exc_info:
+        compile_patterns(env.compile('x.size() > 1 ||\n  x.matches("(")'))
+    assert exc_info.value.args[0] == "match error"
+    assert (exc_info.value.line, exc_info.value.column) == (2, 13)
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_program_patterns(runner_class):
+    """
+    GIVEN Environment
+    WHEN programs with matches() are created
+    THEN literal patterns are compiled once, and invalid literal patterns are reported by program()
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    prgm = env.program(
+        env.compile('x.matches("^ami-") && matches(x, y)'), optimize=True
+    )
+    for x, y, expected in [
+        ("ami-1", "1$", True),
+        ("ami-1", "2$", False),
+        ("i-1", "1", False),
+    ]:
+        context = {"x": celpy.celtypes.StringType(x), "y": celpy.celtypes.StringType(y)}
+        assert prgm.evaluate(context) == celpy.celtypes.BoolType(expected)
+
+    with pytest.raises(celpy.CELEvalError):
+        env.program(env.compile('x.matches("[")'))
+
+
+KNOWN = {
+    "now": celpy.celtypes.IntType(10),
+    "params": celpy.celtypes.MapType(
+        {
+            celpy.celtypes.StringType("limit"): celpy.celtypes.IntType(2),
+            celpy.celtypes.StringType("flag"): celpy.celtypes.BoolType(False),
+            celpy.celtypes.StringType("ids"): celpy.celtypes.ListType(
+                [celpy.celtypes.StringType("i-1")]
+            ),
+        }
+    ),
+}
+
+
+@pytest.mark.parametrize(
+    "text, residual",
+    [
+        ("now > params.limit + 1", ""),
+        ("r.x > params.limit + 1", "r.x >  params.limit +  1"),
+        ("params.flag && r.x", ""),
+        ("r.x && params.flag", ""),
+        ("!params.flag || r.x", ""),
+        ("params.flag || r.x", "r.x"),
+        ("r.x || params.flag", "r.x"),
+        ("params.flag ? 1 : r.x", "r.x"),
+        ("params.limit > 1 ? r.x : 1", "r.x"),
+        ("r.x ? params.limit : 1", "r.x ? params.limit : 1"),
+        ("r.tags.exists(t, t == params.limit)", "r.tags.exists(t, t ==  params.limit)"),
+        (
+            "[1].exists(now, now == 1) && now > 1",
+            "[1].exists(now, now ==  1) && now >  1",
+        ),
+        ("has(params.limit) && has(r.x)", "has(r.x)"),
+    ],
+)
+def test_fold_known(text, residual):
+    """
+    GIVEN an AST and the values of some of its variables
+    WHEN the known subtrees are folded
+    THEN the residual AST has folded values, and simplified logic operators
+    """
+    env = celpy.Environment()
+    ast = env.compile(text)
+    before = tree_dump(ast)
+    folded = fold_known(ast, KNOWN)
+    assert tree_dump(ast) == before
+    if residual:
+        assert tree_dump(folded) == residual
+    else:
+        assert passed_through(folded).data == "folded"
+
+
+def test_fold_known_locals():
+    """
+    GIVEN an AST where a macro binds the name of a known variable
+    WHEN the known subtrees are folded
+    THEN the name isn't treated as known anywhere
+    """
+    env = celpy.Environment()
+    ast = env.compile("[1].exists(now, now == 1) && now > 1")
+    assert folded_values(fold_known(ast, KNOWN)) == []
+    ast = env.compile("cel.bind(params, 1, params + 1) > now")
+    assert folded_values(fold_known(ast, KNOWN)) == [celpy.celtypes.IntType(10)]
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+@pytest.mark.parametrize("optimize", [False, True])
+def test_partial_evaluate(runner_class, optimize):
+    """
+    GIVEN a program
+    WHEN it's partially evaluated with some of the variables
+    THEN the residual program, with the remaining variables, has the same result as the program
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    ast = env.compile(
+        "now > params.limit && r.x > params.limit + 1"
+        " && (params.flag || r.id in params.ids)"
+        " && r.tags.exists(t, t == 'a' || params.flag)"
+    )
+    prgm = env.program(ast, optimize=optimize)
+    residual = prgm.partial_evaluate(KNOWN)
+    assert type(residual) is runner_class
+    for x, id, tags in [(5, "i-1", ["a"]), (5, "i-2", ["a"]), (3, "i-1", ["a", "b"])]:
+        context = {
+            "r": celpy.json_to_cel({"x": x, "id": id, "tags": tags}),
+        }
+        assert residual.evaluate(context) == prgm.evaluate({**KNOWN, **context})
+    with pytest.raises(celpy.CELEvalError):
+        residual.evaluate({"r": celpy.json_to_cel({"x": 5})})
+
+    adaptive = env.program(ast, adaptive=2).partial_evaluate(KNOWN)
+    assert isinstance(adaptive, celpy.AdaptiveRunner)
+    assert adaptive.profile_evaluations == 2
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_partial_evaluate_locals(runner_class):
+    """
+    GIVEN a program where a macro binds the name of a known variable
+    WHEN it's partially evaluated
+    THEN the residual program uses the known value outside the macro
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    prgm = env.program(env.compile("[1, 2].exists(p, p == q) && resource.x == p"))
+    known = {"p": celpy.celtypes.IntType(2), "q": celpy.celtypes.IntType(1)}
+    context = {"resource": celpy.json_to_cel({"x": 2})}
+    assert prgm.evaluate({**known, **context}) == celpy.celtypes.BoolType(True)
+    assert prgm.partial_evaluate(known).evaluate(context) == celpy.celtypes.BoolType(
+        True
+    )
+    residual = prgm.partial_evaluate({"q": known["q"]}).partial_evaluate(
+        {"p": known["p"]}
+    )
+    assert residual.evaluate(context) == celpy.celtypes.BoolType(True)
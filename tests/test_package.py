@@ -19,6 +19,8 @@ that defines the package.
 """
 
 import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, call, sentinel
 
 import pytest
@@ -133,6 +135,7 @@ def mock_environment(monkeypatch):
     environment = Mock(
         package=sentinel.Package,
         annotations={},
+        code_cache=None,
     )
     return environment
 
@@ -160,6 +163,86 @@ def test_interp_runner(mock_environment):
     assert result == celpy.celtypes.BoolType(True)
 
 
+def test_interp_runner_reuse():
+    """
+    GIVEN an InterpretedRunner
+    WHEN it's evaluated several times
+    THEN one Evaluator is used, and each evaluation has only its own context's variables
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment()
+    prgm = env.program(env.compile("x + 1"))
+    evaluator = prgm.evaluator
+    assert prgm.evaluate({"x": celpy.celtypes.IntType(1)}) == celpy.celtypes.IntType(2)
+    with pytest.raises(celpy.CELEvalError):
+        prgm.evaluate({})
+    assert prgm.evaluate({"x": celpy.celtypes.IntType(2)}) == celpy.celtypes.IntType(3)
+    assert prgm.evaluator is evaluator
+    with pytest.raises(KeyError):
+        prgm.base_activation.resolve_variable("x")
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_evaluate_many(runner_class):
+    """
+    GIVEN a program with locals, macros, and common subexpressions
+    WHEN it's evaluated by several threads at the same time
+    THEN each evaluation has its own values
+    """
+    # Switch threads as often as possible.
+    switch_interval = sys.getswitchinterval()
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    prgm = env.program(
+        env.compile("cel.bind(v, x * 2, [1, 2].map(i, v + i)) + [x + 1, x + 1]"),
+        optimize=True,
+    )
+    contexts = [{"x": celpy.celtypes.IntType(n)} for n in range(200)]
+    expected = [[2 * n + 1, 2 * n + 2, n + 1, n + 1] for n in range(200)]
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert prgm.evaluate_many(contexts, executor=executor) == expected
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert prgm.evaluate_many(contexts[:5]) == expected[:5]
+
+    with pytest.raises(celpy.CELEvalError):
+        prgm.evaluate_many([{"x": celpy.celtypes.IntType(1)}, {}])
+
+
+def test_evaluate_many_adaptive():
+    """
+    GIVEN an adaptive program
+    WHEN it's evaluated by several threads at the same time
+    THEN the profiled evaluations are counted exactly, and the reordered runner is built once
+    """
+    built = []
+
+    class CountingRunner(celpy.InterpretedRunner):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            built.append(self)
+
+    switch_interval = sys.getswitchinterval()
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=CountingRunner)
+    prgm = env.program(env.compile("x > 100 || x % 2 == 0"), adaptive=50)
+    contexts = [{"x": celpy.celtypes.IntType(n)} for n in range(400)]
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = prgm.evaluate_many(contexts, executor=executor)
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert results == [n > 100 or n % 2 == 0 for n in range(400)]
+    assert prgm.profile.evaluations == 50
+    assert built == [prgm.runner]
+
+
 @pytest.fixture
 def mock_ast():
     # Reset the ClassVar CEL_PARSER.
@@ -184,9 +267,28 @@ def test_compiled_runner(mock_environment, mock_ast):
     functions = [a_function]
     r = celpy.CompiledRunner(mock_environment, mock_ast, functions)
     assert (
-        r.tp.source_text.strip()
-        == "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.BoolType(True))"
+        r.tp.source_text.strip() == "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)"
     )
+    assert r.tp.constants == [celpy.celtypes.BoolType(True)]
+    result = r.evaluate({"variable": sentinel.variable})
+    assert result == celpy.celtypes.BoolType(True)
+
+
+def test_closure_runner(mock_environment, mock_ast):
+    """
+    GIVEN Environment and AST
+    WHEN ClosureRunner created and evaluated
+    THEN Runner uses Environment, AST, and the compiled closures
+    """
+
+    def a_function():
+        return None
+
+    functions = [a_function]
+    r = celpy.ClosureRunner(mock_environment, mock_ast, functions)
+    assert r.cc.ast is mock_ast
     result = r.evaluate({"variable": sentinel.variable})
     assert result == celpy.celtypes.BoolType(True)
 
@@ -225,7 +327,9 @@ def test_environment(mock_parser, mock_runner, mock_activation):
 
     pgm = e.program(ast, functions=[sentinel.Function])
     assert pgm == mock_runner.return_value
-    assert mock_runner.mock_calls == [call(e, sentinel.AST, [sentinel.Function])]
+    assert mock_runner.mock_calls == [
+        call(e, sentinel.AST, [sentinel.Function], cost_limit=None)
+    ]
     assert e.annotations[sentinel.variable] == celpy.celtypes.UintType
 
     # OLD DESIGN
@@ -242,3 +346,252 @@ def test_environment(mock_parser, mock_runner, mock_activation):
     #         package=sentinel.package
     #     )
     # ]
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_program_cache(runner_class):
+    """
+    GIVEN Environment with a ProgramCache
+    WHEN the same text and functions are used
+    THEN the Runner is reused, and statistics are available
+    """
+    celpy.CELParser.CEL_PARSER = None
+    cache = celpy.ProgramCache(maxsize=2)
+    env = celpy.Environment(runner_class=runner_class, program_cache=cache)
+
+    def twice(x):
+        return x * 2
+
+    functions = {"twice": twice}
+    r_1 = env.cached_program("x + 1", functions)
+    r_2 = env.cached_program("x + 1", {"twice": twice})
+    assert r_1 is r_2
+    assert isinstance(r_1, runner_class)
+    assert r_2.evaluate({"x": celpy.celtypes.IntType(41)}) == celpy.celtypes.IntType(42)
+
+    def other_twice(x):
+        return x * 2
+
+    r_3 = env.cached_program("x + 1", {"twice": other_twice})
+    assert r_3 is not r_1
+    env.cached_program("42", None)
+    assert cache.cache_info() == celpy.CacheInfo(
+        hits=1, misses=3, evictions=1, maxsize=2, currsize=2
+    )
+    assert env.cached_program("x + 1", functions) is not r_1
+
+
+def test_program_cache_shared():
+    """
+    GIVEN two Environments with different packages sharing a ProgramCache
+    WHEN the same text is used
+    THEN each Environment has its own Runner
+    """
+    celpy.CELParser.CEL_PARSER = None
+    cache = celpy.ProgramCache()
+    env_a = celpy.Environment(package="a", program_cache=cache)
+    env_b = celpy.Environment(package="b", program_cache=cache)
+    r_a = env_a.cached_program("x")
+    r_b = env_b.cached_program("x")
+    assert r_a is not r_b
+    assert r_a is env_a.cached_program("x")
+    assert r_a.evaluate({"a.x": celpy.celtypes.IntType(1)}) == celpy.celtypes.IntType(1)
+    assert r_b.evaluate({"b.x": celpy.celtypes.IntType(2)}) == celpy.celtypes.IntType(2)
+
+
+def test_program_cache_bytes():
+    """GIVEN a ProgramCache limited by size; WHEN filled; THEN old Runners are evicted."""
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment()
+    size = celpy.ProgramCache.sizeof(env.program(env.compile("x + 1")))
+    cache = celpy.ProgramCache(maxsize=None, max_bytes=size * 3)
+    env.program_cache = cache
+    for n in range(8):
+        env.cached_program(f"x + {n}")
+    assert cache.evictions >= 5
+    assert len(cache.runners) <= 3
+    assert cache.nbytes <= size * 3
+    assert env.cached_program("x + 7") is env.cached_program("x + 7")
+
+
+def test_program_cache_disabled():
+    """GIVEN Environment without a ProgramCache; WHEN cached_program(); THEN a new Runner each time."""
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment()
+    assert env.cached_program("1 + 1") is not env.cached_program("1 + 1")
+    assert env.cached_program("1 + 1").evaluate({}) == celpy.celtypes.IntType(2)
+
+
+def test_code_cache(tmp_path, monkeypatch):
+    """
+    GIVEN a CodeCache
+    WHEN the same AST is used by a CompiledRunner in a new Environment
+    THEN the code is loaded, not transpiled, and the results match
+    """
+    celpy.CELParser.CEL_PARSER = None
+    text = "x.filter(n, n in [1, 2, 3] && string(n).matches('[12]')).size() + 1"
+    context = {"x": celpy.json_to_cel([1, 2, 3, 4])}
+    env = celpy.Environment(
+        runner_class=celpy.CompiledRunner, code_cache=celpy.CodeCache(tmp_path)
+    )
+    expected = env.program(env.compile(text)).evaluate(context)
+    assert expected == celpy.celtypes.IntType(3)
+    assert len(list(tmp_path.glob("*.code"))) == 1
+
+    def no_transpile(self):
+        raise AssertionError("transpiled")
+
+    monkeypatch.setattr(celpy.Transpiler, "transpile", no_transpile)
+    cache = celpy.CodeCache(tmp_path)
+    env = celpy.Environment(runner_class=celpy.CompiledRunner, code_cache=cache)
+    prgm = env.program(env.compile(text))
+    assert prgm.evaluate(context) == expected
+    assert cache.cache_info().hits == 1
+    with pytest.raises(ValueError):
+        prgm.tp.source_text
+
+
+def test_code_cache_key(tmp_path):
+    """GIVEN ASTs and functions; WHEN keys computed; THEN each distinct program has a distinct key."""
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=celpy.CompiledRunner)
+    cache = celpy.CodeCache(tmp_path)
+    ast = env.compile("x + 1 > y")
+
+    def f(x):
+        return x
+
+    def g(x):
+        return x
+
+    keys = {
+        cache.key(ast),
+        cache.key(env.compile("x + 2 > y")),
+        cache.key(ast, {"f": f}),
+        cache.key(ast, {"f": g}),
+        cache.key(celpy.fold_known(ast, {"y": celpy.celtypes.IntType(1)})),
+        cache.key(celpy.fold_known(ast, {"y": celpy.celtypes.IntType(2)})),
+        cache.key(celpy.check_types(ast, {"x": celpy.celtypes.IntType})),
+    }
+    assert len(keys) == 7
+    assert cache.key(env.compile("x + 1 > y")) == cache.key(ast)
+    assert cache.key(ast, [f]) == cache.key(ast, {"f": f})
+
+
+def test_code_cache_not_saved(tmp_path):
+    """
+    GIVEN a CodeCache
+    WHEN a program has a constant that can't be restored, or an entry is damaged
+    THEN the program is transpiled
+    """
+    celpy.CELParser.CEL_PARSER = None
+    cache = celpy.CodeCache(tmp_path)
+    env = celpy.Environment(runner_class=celpy.CompiledRunner, code_cache=cache)
+    ast = env.compile("timestamp('2020-01-01T00:00:00Z') < t")
+    env.program(ast, optimize=True)
+    assert list(tmp_path.glob("*.code")) == []
+
+    ast = env.compile("x + 1")
+    (tmp_path / f"{cache.key(ast)}.code").write_bytes(b"\x00damaged")
+    prgm = env.program(ast)
+    assert prgm.evaluate({"x": celpy.celtypes.IntType(1)}) == celpy.celtypes.IntType(2)
+    assert cache.cache_info().misses == 2
+    assert cache.get(cache.key(ast)) is not None
+
+
+def test_lazy_imports():
+    """GIVEN a fresh interpreter; WHEN celpy imported; THEN heavy dependencies are not imported."""
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, celpy; print(sorted({'pendulum', 're2', 'jmespath'} & set(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_compact_environment(runner_class):
+    """
+    GIVEN Environment with compact ASTs
+    WHEN programs are created and evaluated
+    THEN the results and error positions match the ordinary AST
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class, compact=True)
+    ast = env.compile("x.y + 1 > 2 ? [x.y].map(n, n * 2) : []")
+    assert isinstance(ast, runner_class.compact_tree_class)
+    prgm = env.program(ast)
+    assert prgm.evaluate(
+        {"x": celpy.celtypes.MapType({"y": celpy.celtypes.IntType(2)})}
+    ) == celpy.celtypes.ListType([celpy.celtypes.IntType(4)])
+
+    prgm = env.program(env.compile("1 / 0"))
+    with pytest.raises(celpy.CELEvalError):
+        prgm.evaluate({})
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_shaped_environment(runner_class):
+    """
+    GIVEN Environment with shaped ASTs
+    WHEN programs are created and evaluated
+    THEN the results match the ordinary AST
+    """
+    celpy.CELParser.CEL_SHAPED_PARSER = None
+    env = celpy.Environment(runner_class=runner_class, shaped=True)
+    ast = env.compile("x.y + 1 > 2 ? [x.y].map(n, n * 2) : [has(x.z), M{}]")
+    assert ast.data == "expr"
+    assert env.compile("x").data == "ident"
+    prgm = env.program(ast)
+    assert prgm.evaluate(
+        {"x": celpy.celtypes.MapType({"y": celpy.celtypes.IntType(2)})}
+    ) == celpy.celtypes.ListType([celpy.celtypes.IntType(4)])
+
+    prgm = env.program(env.compile("1 / 0 || true"))
+    assert prgm.evaluate({}) == celpy.celtypes.BoolType(True)
+    prgm = env.program(env.compile("1 / 0"))
+    with pytest.raises(celpy.CELEvalError):
+        prgm.evaluate({})
+
+
+@pytest.mark.parametrize(
+    "runner_class",
+    [celpy.InterpretedRunner, celpy.CompiledRunner, celpy.ClosureRunner],
+)
+def test_compile_many(runner_class):
+    """
+    GIVEN Environment
+    WHEN a batch of expressions with common subtrees is compiled
+    THEN the ASTs share nodes and evaluate as if compiled separately
+    """
+    celpy.CELParser.CEL_PARSER = None
+    env = celpy.Environment(runner_class=runner_class)
+    texts = [
+        "size(r.tags) > 0 && r.tags.exists(t, t == 'a')",
+        "size(r.tags) > 0 && r.tags.exists(t, t == 'b')",
+        "r.tags.map(t, t + '!').size() + r.tags.map(t, t + '!').size()",
+    ]
+    asts, report = env.compile_many(texts)
+    assert report.expressions == 3
+    assert report.shared_nodes > report.unique_nodes
+    context = {"r": celpy.json_to_cel({"tags": ["a"]})}
+    assert [env.program(ast).evaluate(context) for ast in asts] == [
+        env.program(env.compile(text)).evaluate(context) for text in texts
+    ]
@@ -27,12 +27,26 @@ TODO: Test *all* production rules separately here.
 TODO: Create a better, more useful tree-walker than the Tree.pretty() to examine the resulting AST.
 """
 
+import ast
+import re
+from pathlib import Path
 from textwrap import dedent
 
-from lark import Tree
+from lark import Token, Tree
 from pytest import *  # type: ignore[import]
 
-from celpy.celparser import CELParseError, CELParser, DumpAST, tree_dump
+from celpy.celparser import (
+    ASTCache,
+    CELParseError,
+    CELParser,
+    CompactTree,
+    DumpAST,
+    FastPathParser,
+    SharingReport,
+    compact,
+    share,
+    tree_dump,
+)
 
 
 @fixture
@@ -450,3 +464,182 @@ def test_tree_dump(parser):
         tree_dump(ast)
         == "- (3 *  4 +  5 -  1 /  2 %  3 ==  1) ? name[index] : f(1, 2) || false && true"
     )
+
+
+def test_ast_cache(tmp_path):
+    """
+    GIVEN an ASTCache; WHEN the same text is parsed twice; THEN the second is a hit with the same tree.
+    """
+    cache = ASTCache(tmp_path)
+    parser = CELParser(ast_cache=cache)
+    ast_1 = parser.parse("account.balance >= 42")
+    assert cache.cache_info().misses == 1
+    assert len(list(tmp_path.glob("*.ast"))) == 1
+
+    ast_2 = CELParser(ast_cache=ASTCache(tmp_path)).parse("account.balance >= 42")
+    assert ast_2 == ast_1
+    assert ast_2.meta.line == ast_1.meta.line
+    assert ast_2.meta.column == ast_1.meta.column
+    assert tree_dump(ast_2) == tree_dump(ast_1)
+
+    parser.parse("account.balance >= 42")
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (1, 1, 0)
+
+
+def test_ast_cache_key(tmp_path):
+    """GIVEN texts and tree classes; WHEN keys computed; THEN each is distinct."""
+
+    class OtherTree(Tree):
+        pass
+
+    cache = ASTCache(tmp_path)
+    keys = {
+        cache.key("x", Tree),
+        cache.key("y", Tree),
+        cache.key("x", OtherTree),
+    }
+    assert len(keys) == 3
+
+
+def test_ast_cache_eviction(tmp_path):
+    """GIVEN a small ASTCache; WHEN many texts are parsed; THEN old entries are evicted."""
+    cache = ASTCache(tmp_path, max_bytes=1024)
+    parser = CELParser(ast_cache=cache)
+    for n in range(10):
+        parser.parse(f"x + {n}")
+    info = cache.cache_info()
+    assert info.evictions > 0
+    assert info.currsize <= 1024
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.ast")) <= 1024
+
+
+def test_ast_cache_damaged(tmp_path):
+    """GIVEN a damaged ASTCache entry; WHEN parsed; THEN the entry is replaced."""
+    cache = ASTCache(tmp_path)
+    cache.path("x", Tree).write_bytes(b"\x00damaged")
+    ast = CELParser(ast_cache=cache).parse("x")
+    assert ast == CELParser().parse("x")
+    assert cache.cache_info().misses == 1
+    assert cache.get("x", Tree) == ast
+
+
+def test_parser_tables(tmp_path, monkeypatch):
+    """GIVEN CEL_PARSER_CACHE; WHEN parser created; THEN tables saved in the given directory."""
+    monkeypatch.setattr(CELParser, "CEL_PARSER", None)
+    monkeypatch.setenv("CEL_PARSER_CACHE", str(tmp_path))
+    assert CELParser.tables_path(Tree) == str(tmp_path / "lark.tree.Tree.tables")
+    CELParser().parse("1")
+    assert (tmp_path / "lark.tree.Tree.tables").exists()
+
+    monkeypatch.setattr(CELParser, "CEL_PARSER", None)
+    assert CELParser().parse("x + 1") == CELParser().parse("x + 1")
+
+    monkeypatch.setenv("CEL_PARSER_CACHE", "")
+    assert CELParser.tables_path(Tree) is None
+
+
+def test_compact(parser):
+    """GIVEN an AST; WHEN compacted; THEN an equivalent tree of CompactTree nodes."""
+    ast = parser.parse("account.balance >= 42 &&\n  f(account)")
+    compact_ast = compact(ast)
+    assert compact_ast == ast
+    assert all(isinstance(t, CompactTree) for t in compact_ast.iter_subtrees())
+    assert not hasattr(compact_ast, "__dict__") or not compact_ast.__dict__
+    assert (compact_ast.meta.line, compact_ast.meta.column) == (1, 1)
+    ident_arg = next(compact_ast.find_data("ident_arg"))
+    assert (ident_arg.meta.line, ident_arg.meta.column) == (2, 3)
+    assert tree_dump(compact_ast) == tree_dump(ast)
+    assert ASTCache.decode(ASTCache.encode(compact_ast), Tree) == ast
+
+
+def test_shaped(parser, tmp_path):
+    """GIVEN a shaped parser; WHEN parsing; THEN pass-through rules are inlined."""
+    shaped_parser = CELParser(shaped=True)
+    assert shaped_parser.parse("x") == Tree("ident", [Token("IDENT", "x")])
+    assert shaped_parser.parse("1") == Tree("literal", [Token("INT_LIT", "1")])
+
+    text = "a.b >= 42 && !f(x, [1, 2]) || y in {'k': -z} ? m{f: 1}[0] : (x)"
+    ast = parser.parse(text)
+    shaped_ast = shaped_parser.parse(text)
+    assert tree_dump(shaped_ast) == tree_dump(ast)
+    assert len(list(shaped_ast.iter_subtrees())) * 4 < len(list(ast.iter_subtrees()))
+    assert {t.data for t in shaped_ast.iter_subtrees()}.isdisjoint(
+        {"member", "primary"}
+    )
+
+    cache = ASTCache(tmp_path)
+    assert cache.key(text, Tree) != cache.key(text, Tree, shaped=True)
+    cached_parser = CELParser(ast_cache=cache, shaped=True)
+    cached_parser.parse(text)
+    assert cached_parser.parse(text) == shaped_ast
+    assert CELParser(ast_cache=cache).parse(text) == ast
+
+
+def test_share(parser):
+    """GIVEN ASTs with common subtrees; WHEN shared; THEN identical subtrees are one object."""
+    texts = ["has(r.Tags) && r.Tags.size() > 1", "has(r.Tags) || r.Tags.size() > 2"]
+    asts, report = share(parser.parse(text) for text in texts)
+    assert asts == [parser.parse(text) for text in texts]
+    assert [tree_dump(ast) for ast in asts] == [
+        tree_dump(parser.parse(text)) for text in texts
+    ]
+    has_0, has_1 = (next(ast.find_data("ident_arg")) for ast in asts)
+    assert has_0 is has_1
+    assert report.expressions == 2
+    assert report.nodes == sum(
+        len(list(parser.parse(text).iter_subtrees())) for text in texts
+    )
+    assert report.unique_nodes < report.nodes
+    assert report.shared_nodes == report.nodes - report.unique_nodes
+    assert report.unique_tokens < report.tokens
+    assert isinstance(report, SharingReport)
+
+
+def feature_expressions():
+    """The text of each ``When CEL expression ... is evaluated`` step in the features."""
+    features = Path(__file__).parent.parent / "features"
+    pattern = re.compile(r"When CEL expression (.*) is evaluated")
+    for path in sorted(features.glob("*.feature")):
+        for match in pattern.finditer(path.read_text()):
+            try:
+                yield ast.literal_eval(match.group(1))
+            except (SyntaxError, ValueError):
+                continue
+
+
+@mark.parametrize("shaped", [False, True])
+def test_fast_path_parity(shaped):
+    """
+    GIVEN the feature file expressions
+    WHEN parsed by the FastPathParser
+    THEN each expression recognized has the same tree and positions as the Lark parser
+    """
+    fast_parser = FastPathParser(Tree, shaped=shaped)
+    lark_parser = CELParser(shaped=shaped, fast_path=False)
+    recognized = 0
+    for text in feature_expressions():
+        fast_tree = fast_parser.parse(text)
+        if fast_tree is None:
+            continue
+        recognized += 1
+        assert ASTCache.encode(fast_tree) == ASTCache.encode(lark_parser.parse(text)), (
+            text
+        )
+    assert recognized > 100
+
+
+def test_fast_path():
+    """GIVEN CELParser; WHEN parsing trivial and other text; THEN fast path or Lark is used."""
+    fast_parser = FastPathParser()
+    text = 'resource.State.Name == "running" &&\n  size > 2u || x in y'
+    assert ASTCache.encode(fast_parser.parse(text)) == ASTCache.encode(
+        CELParser(fast_path=False).parse(text)
+    )
+    for text in ["x + 1", "-1", "a < b < c", r'"\n"', "r'x'", "0x1F", "if", "a.", ""]:
+        assert fast_parser.parse(text) is None, text
+    assert CELParser().parse("a < b < c") == CELParser(fast_path=False).parse(
+        "a < b < c"
+    )
+    with raises(CELParseError):
+        CELParser().parse("a.")
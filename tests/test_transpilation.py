@@ -153,61 +153,81 @@ def test_result_builder(mock_globals, mock_activation):
 literals = [
     (
         "3.14",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.DoubleType(3.14))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.DoubleType(3.14),
         "literal",
     ),
     (
         "42",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.IntType(42))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.IntType(42),
         "literal",
     ),
     (
         "42u",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.UintType(42))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.UintType(42),
         "literal",
     ),
     (
         'b"B"',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.BytesType(b'B'))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.BytesType(b"B"),
         "literal",
     ),
     (
         '"String"',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.StringType('String'))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.StringType("String"),
         "literal",
     ),
     (
         "true",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.BoolType(True))",
+        "CEL = lambda activation: constants[0]\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.BoolType(True),
         "literal",
     ),
     (
         "null",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: None)",
+        "CEL = lambda activation: None\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         None,  # celpy.celtypes.NullType(),
         "literal",
     ),
     (
         "[]",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.ListType([]))",
+        "CEL = lambda activation: celpy.celtypes.ListType([])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.ListType([]),
         "literal",
     ),
     (
         "{}",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.MapType([]))",
+        "CEL = lambda activation: celpy.celtypes.MapType([])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.MapType({}),
         "literal",
     ),
     (
         "bool",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: activation.bool)",
+        "CEL = lambda activation: activation.bool\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.BoolType,
         "literal",
     ),
@@ -216,19 +236,25 @@ literals = [
 function_params = [
     (
         "size([42, 6, 7])",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_size(celpy.celtypes.ListType([celpy.celtypes.IntType(42), celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)])))",
+        "CEL = lambda activation: celpy.evaluation.function_size(celpy.celtypes.ListType([constants[0], constants[1], constants[2]]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.IntType(3),
         "IDENT(_)",
     ),
     (
         "size(3.14)",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_size(celpy.celtypes.DoubleType(3.14)))",
+        "CEL = lambda activation: celpy.evaluation.function_size(constants[0])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "IDENT(_)",
     ),
     (
         '"hello".size()',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_size(celpy.celtypes.StringType('hello')))",
+        "CEL = lambda activation: celpy.evaluation.function_size(constants[0])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.IntType(5),
         "_.IDENT()",
     ),
@@ -237,19 +263,25 @@ function_params = [
 method_params = [
     (
         "[42, 6, 7].size()",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_size(celpy.celtypes.ListType([celpy.celtypes.IntType(42), celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)])))",
+        "CEL = lambda activation: celpy.evaluation.function_size(celpy.celtypes.ListType([constants[0], constants[1], constants[2]]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celpy.celtypes.IntType(3),
         "_.size()",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getMonth()',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getMonth(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))",
+        "CEL = lambda activation: celpy.evaluation.function_getMonth(celpy.celtypes.TimestampType(constants[0]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(1),
         "_._())",
     ),
     (
         '["hello", "world"].contains("hello")',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_contains(celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')]), celpy.celtypes.StringType('hello')))",
+        "CEL = lambda activation: celpy.evaluation.function_contains(celpy.celtypes.ListType([constants[0], constants[1]]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_._(_)",
     ),
@@ -259,32 +291,40 @@ macro_has_params = [
     (
         'has({"n": 355, "d": 113}.n)',
         dedent("""\
-        # ident_arg has:
-        ex_9_h = lambda activation: celpy.celtypes.MapType([(celpy.celtypes.StringType('n'), celpy.celtypes.IntType(355)), (celpy.celtypes.StringType('d'), celpy.celtypes.IntType(113))]).get('n')
-        ex_9 = lambda activation: not isinstance(celpy.evaluation.result(activation, ex_9_h), CELEvalError)
-        CEL = celpy.evaluation.result(base_activation, ex_9)"""),
+        ex_9_h = lambda activation: celpy.celtypes.MapType([(constants[0], constants[1]), (constants[2], constants[3])]).get('n')
+        ex_9 = lambda activation: celpy.celtypes.BoolType(not isinstance(celpy.evaluation.result(activation, ex_9_h), CELEvalError))
+        CEL = ex_9
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "has(_._)",
     ),
     (
         'has({"n": 355, "d": 113}.nope)',
         dedent("""\
-        # ident_arg has:
-        ex_9_h = lambda activation: celpy.celtypes.MapType([(celpy.celtypes.StringType('n'), celpy.celtypes.IntType(355)), (celpy.celtypes.StringType('d'), celpy.celtypes.IntType(113))]).get('nope')
-        ex_9 = lambda activation: not isinstance(celpy.evaluation.result(activation, ex_9_h), CELEvalError)
-        CEL = celpy.evaluation.result(base_activation, ex_9)"""),
+        ex_9_h = lambda activation: celpy.celtypes.MapType([(constants[0], constants[1]), (constants[2], constants[3])]).get('nope')
+        ex_9 = lambda activation: celpy.celtypes.BoolType(not isinstance(celpy.evaluation.result(activation, ex_9_h), CELEvalError))
+        CEL = ex_9
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(False),
         "has(_._)",
     ),
     (
         "dyn(6) * 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.mul(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: operator.mul(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "dyn(_)",
     ),
     (
         "type(dyn([1, 'one']))",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.TypeType(celpy.celtypes.ListType([celpy.celtypes.IntType(1), celpy.celtypes.StringType('one')])))",
+        "CEL = lambda activation: celpy.celtypes.TypeType(celpy.celtypes.ListType([constants[0], constants[1]]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.ListType,
         "dyn(_)",
     ),
@@ -293,19 +333,25 @@ macro_has_params = [
 unary_operator_params = [
     (
         "! true",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.logical_not(celpy.celtypes.BoolType(True)))",
+        "CEL = lambda activation: celpy.celtypes.logical_not(constants[0])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(False),
         "!_",
     ),
     (
         "- 42",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.neg(celpy.celtypes.IntType(42)))",
+        "CEL = lambda activation: operator.neg(constants[0])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(-42),
         "-_",
     ),
     (
         "- -9223372036854775808",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.neg(celpy.celtypes.IntType(-9223372036854775808)))",
+        "CEL = lambda activation: operator.neg(constants[0])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "-_",
     ),
@@ -314,104 +360,138 @@ unary_operator_params = [
 binary_operator_params = [
     (
         "6 < 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_lt(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: celpy.evaluation.bool_lt(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_<_",
     ),
     (
         "6 <= 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_le(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: celpy.evaluation.bool_le(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_<=_",
     ),
     (
         "6 > 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_gt(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: celpy.evaluation.bool_gt(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(False),
         "_>_",
     ),
     (
         "6 >= 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_ge(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: celpy.evaluation.bool_ge(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(False),
         "_>=_",
     ),
     (
         "42 == 42",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(celpy.celtypes.IntType(42), celpy.celtypes.IntType(42)))",
+        "CEL = lambda activation: celpy.evaluation.bool_eq(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_==_",
     ),
     (
         "[] == []",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(celpy.celtypes.ListType([]), celpy.celtypes.ListType([])))",
+        "CEL = lambda activation: celpy.evaluation.bool_eq(celpy.celtypes.ListType([]), celpy.celtypes.ListType([]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_==_",
     ),
     (
         "42 != 42",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_ne(celpy.celtypes.IntType(42), celpy.celtypes.IntType(42)))",
+        "CEL = lambda activation: celpy.evaluation.bool_ne(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(False),
         "_!=_",
     ),
     (
         '"b" in ["a", "b", "c"]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.operator_in(celpy.celtypes.StringType('b'), celpy.celtypes.ListType([celpy.celtypes.StringType('a'), celpy.celtypes.StringType('b'), celpy.celtypes.StringType('c')])))",
+        "CEL = lambda activation: celpy.evaluation.operator_in(constants[0], celpy.celtypes.ListType([constants[1], constants[2], constants[3]]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.BoolType(True),
         "_in_",
     ),
     (
         "40 + 2",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.add(celpy.celtypes.IntType(40), celpy.celtypes.IntType(2)))",
+        "CEL = lambda activation: operator.add(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "_+_",
     ),
     (
         "44 - 2",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.sub(celpy.celtypes.IntType(44), celpy.celtypes.IntType(2)))",
+        "CEL = lambda activation: operator.sub(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "_-_",
     ),
     (
         "6 * 7",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.mul(celpy.celtypes.IntType(6), celpy.celtypes.IntType(7)))",
+        "CEL = lambda activation: operator.mul(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "_*_",
     ),
     (
         "84 / 2",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.truediv(celpy.celtypes.IntType(84), celpy.celtypes.IntType(2)))",
+        "CEL = lambda activation: operator.truediv(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "_/_",
     ),
     (
         "85 % 43",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.mod(celpy.celtypes.IntType(85), celpy.celtypes.IntType(43)))",
+        "CEL = lambda activation: operator.mod(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "_%_",
     ),
     # A few error examples
     (
         '42 in ["a", "b", "c"]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.operator_in(celpy.celtypes.IntType(42), celpy.celtypes.ListType([celpy.celtypes.StringType('a'), celpy.celtypes.StringType('b'), celpy.celtypes.StringType('c')])))",
+        "CEL = lambda activation: celpy.evaluation.operator_in(constants[0], celpy.celtypes.ListType([constants[1], constants[2], constants[3]]))\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_in_",
     ),
     (
         "9223372036854775807 + 1",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.add(celpy.celtypes.IntType(9223372036854775807), celpy.celtypes.IntType(1)))",
+        "CEL = lambda activation: operator.add(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_+_",
     ),
     (
         "9223372036854775807 * 2",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.mul(celpy.celtypes.IntType(9223372036854775807), celpy.celtypes.IntType(2)))",
+        "CEL = lambda activation: operator.mul(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_*_",
     ),
     (
         "84 / 0",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.truediv(celpy.celtypes.IntType(84), celpy.celtypes.IntType(0)))",
+        "CEL = lambda activation: operator.truediv(constants[0], constants[1])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_/_",
     ),
@@ -421,124 +501,146 @@ short_circuit_params = [
     (
         "true || (3 / 0 != 0)",
         dedent("""\
-        # conditionalor:
-        ex_1_l = lambda activation: celpy.celtypes.BoolType(True)
-        ex_1_r = lambda activation: celpy.evaluation.bool_ne(operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0)), celpy.celtypes.IntType(0))
-        ex_1 = lambda activation: celpy.celtypes.logical_or(celpy.evaluation.result(activation, ex_1_l), celpy.evaluation.result(activation, ex_1_r))
-        CEL = celpy.evaluation.result(base_activation, ex_1)"""),
+        ex_1_l = lambda activation: constants[0]
+        ex_1_r = lambda activation: celpy.evaluation.bool_ne(operator.truediv(constants[1], constants[2]), constants[3])
+        ex_1 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_or, activation, ex_1_l, ex_1_r)
+        CEL = ex_1
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_||_",
     ),
     (
         "(3 / 0 != 0) || true",
         dedent("""\
-        # conditionalor:
-        ex_1_l = lambda activation: celpy.evaluation.bool_ne(operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0)), celpy.celtypes.IntType(0))
-        ex_1_r = lambda activation: celpy.celtypes.BoolType(True)
-        ex_1 = lambda activation: celpy.celtypes.logical_or(celpy.evaluation.result(activation, ex_1_l), celpy.evaluation.result(activation, ex_1_r))
-        CEL = celpy.evaluation.result(base_activation, ex_1)"""),
+        ex_1_l = lambda activation: celpy.evaluation.bool_ne(operator.truediv(constants[0], constants[1]), constants[2])
+        ex_1_r = lambda activation: constants[3]
+        ex_1 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_or, activation, ex_1_l, ex_1_r)
+        CEL = ex_1
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_||_",
     ),
     (
         "false || (3 / 0 != 0)",
         dedent("""\
-        # conditionalor:
-        ex_1_l = lambda activation: celpy.celtypes.BoolType(False)
-        ex_1_r = lambda activation: celpy.evaluation.bool_ne(operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0)), celpy.celtypes.IntType(0))
-        ex_1 = lambda activation: celpy.celtypes.logical_or(celpy.evaluation.result(activation, ex_1_l), celpy.evaluation.result(activation, ex_1_r))
-        CEL = celpy.evaluation.result(base_activation, ex_1)"""),
+        ex_1_l = lambda activation: constants[0]
+        ex_1_r = lambda activation: celpy.evaluation.bool_ne(operator.truediv(constants[1], constants[2]), constants[3])
+        ex_1 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_or, activation, ex_1_l, ex_1_r)
+        CEL = ex_1
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_||_",
     ),
     (
         "(3 / 0 != 0) || false",
         dedent("""\
-        # conditionalor:
-        ex_1_l = lambda activation: celpy.evaluation.bool_ne(operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0)), celpy.celtypes.IntType(0))
-        ex_1_r = lambda activation: celpy.celtypes.BoolType(False)
-        ex_1 = lambda activation: celpy.celtypes.logical_or(celpy.evaluation.result(activation, ex_1_l), celpy.evaluation.result(activation, ex_1_r))
-        CEL = celpy.evaluation.result(base_activation, ex_1)"""),
+        ex_1_l = lambda activation: celpy.evaluation.bool_ne(operator.truediv(constants[0], constants[1]), constants[2])
+        ex_1_r = lambda activation: constants[3]
+        ex_1 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_or, activation, ex_1_l, ex_1_r)
+        CEL = ex_1
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_||_",
     ),
     (
         "true && 3 / 0",
         dedent("""\
-        # conditionaland:
-        ex_2_l = lambda activation: celpy.celtypes.BoolType(True)
-        ex_2_r = lambda activation: operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0))
-        ex_2 = lambda activation: celpy.celtypes.logical_and(celpy.evaluation.result(activation, ex_2_l), celpy.evaluation.result(activation, ex_2_r))
-        CEL = celpy.evaluation.result(base_activation, ex_2)"""),
+        ex_2_l = lambda activation: constants[0]
+        ex_2_r = lambda activation: operator.truediv(constants[1], constants[2])
+        ex_2 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_and, activation, ex_2_l, ex_2_r)
+        CEL = ex_2
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_&&_",
     ),
     (
         "false && 3 / 0",
         dedent("""\
-        # conditionaland:
-        ex_2_l = lambda activation: celpy.celtypes.BoolType(False)
-        ex_2_r = lambda activation: operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0))
-        ex_2 = lambda activation: celpy.celtypes.logical_and(celpy.evaluation.result(activation, ex_2_l), celpy.evaluation.result(activation, ex_2_r))
-        CEL = celpy.evaluation.result(base_activation, ex_2)"""),
+        ex_2_l = lambda activation: constants[0]
+        ex_2_r = lambda activation: operator.truediv(constants[1], constants[2])
+        ex_2 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_and, activation, ex_2_l, ex_2_r)
+        CEL = ex_2
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celpy.celtypes.BoolType(False),
         "_&&_",
     ),
     (
         "3 / 0 && true",
         dedent("""\
-        # conditionaland:
-        ex_2_l = lambda activation: operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0))
-        ex_2_r = lambda activation: celpy.celtypes.BoolType(True)
-        ex_2 = lambda activation: celpy.celtypes.logical_and(celpy.evaluation.result(activation, ex_2_l), celpy.evaluation.result(activation, ex_2_r))
-        CEL = celpy.evaluation.result(base_activation, ex_2)"""),
+        ex_2_l = lambda activation: operator.truediv(constants[0], constants[1])
+        ex_2_r = lambda activation: constants[2]
+        ex_2 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_and, activation, ex_2_l, ex_2_r)
+        CEL = ex_2
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_&&_",
     ),
     (
         "3 / 0 && false",
         dedent("""\
-        # conditionaland:
-        ex_2_l = lambda activation: operator.truediv(celpy.celtypes.IntType(3), celpy.celtypes.IntType(0))
-        ex_2_r = lambda activation: celpy.celtypes.BoolType(False)
-        ex_2 = lambda activation: celpy.celtypes.logical_and(celpy.evaluation.result(activation, ex_2_l), celpy.evaluation.result(activation, ex_2_r))
-        CEL = celpy.evaluation.result(base_activation, ex_2)"""),
+        ex_2_l = lambda activation: operator.truediv(constants[0], constants[1])
+        ex_2_r = lambda activation: constants[2]
+        ex_2 = lambda activation: celpy.evaluation.short_circuit(celpy.celtypes.logical_and, activation, ex_2_l, ex_2_r)
+        CEL = ex_2
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celpy.celtypes.BoolType(False),
         "_&&_",
     ),
     (
         "(13 % 2 != 0) ? (13 * 3 + 1) : (13 / 0)",
         dedent("""\
-        # expr:
-        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(celpy.celtypes.IntType(13), celpy.celtypes.IntType(2)), celpy.celtypes.IntType(0))
-        ex_0_l = lambda activation: operator.add(operator.mul(celpy.celtypes.IntType(13), celpy.celtypes.IntType(3)), celpy.celtypes.IntType(1))
-        ex_0_r = lambda activation: operator.truediv(celpy.celtypes.IntType(13), celpy.celtypes.IntType(0))
+        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(constants[0], constants[1]), constants[2])
+        ex_0_l = lambda activation: operator.add(operator.mul(constants[3], constants[4]), constants[5])
+        ex_0_r = lambda activation: operator.truediv(constants[6], constants[7])
         ex_0 = lambda activation: celpy.celtypes.logical_condition(celpy.evaluation.result(activation, ex_0_c), celpy.evaluation.result(activation, ex_0_l), celpy.evaluation.result(activation, ex_0_r))
-        CEL = celpy.evaluation.result(base_activation, ex_0)"""),
+        CEL = ex_0
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(40),
         "_?_:_",
     ),
     (
         "(12 % 2 != 0) ? (12 / 0) : (12 / 2)",
         dedent("""\
-        # expr:
-        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(celpy.celtypes.IntType(12), celpy.celtypes.IntType(2)), celpy.celtypes.IntType(0))
-        ex_0_l = lambda activation: operator.truediv(celpy.celtypes.IntType(12), celpy.celtypes.IntType(0))
-        ex_0_r = lambda activation: operator.truediv(celpy.celtypes.IntType(12), celpy.celtypes.IntType(2))
+        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(constants[0], constants[1]), constants[2])
+        ex_0_l = lambda activation: operator.truediv(constants[3], constants[4])
+        ex_0_r = lambda activation: operator.truediv(constants[5], constants[6])
         ex_0 = lambda activation: celpy.celtypes.logical_condition(celpy.evaluation.result(activation, ex_0_c), celpy.evaluation.result(activation, ex_0_l), celpy.evaluation.result(activation, ex_0_r))
-        CEL = celpy.evaluation.result(base_activation, ex_0)"""),
+        CEL = ex_0
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(6),
         "_?_:_",
     ),
     (
         "(14 % 0 != 0) ? (14 * 3 + 1) : (14 / 2)",
         dedent("""\
-        # expr:
-        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(celpy.celtypes.IntType(14), celpy.celtypes.IntType(0)), celpy.celtypes.IntType(0))
-        ex_0_l = lambda activation: operator.add(operator.mul(celpy.celtypes.IntType(14), celpy.celtypes.IntType(3)), celpy.celtypes.IntType(1))
-        ex_0_r = lambda activation: operator.truediv(celpy.celtypes.IntType(14), celpy.celtypes.IntType(2))
+        ex_0_c = lambda activation: celpy.evaluation.bool_ne(operator.mod(constants[0], constants[1]), constants[2])
+        ex_0_l = lambda activation: operator.add(operator.mul(constants[3], constants[4]), constants[5])
+        ex_0_r = lambda activation: operator.truediv(constants[6], constants[7])
         ex_0 = lambda activation: celpy.celtypes.logical_condition(celpy.evaluation.result(activation, ex_0_c), celpy.evaluation.result(activation, ex_0_l), celpy.evaluation.result(activation, ex_0_r))
-        CEL = celpy.evaluation.result(base_activation, ex_0)"""),
+        CEL = ex_0
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_?_:_",
     ),
@@ -548,7 +650,10 @@ member_dot_params = [
     (
         '{"field": 42}.field',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.celtypes.MapType([(celpy.celtypes.StringType('field'), celpy.celtypes.IntType(42))]).get('field'))"""),
+         CEL = lambda activation: celpy.celtypes.MapType([(constants[0], constants[1])]).get('field')
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(42),
         "_._",
     ),
@@ -556,7 +661,10 @@ member_dot_params = [
     (
         "protobuf_message{field: 42}.field",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.protobuf_message([('field', celpy.celtypes.IntType(42))]).get('field'))"""),
+        CEL = lambda activation: activation.protobuf_message([('field', constants[0])]).get('field')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(42),
         "_._",
     ),
@@ -564,7 +672,10 @@ member_dot_params = [
     (
         "protobuf_message{field: 42}.not_the_name",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.protobuf_message([('field', celpy.celtypes.IntType(42))]).get('not_the_name'))"""),
+        CEL = lambda activation: activation.protobuf_message([('field', constants[0])]).get('not_the_name')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_._",
     ),
@@ -572,14 +683,20 @@ member_dot_params = [
     (
         "name1.name2",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.name1.get('name2'))"""),
+        CEL = lambda activation: activation.name1.get('name2')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType,
         "_._",
     ),
     (
         "a.b.c",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.a.get('b').get('c'))"""),
+        CEL = lambda activation: activation.a.get('b').get('c')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.StringType("yeah"),
         "_._",
     ),
@@ -588,31 +705,41 @@ member_dot_params = [
 member_item_params = [
     (
         '["hello", "world"][0]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.getitem(celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')]), celpy.celtypes.IntType(0)))",
+        "CEL = lambda activation: operator.getitem(celpy.celtypes.ListType([constants[0], constants[1]]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.StringType("hello"),
         "_.[_]",
     ),
     (
         '["hello", "world"][42]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.getitem(celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')]), celpy.celtypes.IntType(42)))",
+        "CEL = lambda activation: operator.getitem(celpy.celtypes.ListType([constants[0], constants[1]]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_.[_]",
     ),
     (
         '["hello", "world"][3.14]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.getitem(celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')]), celpy.celtypes.DoubleType(3.14)))",
+        "CEL = lambda activation: operator.getitem(celpy.celtypes.ListType([constants[0], constants[1]]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_.[_]",
     ),
     (
         '{"hello": "world"}["hello"]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.getitem(celpy.celtypes.MapType([(celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world'))]), celpy.celtypes.StringType('hello')))",
+        "CEL = lambda activation: operator.getitem(celpy.celtypes.MapType([(constants[0], constants[1])]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.StringType("world"),
         "_.[_]",
     ),
     (
         '{"hello": "world"}["world"]',
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: operator.getitem(celpy.celtypes.MapType([(celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world'))]), celpy.celtypes.StringType('world')))",
+        "CEL = lambda activation: operator.getitem(celpy.celtypes.MapType([(constants[0], constants[1])]), constants[2])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         CELEvalError,
         "_.[_]",
     ),
@@ -623,13 +750,17 @@ member_object_params = [
     # Must match the mock_protobuf fixture
     (
         "protobuf_message{field: 42}",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: activation.protobuf_message([('field', celpy.celtypes.IntType(42))]))",
+        "CEL = lambda activation: activation.protobuf_message([('field', constants[0])])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         sentinel.MESSAGE,
         "_.{_}",
     ),
     (
         "protobuf_message{}",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: activation.protobuf_message([]))",
+        "CEL = lambda activation: activation.protobuf_message([])\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         sentinel.MESSAGE,
         "_.{_}",
     ),
@@ -639,91 +770,130 @@ member_dot_arg_method = [
     (
         'timestamp("2009-02-13T23:31:30Z").getMonth()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getMonth(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getMonth(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(1),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getDate()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getDate(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getDate(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(13),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getDayOfMonth()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getDayOfMonth(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getDayOfMonth(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(12),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getDayOfWeek()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getDayOfWeek(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getDayOfWeek(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(5),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getDayOfYear()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getDayOfYear(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getDayOfYear(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(43),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getFullYear()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getFullYear(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getFullYear(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(2009),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getHours()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getHours(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getHours(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(23),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getMilliseconds()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getMilliseconds(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getMilliseconds(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(0),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getMinutes()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getMinutes(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getMinutes(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(31),
         "_._(_)",
     ),
     (
         'timestamp("2009-02-13T23:31:30Z").getSeconds()',
         dedent("""\
-         CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getSeconds(celpy.celtypes.TimestampType(celpy.celtypes.StringType('2009-02-13T23:31:30Z'))))"""),
+         CEL = lambda activation: celpy.evaluation.function_getSeconds(celpy.celtypes.TimestampType(constants[0]))
+
+         def cel_program(activation):
+             return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(30),
         "_._(_)",
     ),
     (
         '["hello", "world"].contains("hello")',
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_contains(celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')]), celpy.celtypes.StringType('hello')))"""),
+        CEL = lambda activation: celpy.evaluation.function_contains(celpy.celtypes.ListType([constants[0], constants[1]]), constants[2])
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         '"hello".startsWith("h")',
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_startsWith(celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('h')))"""),
+        CEL = lambda activation: celpy.evaluation.function_startsWith(constants[0], constants[1])
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         '"hello".endsWith("o")',
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_endsWith(celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('o')))"""),
+        CEL = lambda activation: celpy.evaluation.function_endsWith(constants[0], constants[1])
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
@@ -733,77 +903,91 @@ member_dot_arg_method_macro = [
     (
         '["hello", "world"].map(x, x) == ["hello", "world"]',
         dedent("""\
-        # member_dot_arg map:
-        ex_10_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')])
+        ex_10_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
         ex_10_x = lambda activation: activation.x
         ex_10 = lambda activation: celpy.evaluation.macro_map(activation, 'x', ex_10_x, ex_10_l)
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([celpy.celtypes.StringType('hello'), celpy.celtypes.StringType('world')])))"""),
+        CEL = lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([constants[2], constants[3]]))
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         "[true, false].filter(x, x) == [true]",
         dedent("""\
-        # member_dot_arg filter:
-        ex_10_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.BoolType(True), celpy.celtypes.BoolType(False)])
+        ex_10_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
         ex_10_x = lambda activation: activation.x
         ex_10 = lambda activation: celpy.evaluation.macro_filter(activation, 'x', ex_10_x, ex_10_l)
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([celpy.celtypes.BoolType(True)])))"""),
+        CEL = lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([constants[2]]))
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         "[42, 0].filter(x, 2 / x > 0) == [42]",
         dedent("""\
-        # member_dot_arg filter:
-        ex_10_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.IntType(42), celpy.celtypes.IntType(0)])
-        ex_10_x = lambda activation: celpy.evaluation.bool_gt(operator.truediv(celpy.celtypes.IntType(2), activation.x), celpy.celtypes.IntType(0))
+        ex_10_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
+        ex_10_x = lambda activation: celpy.evaluation.bool_gt(operator.truediv(constants[2], activation.x), constants[3])
         ex_10 = lambda activation: celpy.evaluation.macro_filter(activation, 'x', ex_10_x, ex_10_l)
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([celpy.celtypes.IntType(42)])))"""),
+        CEL = lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.ListType([constants[4]]))
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_._(_)",
     ),
     (
         "[true, false].exists_one(x, x)",
         dedent("""\
-        # member_dot_arg exists_one:
-        ex_8_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.BoolType(True), celpy.celtypes.BoolType(False)])
+        ex_8_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
         ex_8_x = lambda activation: activation.x
         ex_8 = lambda activation: celpy.evaluation.macro_exists_one(activation, 'x', ex_8_x, ex_8_l)
-        CEL = celpy.evaluation.result(base_activation, ex_8)"""),
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         "[42, 0].exists_one(x, 2 / x > 0) == true",
         dedent("""\
-        # member_dot_arg exists_one:
-        ex_10_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.IntType(42), celpy.celtypes.IntType(0)])
-        ex_10_x = lambda activation: celpy.evaluation.bool_gt(operator.truediv(celpy.celtypes.IntType(2), activation.x), celpy.celtypes.IntType(0))
+        ex_10_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
+        ex_10_x = lambda activation: celpy.evaluation.bool_gt(operator.truediv(constants[2], activation.x), constants[3])
         ex_10 = lambda activation: celpy.evaluation.macro_exists_one(activation, 'x', ex_10_x, ex_10_l)
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.bool_eq(ex_10(activation), celpy.celtypes.BoolType(True)))"""),
+        CEL = lambda activation: celpy.evaluation.bool_eq(ex_10(activation), constants[4])
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         CELEvalError,
         "_._(_)",
     ),
     (
         "[true, false].exists(x, x)",
         dedent("""\
-        # member_dot_arg exists:
-        ex_8_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.BoolType(True), celpy.celtypes.BoolType(False)])
+        ex_8_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
         ex_8_x = lambda activation: activation.x
         ex_8 = lambda activation: celpy.evaluation.macro_exists(activation, 'x', ex_8_x, ex_8_l)
-        CEL = celpy.evaluation.result(base_activation, ex_8)"""),
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(True),
         "_._(_)",
     ),
     (
         "[true, false].all(x, x)",
         dedent("""\
-        # member_dot_arg all:
-        ex_8_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.BoolType(True), celpy.celtypes.BoolType(False)])
+        ex_8_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1]])
         ex_8_x = lambda activation: activation.x
         ex_8 = lambda activation: celpy.evaluation.macro_all(activation, 'x', ex_8_x, ex_8_l)
-        CEL = celpy.evaluation.result(base_activation, ex_8)"""),
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(False),
         "_._(_)",
     ),
@@ -811,11 +995,13 @@ member_dot_arg_method_macro = [
     (
         "[1, 'foo', 3].exists(e, e != '1')",
         dedent("""\
-        # member_dot_arg exists:
-        ex_8_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.IntType(1), celpy.celtypes.StringType('foo'), celpy.celtypes.IntType(3)])
-        ex_8_x = lambda activation: celpy.evaluation.bool_ne(activation.e, celpy.celtypes.StringType('1'))
+        ex_8_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1], constants[2]])
+        ex_8_x = lambda activation: celpy.evaluation.bool_ne(activation.e, constants[3])
         ex_8 = lambda activation: celpy.evaluation.macro_exists(activation, 'e', ex_8_x, ex_8_l)
-        CEL = celpy.evaluation.result(base_activation, ex_8)
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)
         """),
         celtypes.BoolType(True),
         "_._(_)",
@@ -823,48 +1009,93 @@ member_dot_arg_method_macro = [
     (
         "['foal', 'foo', 'four'].exists_one(n, n.startsWith('fo'))",
         dedent("""
-        # member_dot_arg exists_one:
-        ex_8_l = lambda activation: celpy.celtypes.ListType([celpy.celtypes.StringType('foal'), celpy.celtypes.StringType('foo'), celpy.celtypes.StringType('four')])
-        ex_8_x = lambda activation: celpy.evaluation.function_startsWith(activation.n, celpy.celtypes.StringType('fo'))
+        ex_8_l = lambda activation: celpy.celtypes.ListType([constants[0], constants[1], constants[2]])
+        ex_8_x = lambda activation: celpy.evaluation.function_startsWith(activation.n, constants[3])
         ex_8 = lambda activation: celpy.evaluation.macro_exists_one(activation, 'n', ex_8_x, ex_8_l)
-        CEL = celpy.evaluation.result(base_activation, ex_8)"""),
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.BoolType(False),
         "_._()",
     ),
 ]
 
 # Requires variable `duration` amd type `protobuf_message` in activation.
+member_dot_arg_local_binding = [
+    (
+        "cel.bind(x, 6, x * 7)",
+        dedent("""\
+        ex_8_0 = lambda activation: constants[0]
+        ex_8_x = lambda activation: operator.mul(activation.local_slots[0].get(), constants[1])
+        ex_8 = lambda activation: celpy.evaluation.block(activation.local_slots, {0: ex_8_0}, ex_8_x, activation)
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(celpy.evaluation.slot_activation(activation), CEL)"""),
+        celtypes.IntType(42),
+        "cel.bind(_, _, _)",
+    ),
+    (
+        "cel.block([6, cel.index(0) * 7], cel.index(1))",
+        dedent("""\
+        ex_8_0 = lambda activation: constants[0]
+        ex_8_1 = lambda activation: operator.mul(activation.local_slots[0].get(), constants[2])
+        ex_8_x = lambda activation: activation.local_slots[1].get()
+        ex_8 = lambda activation: celpy.evaluation.block(activation.local_slots, {0: ex_8_0, 1: ex_8_1}, ex_8_x, activation)
+        CEL = ex_8
+
+        def cel_program(activation):
+            return celpy.evaluation.result(celpy.evaluation.slot_activation(activation), CEL)"""),
+        celtypes.IntType(42),
+        "cel.block([_], _)",
+    ),
+]
+
 dot_ident_arg = [
     (
         "duration.getMilliseconds()",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: celpy.evaluation.function_getMilliseconds(activation.duration))"""),
+        CEL = lambda activation: celpy.evaluation.function_getMilliseconds(activation.duration)
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(123123),
         "._(_)",
     ),
     (
         ".duration",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: activation.resolve_variable('duration'))",
+        "CEL = lambda activation: activation.resolve_variable('duration')\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.DurationType(seconds=123, nanos=123456789),
         "_.IDENT",
     ),
     (
         ".protobuf_message().field",
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.resolve_variable('protobuf_message')().get('field'))"""),
+        CEL = lambda activation: activation.resolve_variable('protobuf_message')().get('field')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(42),
         "_.IDENT()",
     ),
     (
         '.protobuf_message({"field": 42}).field',
         dedent("""\
-        CEL = celpy.evaluation.result(base_activation, lambda activation: activation.resolve_variable('protobuf_message')(celpy.celtypes.MapType([(celpy.celtypes.StringType('field'), celpy.celtypes.IntType(42))])).get('field'))"""),
+        CEL = lambda activation: activation.resolve_variable('protobuf_message')(celpy.celtypes.MapType([(constants[0], constants[1])])).get('field')
+
+        def cel_program(activation):
+            return celpy.evaluation.result(activation, CEL)"""),
         celtypes.IntType(42),
         "_.IDENT(_)",
     ),
     (
         "no_arg_function()",
-        "CEL = celpy.evaluation.result(base_activation, lambda activation: test_transpilation.no_arg_function())",
+        "CEL = lambda activation: test_transpilation.no_arg_function()\n\n"
+        "def cel_program(activation):\n"
+        "    return celpy.evaluation.result(activation, CEL)",
         celtypes.IntType(42),
         "IDENT()",
     ),
@@ -874,7 +1105,11 @@ unbound_names = [
     (
         "unknown_function(42)",
         dedent(
-            """CEL = celpy.evaluation.result(base_activation, lambda activation: CELEvalError('unbound function', KeyError, ('unknown_function',))(celpy.celtypes.IntType(42)))"""
+            """\
+            CEL = lambda activation: CELEvalError('unbound function', KeyError, ('unknown_function',))(constants[0])
+
+            def cel_program(activation):
+                return celpy.evaluation.result(activation, CEL)"""
         ),
         CELEvalError,
         "IDENT()",
@@ -897,6 +1132,7 @@ unbound_names = [
             member_object_params,
             member_dot_arg_method,
             member_dot_arg_method_macro,
+            member_dot_arg_local_binding,
             dot_ident_arg,
             unbound_names,
         ],
@@ -937,3 +1173,104 @@ def test_core_transpile(
             assert computed == mock_protobuf.return_value
         else:
             assert computed == expected_value
+
+
+def test_transpile_program(mock_activation, transpiling_parser):
+    """
+    GIVEN an expression with a has() macro as the condition of a ?: operator
+    WHEN transpiled
+    THEN the cel_program() function is created once, and each evaluation calls it
+    """
+    tree = transpiling_parser.parse('!has({"n": 355}.n) ? "no" : "yes"')
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    program = tp.cel_program
+    assert tp.namespace["cel_program"] is program
+    assert tp.evaluate({}) == celtypes.StringType("yes")
+    assert tp.evaluate({}) == celtypes.StringType("yes")
+    assert tp.cel_program is program
+
+
+@pytest.mark.parametrize(
+    "source", ["'\\U0011FFFF'", "b'\\777'", "99999999999999999999u", "[1.0, b'\\777']"]
+)
+def test_transpile_invalid_literal(mock_activation, transpiling_parser, source):
+    """
+    GIVEN an invalid literal
+    WHEN transpiled
+    THEN the literal's error is raised by evaluation, the way the Evaluator returns it
+    """
+    tree = transpiling_parser.parse(source)
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    assert "celpy.evaluation.raise_error(constants[" in tp.source_text
+    with pytest.raises(CELEvalError) as exc_info:
+        tp.evaluate({})
+    with pytest.raises(CELEvalError) as expected_info:
+        Evaluator(ast=tree, activation=mock_activation).evaluate()
+    assert exc_info.value.args[2] == expected_info.value.args
+
+    tree = transpiling_parser.parse(f"{source} == 1 || true")
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    assert tp.evaluate({}) == celtypes.BoolType(True)
+
+
+def test_transpile_slots(transpiling_parser):
+    """
+    GIVEN an expression with cel.bind()
+    WHEN transpiled and evaluated more than once
+    THEN the lambdas are created once, and each evaluation has empty slots
+    """
+    tree = transpiling_parser.parse("cel.bind(y, x * 2, y + y)")
+    tp = Transpiler(ast=tree, activation=celpy.Activation())
+    tp.transpile()
+    assert tp.source_text.splitlines()[-2:] == [
+        "def cel_program(activation):",
+        "    return celpy.evaluation.result(celpy.evaluation.slot_activation(activation), CEL)",
+    ]
+    assert tp.evaluate({"x": celtypes.IntType(3)}) == celtypes.IntType(12)
+    assert tp.evaluate({"x": celtypes.IntType(5)}) == celtypes.IntType(20)
+
+
+def test_transpile_constants(mock_activation, transpiling_parser):
+    """
+    GIVEN literals, and lists and maps of literals
+    WHEN transpiled
+    THEN the literals are constants, created once, and the lists and maps are created by each evaluation
+    """
+    accounts = ", ".join(f'"{n:012d}"' for n in range(2000))
+    tree = transpiling_parser.parse(f'"000000001999" in [{accounts}]')
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    assert tp.constants[-1] == celtypes.StringType("000000001999")
+    assert tp.evaluate({}) == celtypes.BoolType(True)
+    assert tp.evaluate({}) == celtypes.BoolType(True)
+
+    for text in ['{"a": [1, 2u], "b": {"c": true}}', "[[1], [2]][0]", "[1, 2, 3]"]:
+        tree = transpiling_parser.parse(text)
+        tp = Transpiler(ast=tree, activation=mock_activation)
+        tp.transpile()
+        first = tp.evaluate({})
+        expected = tp.evaluate({})
+        if isinstance(first, celtypes.MapType):
+            first[celtypes.StringType("z")] = celtypes.IntType(99)
+        else:
+            first.append(celtypes.IntType(99))
+        assert tp.evaluate({}) == expected
+        assert tp.evaluate({}) is not tp.evaluate({})
+
+    tree = transpiling_parser.parse("[1, a.b.c]")
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    assert "celpy.celtypes.ListType([constants[0], " in tp.source_text
+    assert tp.evaluate({}) == celtypes.ListType(
+        [celtypes.IntType(1), celtypes.StringType("yeah")]
+    )
+
+    tree = transpiling_parser.parse('{"a": 1, "a": 2}')
+    tp = Transpiler(ast=tree, activation=mock_activation)
+    tp.transpile()
+    assert "celpy.celtypes.MapType([(constants[0], constants[1])" in tp.source_text
+    with pytest.raises(CELEvalError):
+        tp.evaluate({})